@@ -0,0 +1,114 @@
+import os
+import subprocess
+from pathlib import Path
+
+## config sizes, in project entries, that the parse and list benchmarks use
+CONFIG_SIZES: dict[str, int] = {"10": 10, "1k": 1_000, "100k": 100_000}
+
+## synthetic templates as (files, depth, commits, bytes per file)
+TEMPLATES: dict[str, tuple[int, int, int, int]] = {
+    "small": (20, 1, 1, 512),
+    "large": (5_000, 3, 1, 2_048),
+    "deep": (300, 30, 1, 512),
+    "history": (100, 2, 2_000, 512),
+}
+
+
+def make_config(path: Path, entries: int, templates: dict = None) -> Path:
+    """!
+    write a config holding entries projects spread over up to a hundred
+    languages, plus a `bench` language with one project per template given.
+
+    @param path the file to write the config to
+    @param entries the number of synthetic project entries
+    @param templates dictionary mapping template names to their paths
+    @returns path
+    """
+    languages = max(1, min(100, entries // 10))
+    sections = {f"lang{i}": [] for i in range(languages)}
+    for i in range(entries):
+        sections[f"lang{i % languages}"].append(
+            f"project{i}: https://git.example.com/team{i % 7}/project{i}.git")
+    if templates:
+        sections["bench"] = [f"{name}: {source}"
+                             for name, source in templates.items()]
+
+    with open(path, "w") as f:
+        f.write("[ProGenrtr]\nlanguages = " + ",\n    ".join(sections) + "\n")
+        for language, lines in sections.items():
+            f.write(f"\n[project.{language}]\n" + "\n".join(lines) + "\n")
+    return path
+
+
+def make_template(path: Path, files: int, depth: int, commits: int,
+                  size: int) -> Path:
+    """!
+    create a template repository with a checked out working tree. The history
+    is written with `git fast-import` so that even long histories take a
+    moment to build.
+
+    @param path the directory to create the repository in
+    @param files the number of files in the tree
+    @param depth the depth of the directory hierarchy the files are spread over
+    @param commits the number of commits, every commit after the first changes
+           a handful of files
+    @param size the size in bytes of each file
+    @returns path
+    """
+    names = []
+    for i in range(files):
+        level = i % depth
+        parts = [f"dir{(i // depth + j) % 8}" for j in range(level)]
+        names.append("/".join(parts + [f"file{i}.txt"]))
+
+    def blob(name: str, revision: int) -> bytes:
+        line = f"{name} revision {revision}\n".encode()
+        return (line * (size // len(line) + 1))[:size]
+
+    stream = bytearray()
+    for revision in range(commits):
+        message = f"commit {revision}\n".encode()
+        stream += (b"commit refs/heads/master\n"
+                   b"committer bench <bench@bench> %d +0000\n"
+                   b"data %d\n%s" % (1_700_000_000 + revision,
+                                     len(message), message))
+        changed = names if revision == 0 else \
+            [names[(revision * 7 + k) % files] for k in range(5)]
+        for name in changed:
+            data = blob(name, revision)
+            stream += b"M 100644 inline %s\ndata %d\n%s\n" % (
+                name.encode(), len(data), data)
+
+    git = ["git", "-C", str(path), "-c", "init.defaultBranch=master"]
+    path.mkdir(parents=True, exist_ok=True)
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["fast-import", "--quiet"], input=bytes(stream),
+                   check=True)
+    subprocess.run(git + ["checkout", "-qf", "master"], check=True)
+    return path
+
+
+def make_fixtures(root: Path) -> dict:
+    """!
+    build every fixture below root, reusing those already built there
+    @param root the directory to build the fixtures in
+    @returns dict with the `configs` and `templates` built, each mapping a
+             fixture name to its path
+    """
+    templates = {}
+    for name, shape in TEMPLATES.items():
+        path = root / "templates" / name
+        if not (path / ".git").exists():
+            make_template(path, *shape)
+        templates[name] = path
+
+    configs = {}
+    for name, entries in CONFIG_SIZES.items():
+        path = root / f"config-{name}.conf"
+        if not path.exists():
+            make_config(path, entries)
+        configs[name] = path
+    path = root / "config-templates.conf"
+    make_config(path, 0, {name: os.fspath(p) for name, p in templates.items()})
+    configs["templates"] = path
+    return dict(configs=configs, templates=templates)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+"""
+ProGenrtr benchmarks
+
+Times config parsing, project listing and every phase of project generation
+against synthetic fixtures, entirely offline.
+
+Usage:
+  run.py [--repeat N] [--rounds N] [--filter TEXT] [--fixtures DIR]
+         [--output FILE] [--baseline FILE] [--threshold RATIO]
+         [--update-baseline]
+  run.py (-h | --help)
+
+Options:
+    --repeat N          the number of timed runs of each benchmark per
+                        round [default: 5].
+    --rounds N          the number of rounds every benchmark is run in, its
+                        result being the median of all of their runs. How
+                        far the medians of the rounds differ is recorded
+                        as the benchmark's noise [default: 3].
+    --filter TEXT       only run the benchmarks whose name contains TEXT.
+    --fixtures DIR      build (and reuse) the fixtures in DIR rather than in
+                        a temporary directory.
+    --output FILE       write the results as JSON to FILE.
+    --baseline FILE     compare the results against the baseline in FILE and
+                        fail on any regression.
+    --threshold RATIO   the slowdown of the median over the baseline's,
+                        on top of the noise the baseline measured, counted
+                        as a regression [default: 0.25].
+    --update-baseline   write the results to the --baseline FILE instead.
+    -h --help           Show this screen.
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from docopt import docopt  # noqa: E402
+
+from fixtures import make_fixtures  # noqa: E402
+
+## differences below this many seconds are noise, never a regression
+NOISE_FLOOR = 0.010
+
+## generation modes as the extra command line arguments they need
+MODES = {
+    "export": {"--ref": "master"},
+    "copy": {"--ref": None},
+    "clone": {"--ref": None, "--full-clone": True},
+}
+
+
+class Benchmarks:
+    """!
+    collects the timings of every benchmark, keyed on its name, per round
+    """
+
+    def __init__(self, repeat: int, wanted: str = None):
+        self.repeat = repeat
+        self.wanted = wanted
+        self.samples = {}
+        self.round = 0
+
+    def wants(self, name: str) -> bool:
+        return not self.wanted or self.wanted in name
+
+    def record(self, name: str, seconds: float):
+        rounds = self.samples.setdefault(name, [])
+        while len(rounds) <= self.round:
+            rounds.append([])
+        rounds[self.round].append(seconds)
+
+    def time(self, name: str, func):
+        """!
+        time repeated calls of func under name
+        """
+        if not self.wants(name):
+            return
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            self.record(name, time.perf_counter() - start)
+
+    def results(self) -> dict:
+        """!
+        @returns dict mapping every benchmark to the median and minimum of all
+                 its runs, their number and its noise: how much slower its
+                 slowest round was than its fastest, by their medians.
+        """
+        results = {}
+        for name, rounds in sorted(self.samples.items()):
+            samples = [seconds for runs in rounds for seconds in runs]
+            medians = [statistics.median(runs) for runs in rounds if runs]
+            results[name] = {"median": statistics.median(samples),
+                             "min": min(samples), "runs": len(samples),
+                             "noise": max(medians) / min(medians) - 1}
+        return results
+
+
+def parseArgs(config: Path, cache: bool) -> dict:
+    return {"--config": str(config), "--no-config-cache": not cache}
+
+
+def benchConfig(bench: Benchmarks, configs: dict):
+    from ConfigManager import ConfMgr
+    from ProjectTypesList import ProjectTypesList
+
+    for name, config in configs.items():
+        if name == "templates":
+            continue
+
+        def parse(cache: bool):
+            ConfMgr.reset()
+            ConfMgr().parse(parseArgs(config, cache))
+
+        bench.time(f"config.parse.{name}", lambda: parse(False))
+        parse(True)  # make sure the cache holds a snapshot
+        bench.time(f"config.parse.{name}.cached", lambda: parse(True))
+
+        listArgs = {"--lang": None, "--check": False, "--search": None,
+                    "--tag": [], "--page": None, "--page-size": None,
+                    "--format": "text"}
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench.time(f"list.{name}",
+                       lambda: ProjectTypesList().run(listArgs))
+            bench.time(f"list.{name}.search", lambda: ProjectTypesList().run(
+                dict(listArgs, **{"--search": "project12"})))
+
+
+def benchGenerate(bench: Benchmarks, configs: dict, templates: dict,
+                  root: Path):
+    """!
+    time generating from every template in every mode, along with each phase
+    of it as the spans of the generation record it, see Trace. Every span
+    within `generate` is a phase, spans of the same name are added up.
+    """
+    from ConfigManager import ConfMgr
+    from ProjectGenerator import ProjectGenerator
+    from Trace import TRACER
+
+    ConfMgr.reset()
+    ConfMgr().parse(parseArgs(configs["templates"], False))
+    target = root / "project"
+    TRACER.enable()
+    try:
+        for template in templates:
+            for mode, extra in MODES.items():
+                name = f"generate.{template}.{mode}"
+                if not bench.wants(name):
+                    continue
+                args = dict({"<LANGUAGE>": "bench",
+                             "<PROJECT_TYPE>": template,
+                             "<PROJECT_PATH>": str(target)}, **extra)
+                for _ in range(bench.repeat):
+                    shutil.rmtree(target, ignore_errors=True)
+                    TRACER.reset()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        ProjectGenerator().run(args)
+                    phases = {}
+                    for span in TRACER.spans:
+                        phase = "total" if span.name == "generate" \
+                            else span.name
+                        phases[phase] = phases.get(phase, 0) + span.duration
+                    for phase, ns in phases.items():
+                        bench.record(f"{name}.{phase}", ns / 1e9)
+    finally:
+        TRACER.disable()
+        TRACER.reset()
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """!
+    @returns a description of every benchmark that regressed by more than
+             threshold, on top of the noise the baseline measured for it,
+             over baseline. The medians of the runs are compared, a single
+             run disturbed by the rest of the machine moves neither.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        slower = result["median"] - before["median"]
+        allowed = (threshold + before.get("noise", 0)) * before["median"]
+        if slower > NOISE_FLOOR and slower > allowed:
+            regressions.append(
+                f"{name}: {before['median'] * 1000:.1f}ms -> "
+                f"{result['median'] * 1000:.1f}ms "
+                f"(+{slower / before['median']:.0%})")
+    return regressions
+
+
+def main():
+    args = docopt(__doc__)
+    bench = Benchmarks(int(args["--repeat"]), args["--filter"])
+
+    with tempfile.TemporaryDirectory(prefix="progenrtr-bench-") as scratch:
+        scratch = Path(scratch)
+        fixtures = Path(args["--fixtures"] or scratch / "fixtures")
+        # keep the benchmarks away from the user's own config and caches
+        os.environ.update(HOME=str(scratch), XDG_CACHE_HOME=str(scratch),
+                          GIT_AUTHOR_NAME="bench", GIT_AUTHOR_EMAIL="bench@b",
+                          GIT_COMMITTER_NAME="bench",
+                          GIT_COMMITTER_EMAIL="bench@b")
+        built = make_fixtures(fixtures)
+        for index in range(int(args["--rounds"])):
+            bench.round = index
+            benchConfig(bench, built["configs"])
+            benchGenerate(bench, built["configs"], built["templates"],
+                          scratch)
+
+    results = bench.results()
+    for name, result in results.items():
+        print(f"{name:<40} {result['median'] * 1000:10.2f}ms "
+              f"(min {result['min'] * 1000:.2f}ms, "
+              f"noise {result['noise']:.0%})")
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(), "results": results}
+
+    if args["--output"]:
+        with open(args["--output"], "w") as f:
+            json.dump(report, f, indent=2)
+    if args["--baseline"] and args["--update-baseline"]:
+        with open(args["--baseline"], "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    elif args["--baseline"]:
+        with open(args["--baseline"]) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, float(args["--threshold"]))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args['--baseline']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import configparser
+import contextlib
+import json
+import sys
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from ConfigManager import ConfMgr as Conf
+from ProjectGenerator import ProjectGenerator, GenerationError
+from TemplateBundle import TemplateBundle
+from TemplateCache import TemplateCache
+from TemplateSource import parseSource, splitLayers
+
+
+class BatchGenerator:
+    """!
+    Generates every project listed in a manifest file in one invocation.
+
+    The config is resolved once, each distinct remote template is fetched into
+    the mirror cache once no matter how many entries use it, and the projects
+    are then generated across a bounded pool of worker threads. A failing entry
+    is reported but never aborts the rest of the batch.
+
+    Manifests may be written as TOML (`[[project]]` tables), INI (one section
+    per project) or NDJSON (one object per line). Every entry needs the keys
+    `language`, `type` and `path` and may set `ref`. An entry's `ref` wins
+    over `--ref`, which wins over the ref the config gives the template, and
+    HEAD is used when none of them gives one.
+    """
+
+    DEFAULT_JOBS = 4
+
+    def __init__(self, config: ConfigContext = None):
+        """!
+        @param config ConfigContext to generate with, that of ConfMgr if not
+               given
+        """
+        self.config = config if config is not None else Conf().context
+
+    def run(self, args: dict):
+        """!
+        entry point to this command
+        @param args the dictionary of command line arguments provided at the
+               command line.
+        """
+        try:
+            entries = self.readManifest(args["--batch"])
+        except (OSError, ValueError, KeyError) as e:
+            sys.exit(f"ERROR: could not read manifest. {e}")
+        jobs = int(args.get("--jobs") or self.DEFAULT_JOBS)
+
+        results = self.generate(entries, args, jobs)
+
+        failed = [r for r in results if r.error is not None]
+        for result in results:
+            if result.error is None:
+                print(f"[ok]     {result.path} ({result.language}/"
+                      f"{result.type}) in {result.seconds:.2f}s")
+            else:
+                print(f"[failed] {result.path} ({result.language}/"
+                      f"{result.type}): {result.error}")
+        print(f"{len(results) - len(failed)} succeeded, {len(failed)} failed")
+        if failed:
+            sys.exit(1)
+
+    def generate(self, entries: list[DataStruct], args: dict,
+                 jobs: int = DEFAULT_JOBS) -> list[DataStruct]:
+        """!
+        generate every entry, returning one result per entry in manifest order
+        @param entries list of DataStructs as returned by readManifest()
+        @param args the dictionary of command line arguments
+        @param jobs the maximum number of projects generated concurrently
+        @returns list of DataStructs holding the entry, its wall time in
+                 seconds and the error message if it failed (else None)
+        """
+        jobs = max(1, jobs)
+        targets = set()
+        for entry in entries:
+            entry.project = self.__resolve(entry)
+            # two workers must never race each other into the same directory
+            entry.duplicate = Path(entry.path).resolve() in targets
+            targets.add(Path(entry.path).resolve())
+        with contextlib.ExitStack() as stack:
+            if args.get("--bundle"):
+                # mapped once for the whole batch rather than per entry
+                try:
+                    stack.enter_context(TemplateBundle.open(args["--bundle"]))
+                except Exception:
+                    pass  # reported by every entry
+            else:
+                self.__prefetch(entries, args, jobs)
+
+            # the mirrors are fresh now, so a refresh per entry would only
+            # refetch
+            itemArgs = dict(args, **{"--refresh": False})
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                return list(pool.map(
+                    lambda entry: self.__generateOne(entry, itemArgs),
+                    entries))
+
+    def readManifest(self, path: str) -> list[DataStruct]:
+        """!
+        parse a manifest file, the format is chosen by its extension
+        @param path string path to a .toml, .ini/.cfg/.conf or .ndjson/.jsonl
+               manifest
+        @returns list of DataStructs with language, type, path and ref keys
+        """
+        suffix = Path(path).suffix.lower()
+        if suffix == ".toml":
+            with open(path, "rb") as f:
+                rows = tomllib.load(f).get("project", [])
+        elif suffix in (".ini", ".cfg", ".conf"):
+            data = configparser.ConfigParser()
+            if not data.read(path):
+                raise FileNotFoundError(path)
+            rows = [dict(data[section]) for section in data.sections()]
+        elif suffix in (".ndjson", ".jsonl"):
+            with open(path) as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            raise ValueError(f"unknown manifest format '{suffix}'")
+
+        return [DataStruct(language=row["language"], type=row["type"],
+                           path=row["path"], ref=row.get("ref"))
+                for row in rows]
+
+    def __resolve(self, entry: DataStruct) -> str | None:
+        """!
+        look up the template for an entry, None if the config has no such
+        language or project type.
+        """
+        language = self.config.projects.get(entry.language)
+        return None if language is None else language.get(entry.type)
+
+    def __prefetch(self, entries: list[DataStruct], args: dict, jobs: int):
+        """!
+        bring the mirror of every distinct remote template up to date once,
+        failures are left for the individual entries to report.
+        """
+        sources = []
+        for entry in entries:
+            if entry.project is None:
+                continue  # no template, reported by the entry itself
+            try:
+                sources += [parseSource(layer)
+                            for layer in splitLayers(entry.project)]
+            except ValueError:
+                pass  # reported by the entry itself
+        # subdirectory templates use the partial mirror, see TemplateCache
+        urls = {(s.url, bool(s.subdir)) for s in sources
+                if TemplateCache.isRemote(s.url)}
+        cache = TemplateCache(self.config.meta)
+        refresh = args.get("--refresh", False)
+
+        def fetch(url: tuple[str, bool]):
+            try:
+                with cache.using(url[0], refresh, partial=url[1]):
+                    pass
+            except Exception:
+                pass
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(fetch, urls))
+
+    def __generateOne(self, entry: DataStruct, args: dict) -> DataStruct:
+        result = DataStruct(language=entry.language, type=entry.type,
+                            path=entry.path, seconds=0.0, error=None)
+        start = time.perf_counter()
+        try:
+            if entry.duplicate:
+                raise GenerationError("path is already used by an earlier "
+                                      "entry of the manifest")
+            if entry.project is None:
+                raise GenerationError(f"no project '{entry.type}' for "
+                                      f"language '{entry.language}'")
+            # the config's ref and HEAD are left to templateRef
+            ref = entry.ref or args.get("--ref")
+            ProjectGenerator(self.config).generate(
+                entry.project, entry.path, dict(
+                    args, **{"--ref": ref, "<LANGUAGE>": entry.language,
+                             "<PROJECT_TYPE>": entry.type}))
+        except Exception as e:
+            result.error = str(e)
+        result.seconds = time.perf_counter() - start
+        return result
@@ -0,0 +1,124 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from ConfigManager import ConfMgr as Conf
+from ProjectGenerator import ProjectGenerator
+from TemplateBundle import TemplateBundle
+
+
+class BundleExporter:
+    """!
+    Writes every template of the config into one bundle file, see
+    TemplateBundle, so that projects can be generated with --bundle where the
+    templates themselves can not be reached.
+
+    Each distinct template is fetched just as generating from it would fetch
+    it, into a scratch directory next to the bundle, across a bounded pool of
+    worker threads. Templates are written into the bundle as they arrive, so
+    the scratch space only ever holds those still waiting their turn. A
+    template that can not be fetched is reported and left out.
+    """
+
+    DEFAULT_JOBS = 4
+
+    def __init__(self, config: ConfigContext = None):
+        """!
+        @param config ConfigContext whose templates are bundled, that of
+               ConfMgr if not given
+        """
+        self.config = config if config is not None else Conf().context
+
+    def run(self, args: dict):
+        """!
+        entry point to this command
+        @param args the dictionary of command line arguments provided at the
+               command line.
+        """
+        jobs = int(args.get("--jobs") or self.DEFAULT_JOBS)
+        try:
+            results = self.export(args["--export-bundle"], self.templates(),
+                                  args, jobs)
+        except OSError as e:
+            sys.exit(f"ERROR: could not write bundle. {e}")
+
+        failed = [r for r in results if r.error is not None]
+        for result in results:
+            if result.error is None:
+                print(f"[ok]     {result.template} ({result.ref}) in "
+                      f"{result.seconds:.2f}s")
+            else:
+                print(f"[failed] {result.template} ({result.ref}): "
+                      f"{result.error}")
+        print(f"{len(results) - len(failed)} bundled, {len(failed)} failed")
+        if failed:
+            sys.exit(1)
+
+    def templates(self) -> list[str]:
+        """!
+        @returns list of every distinct template of the config, sorted
+        """
+        templates = set()
+        for language in vars(self.config.projects.resolve()).values():
+            templates.update(t for t in vars(language).values() if t)
+        return sorted(templates)
+
+    def export(self, path: str, templates: list[str], args: dict,
+               jobs: int = DEFAULT_JOBS) -> list[DataStruct]:
+        """!
+        fetch templates and write them into a bundle at path
+        @param path string path of the bundle file to write
+        @param templates list of the templates to bundle, as given in the
+               config
+        @param args the dictionary of command line arguments
+        @param jobs the maximum number of templates fetched concurrently
+        @returns list of DataStructs, one per template in the order given,
+                 holding the template, the ref bundled, its wall time in
+                 seconds and the error message if it failed (else None)
+        """
+        # the bundle stands in for what generating from the templates would
+        # fetch, which is never a clone
+        args = dict(args, **{"--full-clone": False, "--ref": None,
+                             "--submodules": "flatten"})
+        parent = os.path.dirname(os.path.abspath(path))
+        results = {}
+        with tempfile.TemporaryDirectory(dir=parent,
+                                         prefix=".bundle-") as scratch, \
+                ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = [pool.submit(self.__fetchOne, template, args,
+                                   os.path.join(scratch, str(index)))
+                       for index, template in enumerate(templates)]
+
+            def fetched():
+                for future in as_completed(futures):
+                    result = future.result()
+                    results[result.template] = result
+                    if result.error is None:
+                        yield result
+                        shutil.rmtree(result.directory)
+
+            TemplateBundle.create(path, fetched())
+        for result in results.values():
+            del result.directory
+        return [results[template] for template in templates]
+
+    def __fetchOne(self, template: str, args: dict,
+                   directory: str) -> DataStruct:
+        result = DataStruct(template=template, ref=None, directory=directory,
+                            seconds=0.0, error=None)
+        start = time.perf_counter()
+        try:
+            generator = ProjectGenerator(self.config)
+            result.ref = generator.templateRef(template, args)
+            fetched = generator.fetchTemplate(template, directory, args)
+            result.commit, result.blobs = fetched.commit, fetched.blobs
+            result.submodules = fetched.submodules.paths
+        except Exception as e:
+            result.error = str(e)
+        result.seconds = time.perf_counter() - start
+        return result
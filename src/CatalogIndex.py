@@ -0,0 +1,175 @@
+import re
+from bisect import bisect_right
+from itertools import accumulate, compress, repeat
+from operator import itemgetter, not_
+
+from Config import DataStruct
+
+
+class CatalogIndex:
+    """!
+    in-memory index over every template in the config, built once after the
+    config is loaded so that searching even very large catalogs is cheap.
+
+    The catalog is stored column-wise (languages, names, sources) alongside
+    pre-lowered search keys. Every query is a handful of `map`/`compress`
+    passes over those columns, so the per-entry work happens in C rather than
+    in a python loop, and only the matching entries are ever touched from
+    python.
+
+    Every entry is tagged with its language, `local` or `remote`, and the
+    host name of remote sources (e.g. `github.com`).
+    """
+
+    ## match quality, lower is better, used to rank search results
+    EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+
+    ## captures the host of `git@host:` or `scheme://[user@]host[:port]/`
+    ## at the start of a source, matching (with empty groups) anything else
+    HOST_PATTERN = re.compile(r"(?:git@([^:\s]*)|(?!file:)[a-z][a-z0-9+.-]*"
+                              r"://(?:[^@/\s]*@)?([^/:\s]*))?")
+
+    def __init__(self, projects: DataStruct):
+        """!
+        @param projects DataStruct mapping languages to DataStructs of
+               `name: source` entries, as found on ConfMgr().projects
+        """
+        self.languages, self.names, self.sources = [], [], []
+        self.__ranges = {}
+        for language, templates in vars(projects).items():
+            entries = vars(templates)
+            start = len(self.names)
+            self.__ranges[language.lower()] = range(start,
+                                                    start + len(entries))
+            self.languages.extend(repeat(language, len(entries)))
+            self.names.extend(entries.keys())
+            self.sources.extend(entries.values())
+
+        self.__names = [name.lower() for name in self.names]
+        self.__languages = [language.lower() for language in self.languages]
+        self.__qualified = [f"{language}/{name}" for language, name
+                            in zip(self.__languages, self.__names)]
+        self.__keys = [f"{qualified} {source.lower()}" for qualified, source
+                       in zip(self.__qualified, self.sources)]
+        self.__text = "\n".join(self.__keys)
+        self.__starts = list(accumulate((len(key) + 1 for key in self.__keys),
+                                        initial=0))
+        self.__hosts = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, term: str = None, tags: list[str] = ()) -> list[int]:
+        """!
+        find the entries matching a search term and carrying every tag given
+        @param term string matched against the name (exact, then prefix) and
+               against `language/name source` (substring). Only if none of
+               those match is term fuzzy matched against `language/name`.
+               None matches everything.
+        @param tags list of tags that each result must carry
+        @returns list of entry indices, best matches first and in config order
+                 among equally good matches.
+        """
+        candidates = None
+        for tag in tags:
+            tagged = set(self.__tagged(tag.lower()))
+            candidates = tagged if candidates is None else candidates & tagged
+        if not term:
+            return list(range(len(self))) if candidates is None \
+                else sorted(candidates)
+
+        ranked = self.__rank(term.lower())
+        if candidates is not None:
+            ranked = {i: rank for i, rank in ranked.items() if i in candidates}
+
+        # sorting on the index first and then (stably) on the rank alone keeps
+        # both sorts on C level comparisons
+        results = sorted(ranked.items())
+        results.sort(key=itemgetter(1))
+        return list(map(itemgetter(0), results))
+
+    def entry(self, index: int) -> dict:
+        """!
+        @param index the index of an entry as returned by search()
+        @returns dict describing the entry, suitable for json output
+        """
+        host = self.__host(self.sources[index])
+        tags = [self.__languages[index]] + (["remote", host] if host
+                                            else ["local"])
+        return {"language": self.languages[index], "name": self.names[index],
+                "source": self.sources[index], "tags": tags}
+
+    def __rank(self, term: str) -> dict[int, tuple[int, int]]:
+        """!
+        @returns dict mapping entry indices to their (quality, span), the span
+                 being the length of a fuzzy match and 0 otherwise.
+        """
+        # every exact or prefix match on a name is also a substring match of
+        # its key, so only the substring matches need testing any further
+        ranked = dict.fromkeys(self.__substrings(term), (self.SUBSTRING, 0))
+        names = self.__names
+        for index in ranked:
+            if names[index].startswith(term):
+                ranked[index] = (self.EXACT if names[index] == term
+                                 else self.PREFIX, 0)
+        if ranked:
+            return ranked
+
+        # only when nothing matches literally fall back to fuzzy matching: the
+        # characters of term in order, tighter matches ranking higher
+        fuzzy = re.compile(".*?".join(re.escape(c) for c in term))
+        matches = list(map(fuzzy.search, self.__qualified))
+        for index in compress(range(len(self)), matches):
+            match = matches[index]
+            ranked[index] = (self.FUZZY, match.end() - match.start())
+        return ranked
+
+    def __substrings(self, term: str) -> list[int]:
+        """!
+        @returns the indices, ascending, of every entry whose key contains term
+        """
+        # rare terms are quickest found by scanning the joined keys, common
+        # ones by testing every key without leaving C
+        if self.__text.count(term) * 8 > len(self):
+            return list(compress(range(len(self)), map(
+                str.__contains__, self.__keys, repeat(term))))
+        hits = []
+        offset = self.__text.find(term)
+        while offset != -1:
+            hits.append(bisect_right(self.__starts, offset) - 1)
+            offset = self.__text.find(term, self.__starts[hits[-1] + 1])
+        return hits
+
+    def __tagged(self, tag: str):
+        """!
+        @returns iterable of the indices of every entry carrying tag
+        """
+        indices = range(len(self))
+        if tag in ("local", "remote"):
+            remote = map(bool, self.__hostColumn())
+            if tag == "remote":
+                return compress(indices, remote)
+            return compress(indices, map(not_, remote))
+        return {*self.__ranges.get(tag, ()),
+                *compress(indices, map(str.__eq__, self.__hostColumn(),
+                                       repeat(tag)))}
+
+    def __hostColumn(self) -> list[str]:
+        """!
+        host names are only needed for tag queries, so work them out lazily,
+        one per source, the first time they are needed. A source may span
+        several lines (e.g. a wrapped list of layers), so each is matched on
+        its own rather than in one pass over all of them.
+        """
+        if self.__hosts is None:
+            self.__hosts = list(map(self.__host, self.sources))
+        return self.__hosts
+
+    @classmethod
+    def __host(cls, source: str) -> str:
+        """!
+        @returns the lower case host name of a remote source, or "" if the
+                 source is local.
+        """
+        ssh, url = cls.HOST_PATTERN.match(source.lower()).groups()
+        return ssh or url or ""
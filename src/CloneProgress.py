@@ -0,0 +1,114 @@
+import re
+import sys
+import threading
+import time
+
+from git import RemoteProgress
+
+from TransferStats import TransferStats, formatBytes
+
+
+class CloneProgress(RemoteProgress):
+    """!
+    Shows the progress of a clone or fetch as git reports it: the stage it is
+    in, the objects done out of the total, the bytes received and the average
+    throughput so far.
+
+    On a terminal one line is redrawn in place, at most every REDRAW seconds.
+    Anywhere else, say a log file or a daemon's client, a plain line is
+    printed every INTERVAL seconds instead, so a quick transfer prints nothing
+    until it is done. finish() prints the totals of the transfer and, given
+    TransferStats, records them.
+    """
+
+    ## seconds between redraws of the progress line on a terminal
+    REDRAW = 0.1
+
+    ## seconds between progress lines when not writing to a terminal
+    INTERVAL = 5.0
+
+    STAGES = {RemoteProgress.COUNTING: "counting objects",
+              RemoteProgress.COMPRESSING: "compressing objects",
+              RemoteProgress.WRITING: "writing objects",
+              RemoteProgress.RECEIVING: "receiving objects",
+              RemoteProgress.RESOLVING: "resolving deltas",
+              RemoteProgress.FINDING_SOURCES: "finding sources",
+              RemoteProgress.CHECKING_OUT: "checking out files"}
+
+    UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+    ## a size git reports, as opposed to a rate which is followed by `/s`
+    SIZE = re.compile(r"([\d.]+) (bytes|KiB|MiB|GiB)(?!/s)")
+
+    ## shared by every transfer, so concurrent ones never interleave a line
+    LOCK = threading.Lock()
+
+    def __init__(self, url: str, kind: str = "clone", stream=None,
+                 stats: TransferStats = None):
+        """!
+        @param url string URL the template is transferred from
+        @param kind string `clone` or `fetch`
+        @param stream the text stream to show the progress on, stderr if not
+               given, as git shows its own, so that it never mixes with the
+               output of a command
+        @param stats TransferStats to record the totals in (optional)
+        """
+        super().__init__()
+        self.url = url
+        self.kind = kind
+        self.stream = stream if stream is not None else sys.stderr
+        try:
+            self.tty = self.stream.isatty()
+        except (AttributeError, ValueError):
+            self.tty = False
+        self.stats = stats
+        self.stage = None
+        self.objects = self.total = self.bytes = 0
+        self.start = self.shown = time.monotonic()
+
+    def update(self, op_code: int, cur_count, max_count=None,
+               message: str = ""):
+        stage = op_code & self.OP_MASK
+        self.stage = stage
+        if stage == self.RECEIVING:
+            self.objects = int(cur_count)
+            self.total = int(max_count or 0)
+            match = self.SIZE.search(message or "")
+            if match:
+                self.bytes = int(float(match[1]) * self.UNITS[match[2]])
+        now = time.monotonic()
+        if now - self.shown < (self.REDRAW if self.tty else self.INTERVAL):
+            return
+        self.shown = now
+        done = f"{int(cur_count)}/{int(max_count)}" if max_count \
+            else f"{int(cur_count)}"
+        line = f"{self.kind.capitalize()} {self.url}: " \
+               f"{self.STAGES.get(stage, 'working')} {done}"
+        if self.bytes:
+            line += f", {formatBytes(self.bytes)}, " \
+                    f"{formatBytes(self.bytes / (now - self.start))}/s"
+        self.__show(line)
+
+    def finish(self):
+        """!
+        print the totals of the finished transfer, clearing the progress line
+        on a terminal, and record them if given TransferStats
+        """
+        seconds = time.monotonic() - self.start
+        line = f"{self.kind.capitalize()} {self.url}: {self.objects} " \
+               f"objects, {formatBytes(self.bytes)} in {seconds:.1f}s"
+        if self.bytes and seconds:
+            line += f" ({formatBytes(self.bytes / seconds)}/s)"
+        self.__show(line, final=True)
+        if self.stats is not None:
+            self.stats.record(self.url, self.kind, self.objects, self.bytes,
+                              seconds)
+
+    def __show(self, line: str, final: bool = False):
+        with self.LOCK:
+            if self.tty:
+                # \x1b[K clears whatever a longer line left behind
+                self.stream.write(f"\r{line}\x1b[K" + ("\n" if final else ""))
+            else:
+                self.stream.write(line + "\n")
+            self.stream.flush()
@@ -0,0 +1,201 @@
+import os
+
+## options choosing a command other than generating a single project, after
+## which no language or project type is completed
+COMMANDS = ("-l", "--list", "--batch", "--export-bundle", "--drift",
+            "--daemon", "--transfers", "--todo", "-h", "--help", "--version")
+
+## the values completed for options that take one of a fixed few
+CHOICES = {"--format": ("text", "json", "ndjson")}
+
+
+def indexDir() -> str:
+    """!
+    @returns string the directory completion indexes are kept in, that of
+             utils.cacheDir() without importing pathlib for it
+    """
+    base = os.environ.get("XDG_CACHE_HOME", "~/.cache")
+    return os.path.join(os.path.expanduser(base), "progenrtr", "completion")
+
+
+class CompletionIndex:
+    """!
+    The precompiled index shell completion is served from, so that completing
+    a language or project type costs a few stat calls and reading one small
+    file rather than a full start of ProGenrtr. See ProGenrtrComplete.
+
+    One index is kept per config, as plain tab separated lines: the path,
+    mtime and size of every file consulted to parse the config (as
+    ConfigCache keeps them), every option of USAGE and whether it takes a
+    value, the fixed values of some options and every language and project
+    type of the catalog, fragments included. An index is only used while all
+    of the consulted files are unchanged, otherwise rebuild() regenerates it
+    from the config, which is the one time completion pays for loading it.
+
+    Only os is imported up front, everything needed to rebuild the index is
+    imported by rebuild() itself.
+    """
+
+    VERSION = 2  # bumped whenever USAGE gains options
+
+    def __init__(self, config: str = None, directory: str = None):
+        """!
+        @param config string path of the config given with `--config`, None
+               for the default config locations
+        @param directory string the directory the index is kept in, see
+               indexDir (optional)
+        """
+        self.config = None if config is None else \
+            os.path.abspath(os.path.expanduser(config))
+        name = "default" if self.config is None else \
+            self.config.replace("%", "%25").replace(os.sep, "%2F")
+        self.path = os.path.join(directory or indexDir(), f"{name}.idx")
+        self.options = {}
+        self.choices = {}
+        self.types = {}
+
+    def read(self) -> bool:
+        """!
+        load the index, if it is there and still up to date
+        @returns bool true iff it was loaded
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            return False
+        if lines[0] != f"progenrtr-completion\t{self.VERSION}":
+            return False
+        options, choices, types = {}, {}, {}
+        for line in lines[1:]:
+            kind, _, rest = line.partition("\t")
+            if kind == "type":
+                language, _, name = rest.partition("\t")
+                types[language].append(name)
+            elif kind == "language":
+                types[rest] = []
+            elif kind == "file":
+                path, mtime, size = rest.split("\t")
+                try:
+                    info = os.stat(path)
+                    current = f"{info.st_mtime_ns}\t{info.st_size}"
+                except OSError:
+                    current = "-\t-"
+                if current != f"{mtime}\t{size}":
+                    return False
+            elif kind == "option":
+                name, _, takesValue = rest.partition("\t")
+                options[name] = takesValue == "1"
+            elif kind == "choice":
+                option, _, value = rest.partition("\t")
+                choices.setdefault(option, []).append(value)
+        self.options, self.choices, self.types = options, choices, types
+        return True
+
+    def rebuild(self):
+        """!
+        parse the config, every language of it, and write the index anew.
+        Whatever loading the config prints is swallowed, so that it never
+        ends up among the completions.
+        @exception Exception whatever parsing the config raises, SystemExit
+                   included
+        """
+        import contextlib
+        import io
+        import re
+        import tempfile
+        from ConfigCache import ConfigCache
+        from ConfigManager import ConfMgr
+        from TemplateSubmodules import TemplateSubmodules
+        from USAGE import USAGE
+
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            context = ConfMgr.load({"--config": self.config})
+            projects = context.projects.resolve()
+        self.types = {language: list(vars(templates))
+                      for language, templates in vars(projects).items()}
+        self.choices = dict(CHOICES,
+                            **{"--submodules": TemplateSubmodules.MODES})
+        self.options = {}
+        # `-j N --jobs=N  the number of ...`, the value optional
+        option = re.compile(r"(-{1,2}[\w-]+)(?:[ =]([^\s-]\S*))?")
+        for line in USAGE[USAGE.index("Options:"):].splitlines():
+            spec = re.split(r"\s{2,}", line.strip())[0]
+            if spec.startswith("-"):
+                for name, value in option.findall(spec):
+                    self.options[name] = bool(value)
+
+        lines = [f"progenrtr-completion\t{self.VERSION}"]
+        lines += ["file\t" + "\t".join("-" if part is None else str(part)
+                                      for part in entry)
+                  for entry in ConfigCache.signature(context.watched())]
+        lines += [f"option\t{name}\t{int(takesValue)}"
+                  for name, takesValue in self.options.items()]
+        lines += [f"choice\t{option}\t{value}"
+                  for option, values in self.choices.items()
+                  for value in values]
+        for language, names in self.types.items():
+            lines.append(f"language\t{language}")
+            lines += [f"type\t{language}\t{name}" for name in names]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                       suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # completes from memory this time
+
+    def complete(self, current: str, words: list[str]) -> list[str]:
+        """!
+        @param current string the word being completed, maybe empty
+        @param words list of the words before it, the command excluded
+        @returns list of the completions of current, in the order they are
+                 configured, empty if the shell should complete file names
+        """
+        positionals, command, expecting = [], False, None
+        for word in words:
+            if expecting is not None:
+                expecting = None
+            elif word.startswith("-") and word != "-":
+                name, assigned, _ = word.partition("=")
+                if self.options.get(name) and not assigned:
+                    expecting = name
+                command = command or name in COMMANDS
+            else:
+                positionals.append(word)
+
+        if expecting is not None:
+            if expecting == "--lang":
+                candidates = list(self.types)
+            else:
+                candidates = self.choices.get(expecting, [])
+        elif current.startswith("-"):
+            candidates = [name for name in self.options
+                          if name.startswith("--")]
+        elif command:
+            candidates = []
+        elif not positionals:
+            candidates = list(self.types)
+        elif len(positionals) == 1:
+            candidates = self.types.get(positionals[0], [])
+        else:
+            candidates = []
+        return [candidate for candidate in candidates
+                if candidate.startswith(current)]
+
+    @staticmethod
+    def configOf(words: list[str]) -> str | None:
+        """!
+        @param words list of the words of a command line
+        @returns string the `--config` given on it, None if there is none
+        """
+        config = None
+        for index, word in enumerate(words):
+            if word in ("-c", "--config") and index + 1 < len(words):
+                config = words[index + 1]
+            elif word.startswith("--config="):
+                config = word[len("--config="):]
+        return config
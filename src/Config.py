@@ -1,6 +1,7 @@
 import configparser
+import threading
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 
 class DataStruct:
@@ -21,6 +22,19 @@ class DataStruct:
     def __getitem__(self, attr: str) -> Any:
         return self.__dict__[attr]
 
+    def names(self) -> list[str]:
+        """!
+        @returns list of every member name
+        """
+        return list(self.__dict__)
+
+    def resolve(self) -> "DataStruct":
+        """!
+        make sure every member is loaded, see LazyDataStruct
+        @returns self
+        """
+        return self
+
     def __str__(self):
         return str(self.__dict__)
 
@@ -28,6 +42,68 @@ class DataStruct:
         return self.__str__()
 
 
+class LazyDataStruct(DataStruct):
+    """!
+    a DataStruct some of whose members are only loaded when first accessed,
+    e.g. the languages of a catalog kept in per-language config fragments.
+    vars() only holds the members loaded so far, iterate over those of
+    resolve() to get all of them.
+    """
+
+    __slots__ = ("_names", "_loaders", "_lock")
+
+    def __init__(self, loaders: dict[str, Callable[[], Any]] = None,
+                 **kwargs):
+        """!
+        @param loaders dict mapping member names to functions returning their
+               values, each called at most once
+        @param kwargs members that are already loaded
+        """
+        super().__init__(**kwargs)
+        self._loaders = dict(loaders or {})
+        self._names = list(kwargs) + list(self._loaders)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr: str) -> Any:
+        # only called for members not loaded yet, or being loaded by another
+        # thread, so whether it is a member is only known under the lock
+        try:
+            loaders = object.__getattribute__(self, "_loaders")
+        except AttributeError:
+            raise AttributeError(attr) from None
+        with self._lock:
+            if attr in loaders:
+                self.__dict__.setdefault(attr, loaders[attr]())
+                del loaders[attr]
+            elif attr not in self.__dict__:
+                raise AttributeError(attr)
+        return self.__dict__[attr]
+
+    def __getitem__(self, attr: str) -> Any:
+        try:
+            return getattr(self, attr)
+        except AttributeError:
+            raise KeyError(attr) from None
+
+    def names(self) -> list[str]:
+        """!
+        @returns list of every member name, loaded or not, without loading any
+        """
+        return list(self._names)
+
+    def resolve(self) -> DataStruct:
+        """!
+        load every member not loaded yet. Members are loaded in whatever order
+        they are first accessed, so vars() of self need not list them in the
+        order they were given in, vars() of the DataStruct returned does.
+        @returns DataStruct of every member, in the order of names()
+        """
+        for attr in self._names:
+            getattr(self, attr)
+        return DataStruct(**{attr: self.__dict__[attr]
+                             for attr in self._names})
+
+
 def getConfig(path: str) -> dict:
     """!
     read the config file and return the object as parsed by ConfigParser.
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from utils import cacheDir
+
+
+class ConfigCache:
+    """!
+    on-disk snapshot of the parsed configuration so that starting ProGenrtr
+    does not have to run configparser over every config location each time.
+
+    Snapshots are plain JSON, one file per `--config` argument so that loading
+    one config never reads the snapshot of another, and store the path, mtime
+    and size of every file that was consulted while parsing
+    (including the default locations that did not exist). A snapshot is only
+    used while every one of those files is unchanged.
+
+    The cache lives in `$XDG_CACHE_HOME/progenrtr` rather than the `[META]`
+    cacheDir, because `[META]` is itself part of what is being cached.
+    """
+
+    VERSION = 5
+
+    def __init__(self, path: Path = None):
+        """!
+        @param path directory the snapshots are kept in (optional)
+        """
+        self.path = path if path is not None else cacheDir() / "config"
+
+    def file(self, key: str) -> Path:
+        """!
+        @param key the cache key, see ConfMgr
+        @returns path of the file the snapshot for key is kept in
+        """
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return self.path / f"{digest}.json"
+
+    @staticmethod
+    def signature(paths: list[str]) -> list[list]:
+        """!
+        @param paths list of file paths that were consulted
+        @returns list of [path, mtime_ns, size] entries, the last two being
+                 None for paths that do not exist.
+        """
+        entries = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                entries.append([str(path), stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                entries.append([str(path), None, None])
+        return entries
+
+    def load(self, key: str) -> dict | None:
+        """!
+        @param key the cache key, see ConfMgr
+        @returns the stored snapshot for key if it is still valid, else None
+        """
+        try:
+            with open(self.file(key)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) \
+                or snapshot.get("version") != self.VERSION \
+                or snapshot.get("key") != key:
+            return None
+        paths = [entry[0] for entry in snapshot["signature"]]
+        if self.signature(paths) != snapshot["signature"]:
+            return None
+        return snapshot
+
+    def store(self, key: str, consulted: list[str], **data):
+        """!
+        save a snapshot of data under key, failures to write are ignored as
+        the cache is only ever an optimisation.
+        @param key the cache key, see ConfMgr
+        @param consulted list of every file path consulted to produce data
+        @param data the json serialisable values to store
+        """
+        snapshot = dict(data, version=self.VERSION, key=key,
+                        signature=self.signature(consulted))
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.file(key))
+        except OSError:
+            pass
@@ -0,0 +1,64 @@
+from Config import DataStruct
+
+
+class ConfigContext:
+    """!
+    An immutable snapshot of one parsed config: the `[META]` section, the
+    projects, template variables and hooks of every language and the command
+    line arguments it was parsed with. See ConfMgr.load().
+
+    Commands are handed a context rather than reaching for ConfMgr, so that
+    projects of different configs can be generated on different threads of
+    one process. Its members can not be reassigned, replace() makes a copy
+    with some of them changed instead. Languages kept in fragments are still
+    loaded on first access, which is safe from any thread.
+    """
+
+    __slots__ = ("args", "meta", "projects", "vars", "hooks", "__consulted")
+
+    def __init__(self, args: DataStruct = None, meta: DataStruct = None,
+                 projects: DataStruct = None, vars: DataStruct = None,
+                 hooks: DataStruct = None, consulted: list[str] = None):
+        """!
+        @param args DataStruct of the command line arguments
+        @param meta DataStruct of the `[META]` config section
+        @param projects DataStruct mapping languages to their projects
+        @param vars DataStruct mapping languages to their template variables
+        @param hooks DataStruct mapping languages to their hooks
+        @param consulted list of the file paths the config was read from,
+               which grows as fragments are read, see watched()
+        """
+        members = dict(args=args, meta=meta, projects=projects, vars=vars,
+                       hooks=hooks)
+        for name, value in members.items():
+            object.__setattr__(self, name,
+                               value if value is not None else DataStruct())
+        object.__setattr__(self, "_ConfigContext__consulted",
+                           consulted if consulted is not None else [])
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"ConfigContext is immutable, can not set "
+                             f"'{name}'")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"ConfigContext is immutable, can not delete "
+                             f"'{name}'")
+
+    def replace(self, **changes) -> "ConfigContext":
+        """!
+        @param changes the members to change, by name
+        @returns ConfigContext that is a copy of this one with changes made
+        """
+        members = {name: getattr(self, name) for name in
+                   ("args", "meta", "projects", "vars", "hooks")}
+        return ConfigContext(consulted=self.__consulted,
+                             **{**members, **changes})
+
+    def watched(self) -> list[str]:
+        """!
+        @returns list of every file path the config was read from, including
+                 the default locations that did not exist and the fragments
+                 read so far. Any change to them means the config needs
+                 parsing again.
+        """
+        return list(self.__consulted)
@@ -1,80 +1,151 @@
-from Config import getConfig, makeDataStruct, DataStruct
+from Config import getConfig, makeDataStruct, DataStruct, LazyDataStruct
+from ConfigCache import ConfigCache
+from ConfigContext import ConfigContext
 from utils import PROJECT_ROOT
-from os.path import expanduser
+from Trace import span
+from functools import partial
+from os.path import expanduser, abspath
 from pathlib import Path
+import os
 import sys
+import threading
 
 
-class ConfMgr(object):
+class ConfigLoader:
     """!
-    Singleton class responsble for parsing and making available config items to
-    the rest of the application.
-
-    This class only provides one public method, parse(), which can be used to
-    parse an explicitly specified config file path or it can be called with
-    default arguments in which case it will search a pre-defined list of
-    locations for an expected filename, if it doesnt find any matching files
-    it will use the fallback config.
+    Parses the config into a ConfigContext. It can parse an explicitly
+    specified config file path or search a pre-defined list of locations for
+    an expected filename, if it doesnt find any matching files it will use
+    the fallback config.
+
+    The result of parsing is kept in a ConfigCache and reused for as long as
+    none of the consulted files change, unless `--no-config-cache` is given.
+
+    A config may keep the catalog of any language in a fragment file,
+    `<config>.d/<language>.conf`, whose sections extend and override those of
+    the same name in the config itself. Fragments are read only once their
+    language is first looked up on projects, vars or hooks, so commands that
+    need a single language read a single fragment however large the catalog
+    is.
+
+    A loader parses a single config, use a new one for each. See ConfMgr.load.
     """
 
-    __fallbackPath = f"{PROJECT_ROOT}/templates/fallback.ini"
+    ## the directory of fragments belonging to a config file
+    FRAGMENT_DIR = "{}.d"
 
-    def __new__(cls):
-        """!
-        singleton mechanism, make sure that member variables are defined here
-        as they will be overwritten in __init__ as it gets called everytime a
-        'new' object is created.
-        """
-        if not hasattr(cls, 'instance'):
-            cls.instance = super(ConfMgr, cls).__new__(cls)
-            cls.instance.projects = DataStruct()
-            cls.instance.args = DataStruct()
-        return cls.instance
+    ## the suffix of fragment files
+    FRAGMENT_SUFFIX = ".conf"
 
-    @classmethod
-    def reset(cls):
-        """!
-        de-initialises the ConfigManager
-        """
-        if hasattr(cls, "instance"):
-            del ConfMgr.instance
+    __fallbackPath = f"{PROJECT_ROOT}/templates/fallback.ini"
 
-    def parse(self, args: dict):
+    def __init__(self):
+        self.projects = DataStruct()
+        self.args = DataStruct()
+        self.meta = DataStruct()
+        self.vars = DataStruct()
+        self.hooks = DataStruct()
+        self.__consulted = []
+        self.__fragmentConfigs = {}
+        # projects, vars and hooks each load their languages under a lock of
+        # their own, so reading a fragment takes one shared by all three
+        self.__fragmentLock = threading.Lock()
+
+    def load(self, args: dict) -> ConfigContext:
         """!
         parse the config file at the path provided or if none is provided then
         use the fallback config.
         @param args the dictionary of command line arguments
-        @return none, sets internal projects state
+        @returns ConfigContext of the config parsed
+        """
+        with span("config.parse") as parsing:
+            cached = self.__parse(args)
+            parsing.set(cached=cached,
+                        files=0 if cached else len(self.__consulted))
+        return ConfigContext(self.args, self.meta, self.projects, self.vars,
+                             self.hooks, self.__consulted)
+
+    def __parse(self, args: dict) -> bool:
+        """!
+        see parse()
+        @returns bool true iff the config was restored from the cache
         """
         try:
             self.__exitIfFallbackConfigDoesNotExists()
 
             self.args = DataStruct(**args)  # decoupling or untestable?
+            configArg = self.args["--config"]
+            cacheKey = "" if configArg is None else abspath(configArg)
+            useCache = not self.args.get("--no-config-cache", False)
+            if useCache and self.__loadCached(cacheKey):
+                return True
 
-            if self.args["--config"] is None:
+            fallback = getConfig(ConfigLoader.__fallbackPath)
+            self.meta = makeDataStruct(fallback, "META")
+            self.__consulted = [ConfigLoader.__fallbackPath]
+            usedFallback = False
+
+            if configArg is None:
                 cfgPaths = self.__getConfigLocationList()
                 self.projects = self.__getConfFromList(cfgPaths)
 
                 if self.projects is None:
                     print("WARNING: no config not found, using fallback!!")
-                    self.projects = self.__parseConfFileSections(
-                            ConfMgr.__fallbackPath
-                    )
+                    usedFallback = True
+                    self.projects = self.__makeCatalog(fallback, {})
             else:
-                self.__parseConfFileSections(self.args["--config"])
+                self.__consulted.append(cacheKey)
+                self.projects = self.__parseConfFileSections(configArg)
+
+            if useCache:
+                self.__storeCached(cacheKey, usedFallback)
+            return False
         except FileNotFoundError as e:
             print(f"ERROR: necessary file '{e}' not available")
             sys.exit(1)
 
+    def __loadCached(self, key: str) -> bool:
+        """!
+        restore meta and projects from the config cache
+        @param key the cache key, the absolute `--config` path or ""
+        @returns bool true iff a valid snapshot was found and loaded
+        """
+        snapshot = ConfigCache().load(key)
+        if snapshot is None:
+            return False
+        if snapshot["fallback"]:
+            print("WARNING: no config not found, using fallback!!")
+        self.__consulted = [entry[0] for entry in snapshot["signature"]]
+        self.meta = DataStruct(**snapshot["meta"])
+        self.__catalog = (snapshot["projects"], snapshot["vars"],
+                          snapshot["hooks"], snapshot["fragments"])
+        self.projects, self.vars, self.hooks = self.__makeLazy(*self.__catalog)
+        return True
+
+    def __storeCached(self, key: str, usedFallback: bool):
+        """!
+        save meta and projects to the config cache. Fragments are not part of
+        the snapshot, only where to find them, they are read when needed.
+        @param key the cache key, the absolute `--config` path or ""
+        @param usedFallback whether the projects came from the fallback config
+        """
+        projects, variables, hooks, fragments = self.__catalog
+        ConfigCache().store(
+            key, self.__consulted,
+            fallback=usedFallback,
+            meta=vars(self.meta),
+            vars=variables, hooks=hooks, projects=projects,
+            fragments=fragments,
+        )
+
     def __getConfigLocationList(self) -> list[str]:
         """!
-        parse the `[META]` section of the fallback config to retrieve the
+        use the `[META]` section of the fallback config to retrieve the
         default locations at which config is expected to exist.
 
         @return List[str] where each entry is a filesystem path
         """
-        meta = makeDataStruct(getConfig(ConfMgr.__fallbackPath), "META")
-        return meta.cfgpaths.replace("\n", "").split(",")
+        return self.meta.cfgpaths.replace("\n", "").split(",")
 
     def __getConfFromList(self, paths: list[str]) -> DataStruct | None:
         """!
@@ -85,7 +156,11 @@ class ConfMgr(object):
         """
         for location in paths:
             path = expanduser(location)
-            if self.__configPathExists(path):
+            self.__consulted.append(path)
+            with span("config.probe", path=path) as probe:
+                found = self.__configPathExists(path)
+                probe.set(found=found)
+            if found:
                 try:
                     return self.__parseConfFileSections(path)
                 except Exception as e:
@@ -103,7 +178,7 @@ class ConfMgr(object):
         else:
             return False
 
-    def __parseConfFileSections(self, path: str) -> DataStruct:
+    def __parseConfFileSections(self, path: str) -> LazyDataStruct:
         """!
         This needs to parse all sections: language section defines which other
         sections exist.
@@ -112,25 +187,130 @@ class ConfMgr(object):
         cloneable URLs.
 
         @param path, string representing the path of the config file to use.
-        @returns none
+        @returns LazyDataStruct of projects, see __makeCatalog
         """
         try:
             config = getConfig(path)
         except FileNotFoundError as fe:
             print(f"ERROR: {str(fe)}")
             sys.exit(1)
+        return self.__makeCatalog(config, self.__findFragments(path))
+
+    def __findFragments(self, path: str) -> dict[str, str]:
+        """!
+        list the fragments belonging to the config at path without reading
+        any of them. The directory is consulted so that adding or removing a
+        fragment invalidates the cached config.
 
+        @param path string path of the config file
+        @returns dict mapping languages to the paths of their fragments
+        """
+        directory = ConfigLoader.FRAGMENT_DIR.format(path)
+        self.__consulted.append(directory)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return {}
+        return {name[:-len(ConfigLoader.FRAGMENT_SUFFIX)]:
+                os.path.join(directory, name) for name in sorted(names)
+                if name.endswith(ConfigLoader.FRAGMENT_SUFFIX)}
+
+    def __makeCatalog(self, config, fragments: dict[str, str]) \
+            -> LazyDataStruct:
+        """!
+        build projects and vars from a parsed config, one entry per language
+        listed in the `[ProGenrtr]` section that has a `[project.<language>]`
+        section or a fragment. The template variables of every language are
+        those of the `[vars]` section overridden by those of its
+        `[vars.<language>]` section, and likewise for the post-generation
+        hooks of the `[hooks]` and `[hooks.<language>]` sections.
+
+        @param config the parsed config, see Config.getConfig
+        @param fragments dict mapping languages to their fragment paths
+        @returns LazyDataStruct mapping each language to a DataStruct of
+                 projects, vars and hooks are set to the same for variables
+                 and hooks
+        """
         # Extract the languages
         langs = makeDataStruct(config, attribute="ProGenrtr").languages.split(',')
         langs = [s.strip() for s in langs]  # Clean newline characters
-        # Create a dictionary to hold DataStructs
-        projects = dict()
+        common = self.__section(config, "vars")
+        commonHooks = self.__section(config, "hooks")
+        projects, variables, hooks = dict(), dict(), dict()
 
         for lang in langs:
-            if f"project.{lang}" in config:
-                projects[lang] = makeDataStruct(config, attribute=f"project.{lang}")
+            section = f"project.{lang}"
+            if section in config or lang in fragments:
+                projects[lang] = dict(config[section]) \
+                    if section in config else {}
+            specific = self.__section(config, f"vars.{lang}")
+            variables[lang] = {**common, **specific}
+            specific = self.__section(config, f"hooks.{lang}")
+            hooks[lang] = {**commonHooks, **specific}
+
+        fragments = {lang: path for lang, path in fragments.items()
+                     if lang in variables}
+        self.__catalog = (projects, variables, hooks, fragments)
+        projects, self.vars, self.hooks = self.__makeLazy(*self.__catalog)
+        return projects
+
+    def __makeLazy(self, projects: dict, variables: dict, hooks: dict,
+                   fragments: dict[str, str]) -> tuple:
+        """!
+        @param projects dict mapping languages to the projects of the config
+        @param variables dict mapping languages to the variables of the config
+        @param hooks dict mapping languages to the hooks of the config
+        @param fragments dict mapping languages to their fragment paths
+        @returns tuple of LazyDataStructs of projects, of variables and of
+                 hooks, each language with a fragment being loaded on first
+                 access
+        """
+        def lazy(values: dict, prefix: str) -> LazyDataStruct:
+            return LazyDataStruct({
+                lang: partial(self.__readFragment, fragments[lang],
+                              f"{prefix}.{lang}", base)
+                if lang in fragments else partial(DataStruct, **base)
+                for lang, base in values.items()})
 
-        return DataStruct(**projects)
+        return lazy(projects, "project"), lazy(variables, "vars"), \
+            lazy(hooks, "hooks")
+
+    def __readFragment(self, path: str, section: str, base: dict) \
+            -> DataStruct:
+        """!
+        @param path string path of a fragment
+        @param section the name of the section wanted from the fragment
+        @param base dict of the values the config itself gives the section
+        @returns DataStruct of base updated with the section of the fragment
+        """
+        with self.__fragmentLock:
+            config = self.__fragmentConfigs.get(path)
+            if config is None:
+                with span("config.fragment", path=path):
+                    try:
+                        config = getConfig(path)
+                    except FileNotFoundError as fe:
+                        print(f"ERROR: {str(fe)}")
+                        sys.exit(1)
+                self.__fragmentConfigs[path] = config
+                self.__consulted.append(path)
+        extra = self.__section(config, section)
+        return DataStruct(**{**base, **extra})
+
+    @staticmethod
+    def __section(config, section: str) -> dict:
+        """!
+        @param config the parsed config, see Config.getConfig
+        @param section the name of the section wanted
+        @returns dict of the options of section, empty if it has none. Hooks
+                 are shell commands, so they are read raw and any `$` in them
+                 is left to the shell rather than interpolated.
+        """
+        if section not in config:
+            return {}
+        if section == "hooks" or section.startswith("hooks."):
+            return dict(config.items(section, raw=True))
+        return dict(config[section])
 
     def __exitIfFallbackConfigDoesNotExists(self) -> None:
         """!
@@ -139,3 +319,90 @@ class ConfMgr(object):
         """
         if Path(self.__fallbackPath).exists() is False:
             raise FileNotFoundError(self.__fallbackPath)
+
+
+class ConfMgr(object):
+    """!
+    Singleton keeping the ConfigContext of the config the process was started
+    with, for the code that does not hand contexts around.
+
+    parse() replaces the context as a whole, so a thread reading `context`
+    always sees one config or the other and never a mix of the two. projects,
+    meta and the other members read and replace those of the current context,
+    use `context` to read several of them from the same config. load()
+    parses a config without touching the singleton at all.
+    """
+
+    ## guards creating the singleton and replacing its context
+    __lock = threading.Lock()
+
+    def __new__(cls):
+        """!
+        singleton mechanism, the first caller creates the instance and every
+        caller, on any thread, gets that same one.
+        """
+        instance = getattr(cls, "instance", None)
+        if instance is None:
+            with cls.__lock:
+                instance = getattr(cls, "instance", None)
+                if instance is None:
+                    instance = super(ConfMgr, cls).__new__(cls)
+                    instance.__context = ConfigContext()
+                    cls.instance = instance
+        return instance
+
+    @classmethod
+    def reset(cls):
+        """!
+        de-initialises the ConfigManager
+        """
+        with cls.__lock:
+            if hasattr(cls, "instance"):
+                del ConfMgr.instance
+
+    @staticmethod
+    def load(args: dict) -> ConfigContext:
+        """!
+        parse a config, leaving the singleton as it is
+        @param args the dictionary of command line arguments
+        @returns ConfigContext of the config parsed, see ConfigLoader
+        """
+        return ConfigLoader().load(args)
+
+    def parse(self, args: dict):
+        """!
+        parse a config, see load(), and make it the current context
+        @param args the dictionary of command line arguments
+        """
+        context = self.load(args)
+        with ConfMgr.__lock:
+            self.__context = context
+
+    @property
+    def context(self) -> ConfigContext:
+        """!
+        the ConfigContext of the config parsed last
+        """
+        return self.__context
+
+    def watched(self) -> list[str]:
+        """!
+        @returns list of every file path the current config was read from, see
+                 ConfigContext.watched
+        """
+        return self.__context.watched()
+
+    def __replace(self, **changes):
+        with ConfMgr.__lock:
+            self.__context = self.__context.replace(**changes)
+
+    args = property(lambda self: self.__context.args,
+                    lambda self, value: self.__replace(args=value))
+    meta = property(lambda self: self.__context.meta,
+                    lambda self, value: self.__replace(meta=value))
+    projects = property(lambda self: self.__context.projects,
+                        lambda self, value: self.__replace(projects=value))
+    vars = property(lambda self: self.__context.vars,
+                    lambda self, value: self.__replace(vars=value))
+    hooks = property(lambda self: self.__context.hooks,
+                     lambda self, value: self.__replace(hooks=value))
@@ -0,0 +1,276 @@
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from ConfigManager import ConfMgr as Conf
+from LocalCopy import LocalCopy
+from ProjectGenerator import ProjectGenerator
+from ProjectManifest import ProjectManifest, blobHash
+from TemplateArchive import TemplateArchive, archiveSuffix
+from TemplateCache import TemplateCache
+from TemplateExport import listTree
+from TemplateLayers import resolveLayers
+from TemplateSource import parseSource, splitLayers
+from TemplateSubmodules import TemplateSubmodules
+from utils import cacheDir
+
+
+class DriftScanner:
+    """!
+    Reports how far generated projects have drifted from their templates.
+
+    Every project's manifest (see ProjectManifest) records the hash of each
+    file as it was generated. Comparing those against the files in the project
+    now and against the template as it is now tells, per file, whether the
+    project was edited (`modified`, `deleted`), the template moved on
+    (`outdated`, `new`, `removed`) or both (`conflict`).
+
+    The templates are snapshotted once per distinct template and ref, straight
+    from git's own blob hashes where possible, and the projects are then
+    scanned concurrently. File hashes are remembered per project in
+    `<cacheDir>/hashes.json` against each file's mtime and size, so a repeat
+    scan only re-reads the files that changed since the last one. A scan
+    keeps only the files a project still has, and forgets the projects that
+    no longer exist, so the cache does not outgrow the projects scanned.
+    """
+
+    ## the layout of the hash cache, a cache of any other is ignored
+    CACHE_VERSION = 2
+
+    DEFAULT_JOBS = 4
+
+    def __init__(self, config: ConfigContext = None,
+                 jobs: int = DEFAULT_JOBS, refresh: bool = False):
+        """!
+        @param config ConfigContext whose `[META]` section locates the caches,
+               that of ConfMgr if not given
+        @param jobs the number of projects scanned concurrently
+        @param refresh fetch cached template mirrors even if not stale yet
+        """
+        self.config = config if config is not None else Conf().context
+        self.meta = self.config.meta
+        self.jobs = max(1, jobs)
+        self.refresh = refresh
+        self.cachePath = cacheDir(self.meta) / "hashes.json"
+        self.__hashes = {}
+
+    def run(self, args: dict):
+        """!
+        entry point to this command
+        @param args the dictionary of command line arguments provided at the
+               command line.
+        """
+        fmt = args.get("--format") or "text"
+        if fmt not in ("text", "ndjson"):
+            sys.exit(f"ERROR: unknown format '{fmt}'")
+        self.jobs = max(1, int(args.get("--jobs") or self.DEFAULT_JOBS))
+        self.refresh = args.get("--refresh", False)
+        results = self.scan(args["<PROJECT_DIR>"])
+
+        for result in results:
+            if fmt == "ndjson":
+                print(json.dumps(vars(result)))
+            elif result.error is not None:
+                print(f"[error]   {result.path}: {result.error}")
+            elif not result.files:
+                print(f"[clean]   {result.path}")
+            else:
+                print(f"[drifted] {result.path} ({result.template} "
+                      f"{result.ref}): {len(result.files)} files")
+                for status, name in result.files:
+                    print(f"    {status:<9} {name}")
+        failed = sum(r.error is not None for r in results)
+        drifted = sum(bool(r.files) for r in results)
+        if fmt == "text":
+            print(f"{len(results) - failed - drifted} clean, {drifted} "
+                  f"drifted, {failed} failed")
+        if failed or drifted:
+            sys.exit(1)
+
+    def scan(self, paths: list[str]) -> list[DataStruct]:
+        """!
+        compare every project against the current snapshot of its template
+        @param paths list of project directories
+        @returns list of DataStructs, one per path in order, holding the path,
+                 template, ref, the drifted files as a sorted list of
+                 (status, file) pairs and the error message (or None).
+        """
+        self.__hashes = self.__loadCache()
+        manifests = {}
+        for path in paths:
+            try:
+                manifests[path] = ProjectManifest.read(path)
+            except (OSError, ValueError) as e:
+                manifests[path] = e
+
+        sources = sorted({(m.template, m.ref) for m in manifests.values()
+                          if isinstance(m, DataStruct)})
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            snapshots = dict(zip(sources, pool.map(self.__trySnapshot,
+                                                   sources)))
+            results = list(pool.map(
+                lambda path: self.__scanOne(path, manifests[path], snapshots),
+                paths))
+        self.__storeCache()
+        return results
+
+    def snapshot(self, template: str, ref: str) -> dict[str, str]:
+        """!
+        @param template string URL or path of a template
+        @param ref string the ref of the template
+        @returns dict mapping each file the template would generate to its
+                 git blob hash, as generating from it now would produce.
+                 The files of its submodules are included, as they are
+                 flattened into the projects generated from it. The layers
+                 of a layered template are merged as generating merges them,
+                 ref being that of its base layer.
+        """
+        layers = splitLayers(template)
+        if len(layers) > 1:
+            snapshots = [self.snapshot(layer, ProjectGenerator.templateRef(
+                layer, {"--ref": ref if index == 0 else None}))
+                for index, layer in enumerate(layers)]
+            kept = resolveLayers([dict.fromkeys(files, False)
+                                  for files in snapshots])
+            return {name: blob for files, names in zip(snapshots, kept)
+                    for name, blob in files.items() if name in names}
+        source = parseSource(template)
+        if archiveSuffix(source.url):
+            files = TemplateArchive(source.url).blobs(source.subdir)
+        elif TemplateCache.isRemote(source.url):
+            cache = TemplateCache(self.meta)
+            files = cache.listTree(source.url, ref, self.refresh,
+                                   source.subdir)
+            repo = cache.mirrorPath(source.url, bool(source.subdir))
+            files.update(self.__submoduleFiles(repo, ref, source))
+        else:
+            local = source.url.removeprefix("file://")
+            if ref == "HEAD" and LocalCopy.isLocalTree(local):
+                # local templates are copied from their working tree, only
+                # the submodules not checked out in it are fetched
+                tree = os.path.join(local, source.subdir or "")
+                files = self.__hash(tree, LocalCopy().listFiles(
+                    local, ProjectGenerator.GIT_FILES, source.subdir))
+                if LocalCopy.commit(local):
+                    for name, blob in self.__submoduleFiles(
+                            local, ref, source).items():
+                        files.setdefault(name, blob)
+            else:
+                files = listTree(local, ref, source.subdir)
+                files.update(self.__submoduleFiles(local, ref, source))
+        # the git files are removed from generated projects
+        for name in ProjectGenerator.GIT_FILES:
+            files.pop(name, None)
+        # as are those of the submodules
+        return {name: blob for name, blob in files.items()
+                if os.path.basename(name) != ".gitmodules"}
+
+    def __submoduleFiles(self, repo: str, ref: str,
+                         source: DataStruct) -> dict[str, str]:
+        return TemplateSubmodules(self.meta, self.jobs, self.refresh) \
+            .listTree(repo, ref, source.url, source.subdir)
+
+    def __trySnapshot(self, source: tuple[str, str]):
+        try:
+            return self.snapshot(*source)
+        except Exception as e:
+            return e
+
+    def __scanOne(self, path: str, manifest, snapshots: dict) -> DataStruct:
+        result = DataStruct(path=path, template=None, ref=None, files=[],
+                            error=None)
+        if not isinstance(manifest, DataStruct):
+            result.error = f"no readable manifest. {manifest}"
+            return result
+        result.template, result.ref = manifest.template, manifest.ref
+        template = snapshots[(manifest.template, manifest.ref)]
+        if not isinstance(template, dict):
+            result.error = f"could not read template. {template}"
+            return result
+
+        generated = manifest.files
+        # registered submodules are fetched by git, not generated
+        registered = tuple(f"{sub}/" for sub in manifest.get("submodules")
+                           or ())
+        if registered:
+            template = {name: blob for name, blob in template.items()
+                        if not name.startswith(registered)}
+        # rendered files are compared with the template file they came from
+        origins = manifest.get("origins") or {}
+        sources = {name: origins[name][0] if name in origins else name
+                   for name in generated}
+        renamed = {source: name for name, source in sources.items()}
+        names = sorted(generated.keys() |
+                       {renamed.get(name, name) for name in template})
+        current = self.__hash(path, names)
+        for name in names:
+            was, now = generated.get(name), current[name]
+            theirs = template.get(sources.get(name, name))
+            base = origins[name][1] if name in origins else was
+            local, upstream = now != was, theirs != base
+            if not (local or upstream) or (local and upstream and
+                                           base == was and now == theirs):
+                continue
+            if local and upstream:
+                status = "conflict"
+            elif local:
+                status = "deleted" if now is None else "modified"
+            else:
+                status = "removed" if theirs is None else \
+                    "new" if base is None else "outdated"
+            result.files.append((status, name))
+        return result
+
+    def __hash(self, root: str, files: list[str]) -> dict[str, str]:
+        """!
+        blob hash files below root, re-reading only those whose mtime or size
+        differ from when they were last hashed. The cache of root is left
+        holding just the files that still exist.
+        """
+        root = os.path.abspath(root)
+        cached = self.__hashes.get(root) or {}
+        hashes, kept = {}, {}
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                info = os.lstat(path)
+            except FileNotFoundError:
+                hashes[name] = None
+                continue
+            key = [info.st_mtime_ns, info.st_size]
+            known = cached.get(name)
+            if known is None or known[:2] != key:
+                known = key + [blobHash(path)]
+            hashes[name] = known[2]
+            kept[name] = known
+        self.__hashes[root] = kept
+        return hashes
+
+    def __loadCache(self) -> dict:
+        try:
+            with open(self.cachePath) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or \
+                cache.get("version") != self.CACHE_VERSION:
+            return {}
+        return cache.get("projects") or {}
+
+    def __storeCache(self):
+        projects = {root: files for root, files in self.__hashes.items()
+                    if os.path.isdir(root)}
+        try:
+            self.cachePath.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cachePath.parent,
+                                       suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": self.CACHE_VERSION,
+                           "projects": projects}, f, separators=(",", ":"))
+            os.replace(tmp, self.cachePath)
+        except OSError:
+            pass
@@ -0,0 +1,385 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+from pathlib import Path
+
+from ThreadOutput import ThreadOutput
+from utils import checkJobs, daemonSocket
+
+## arguments holding paths, made absolute by the client as the daemon does not
+## share its working directory
+PATH_ARGS = ("<PROJECT_PATH>", "--config", "--bundle")
+
+
+class GeneratorDaemon:
+    """!
+    Serves `--list` and project generation requests over a local Unix socket,
+    so that callers making many requests pay for interpreter startup, module
+    imports and config parsing once rather than on every call.
+
+    The protocol is one JSON object per line. A request holds the docopt
+    arguments of a command line and the client's working directory. The daemon
+    answers either why it `declined` the request, in which case the client
+    runs the command itself, or that it `accepted` it, followed once the
+    command is done by the `status`, `stdout` and `stderr` of running it.
+    Once a request is accepted the client never runs it again itself, even if
+    the connection drops, as the daemon may have generated the project by
+    then. Requests are queued into a pool of worker threads, up to QUEUE of
+    them at once.
+
+    Requests may name any config, each is parsed once into a ConfigContext
+    of its own and parsed again whenever one of the files it was read from
+    changes, so requests for different configs are served side by side.
+
+    Paths given on the command line are made absolute by the client, template
+    paths in the config are made absolute against the client's working
+    directory, so they mean what they would running ProGenrtr there. The
+    client sends its environment too, which git identities, hooks and the
+    default config locations depend on. As it is shared by every thread of
+    the daemon, requests whose environment differs from the daemon's, or
+    that would look for the config relative to another working directory,
+    are declined rather than served differently from a local run.
+    """
+
+    DEFAULT_JOBS = 4
+
+    ## requests accepted at once, queued or running, before declining more
+    QUEUE = 64
+
+    ## the longest request accepted, in bytes
+    MAX_REQUEST = 1024 * 1024
+
+    ## environment variables shells set of their own accord, which change
+    ## nothing about a request
+    SHELL_ENV = ("PWD", "OLDPWD", "SHLVL", "_")
+
+    def __init__(self, args: dict, jobs: int = DEFAULT_JOBS,
+                 path: Path = None):
+        """!
+        @param args the dictionary of command line arguments the daemon was
+               started with, its config has already been parsed from them
+               into ConfMgr
+        @param jobs the number of requests served concurrently
+        @param path the socket to listen on, see utils.daemonSocket
+        """
+        from ConfigCache import ConfigCache
+        from ConfigManager import ConfMgr
+
+        self.noConfigCache = args.get("--no-config-cache")
+        self.config = None if args.get("--config") is None \
+            else os.path.abspath(args["--config"])
+        self.jobs = max(1, jobs)
+        self.path = Path(path) if path is not None else daemonSocket()
+        context = ConfMgr().context
+        # the context of every config served and the signature of its files
+        self.__configs = {self.config: (
+            context, ConfigCache.signature(context.watched()))}
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(self.QUEUE)
+        self.__server = None
+
+    def run(self):
+        """!
+        entry point to this command, serves until interrupted or terminated
+        """
+        import signal
+
+        # load now what the first requests would otherwise have to wait for
+        import git  # noqa: F401
+        import ProjectGenerator  # noqa: F401
+        import ProjectTypesList  # noqa: F401
+
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(
+            target=self.stop).start())
+        try:
+            self.serve()
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            sys.exit(f"ERROR: could not listen on '{self.path}'. {e}")
+
+    def serve(self, ready: threading.Event = None):
+        """!
+        listen on the socket and serve requests until stop() is called
+        @param ready event set once the socket accepts connections (optional)
+        """
+        # only the daemon needs these, the client is kept quick to start
+        import socketserver
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.__claimSocket()
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        accept = self.__accept
+
+        class Server(socketserver.UnixStreamServer):
+            def process_request(self, request, address):
+                accept(self, pool, request)
+
+        old = os.umask(0o077)  # only the user may connect
+        try:
+            self.__server = Server(str(self.path), None)
+        finally:
+            os.umask(old)
+        try:
+            print(f"listening on {self.path}", flush=True)
+            if ready is not None:
+                ready.set()
+            self.__server.serve_forever()
+        finally:
+            pool.shutdown(wait=True)
+            self.__server.server_close()
+            for name in ("stdout", "stderr"):
+                if isinstance(getattr(sys, name), ThreadOutput):
+                    setattr(sys, name, getattr(sys, name).stream)
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def stop(self):
+        """!
+        stop serving, once the requests being served have been answered
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+
+    def __accept(self, server: "socketserver.BaseServer",
+                 pool: "ThreadPoolExecutor", connection: socket.socket):
+        """!
+        queue the request on connection, or decline it if the queue is full
+        """
+        if not self.__slots.acquire(blocking=False):
+            self.__respond(connection, {"declined": "busy"})
+            server.shutdown_request(connection)
+            return
+
+        def handle():
+            try:
+                self.__handle(connection)
+            finally:
+                self.__slots.release()
+                server.shutdown_request(connection)
+
+        pool.submit(handle)
+
+    def __claimSocket(self):
+        """!
+        remove the socket left behind by a daemon that is no longer running
+        @exception OSError if another daemon is listening on the socket
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            return
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(str(self.path))
+        except OSError:
+            self.path.unlink()
+            return
+        raise OSError("another daemon is already listening")
+
+    def __handle(self, connection: socket.socket):
+        """!
+        read a request from connection, serve it and write the response
+        """
+        try:
+            request = json.loads(receive(connection, self.MAX_REQUEST))
+            args, cwd, env = request["args"], request["cwd"], request["env"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.__respond(connection, {"declined": f"bad request. {e}"})
+            return
+        reason = self.__decline(args, cwd, env)
+        if reason is not None:
+            self.__respond(connection, {"declined": reason})
+            return
+        self.__respond(connection, {"accepted": True})
+        self.__respond(connection, self.__serve(args, cwd))
+
+    def __decline(self, args: dict, cwd: str, env: dict) -> str | None:
+        """!
+        @param cwd string the client's working directory
+        @param env dict the client's environment
+        @returns string reason the daemon will not serve args, None if it will
+        """
+        if not isinstance(args, dict) or not isinstance(cwd, str) \
+                or not os.path.isabs(cwd) or not isinstance(env, dict):
+            return "bad request"
+        differ = sorted(name for name in env.keys() | os.environ.keys()
+                        if name not in self.SHELL_ENV
+                        and env.get(name) != os.environ.get(name))
+        if differ:
+            return "the environment differs from the daemon's in " + \
+                ", ".join(differ)
+        if args.get("--timings") or args.get("--trace"):
+            return "timings are only taken of local runs"
+        if not args.get("--list") and (args.get("--batch") or args.get(
+                "--drift") or args.get("--daemon")
+                or not args.get("<PROJECT_TYPE>")):
+            return "only --list and generation are served"
+        if args.get("--config") is None and cwd != os.getcwd() and any(
+                not os.path.isabs(path)
+                for path in self.__context(None).watched()):
+            return "the config is looked for relative to the working " \
+                "directory"
+        return None
+
+    def __context(self, config: str | None) -> "ConfigContext":
+        """!
+        @param config string absolute path of the config, None for the one
+               found in the default locations
+        @returns ConfigContext of config, parsed the first time it is asked
+                 for and again if any file it was read from has changed
+        """
+        from ConfigCache import ConfigCache
+        from ConfigManager import ConfMgr
+
+        with self.__lock:
+            context, signature = self.__configs.get(config, (None, None))
+            if context is None or \
+                    ConfigCache.signature(context.watched()) != signature:
+                context = ConfMgr.load({
+                    "--config": config,
+                    "--no-config-cache": self.noConfigCache})
+                self.__configs[config] = (
+                    context, ConfigCache.signature(context.watched()))
+            return context
+
+    def __serve(self, args: dict, cwd: str) -> dict:
+        """!
+        run the command of args with its output captured
+        @param cwd string the client's working directory, that relative
+               template paths in the config are resolved against
+        @returns dict response holding the `status`, `stdout` and `stderr`
+        """
+        import traceback
+        from ProjectGenerator import ProjectGenerator
+        from ProjectTypesList import ProjectTypesList
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        outputs = self.__outputs()
+        outputs[0].local.buffer, outputs[1].local.buffer = stdout, stderr
+        status = 0
+        try:
+            checkJobs(args)
+            context = self.__context(args.get("--config"))
+            # a plain listing shows the config as it is written
+            if not args["--list"] or args.get("--check"):
+                context = context.replace(
+                    projects=self.__rooted(context.projects, cwd))
+            if args["--list"]:
+                ProjectTypesList(context).run(args)
+            else:
+                ProjectGenerator(context).run(args)
+        except SystemExit as e:
+            # as the interpreter would report it
+            if isinstance(e.code, int) or e.code is None:
+                status = e.code or 0
+            else:
+                print(e.code, file=stderr)
+                status = 1
+        except Exception:
+            traceback.print_exc(file=stderr)
+            status = 1
+        finally:
+            outputs[0].local.buffer = outputs[1].local.buffer = None
+        return {"status": status, "stdout": stdout.getvalue(),
+                "stderr": stderr.getvalue()}
+
+    @staticmethod
+    def __rooted(projects: "DataStruct", cwd: str) -> "LazyDataStruct":
+        """!
+        @returns LazyDataStruct of projects with every template path made
+                 absolute against cwd, see absoluteSource. Each language is
+                 only looked up on projects once it is looked up on the
+                 result, so a request reads no more fragments than it would
+                 otherwise.
+        """
+        from Config import DataStruct, LazyDataStruct
+        from TemplateSource import absoluteSource
+
+        def language(name: str) -> DataStruct:
+            return DataStruct(**{
+                project: absoluteSource(source, cwd) for project, source
+                in vars(projects.get(name).resolve()).items()})
+
+        return LazyDataStruct({name: (lambda name=name: language(name))
+                               for name in projects.names()})
+
+    def __outputs(self) -> tuple[ThreadOutput, ThreadOutput]:
+        """!
+        @returns the ThreadOutputs standing in for sys.stdout and sys.stderr,
+                 installing them first unless they already are
+        """
+        with self.__lock:
+            for name in ("stdout", "stderr"):
+                if not isinstance(getattr(sys, name), ThreadOutput):
+                    setattr(sys, name, ThreadOutput(getattr(sys, name)))
+            return sys.stdout, sys.stderr
+
+    def __respond(self, connection: socket.socket, response: dict):
+        try:
+            connection.sendall(json.dumps(response).encode() + b"\n")
+        except OSError:
+            pass  # the client is gone, nobody is left to tell
+
+
+def receive(connection: socket.socket, limit: int) -> bytes:
+    """!
+    @param connection the socket to read from
+    @param limit the most bytes to read
+    @returns bytes read up to the first newline, or to the end of the stream
+    @exception ValueError if nothing complete arrived within limit bytes
+    """
+    data = bytearray()
+    while len(data) <= limit:
+        chunk = connection.recv(65536)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+        end = data.find(b"\n")
+        if end != -1:
+            return bytes(data[:end])
+    raise ValueError(f"more than {limit} bytes")
+
+
+def request(args: dict, path: Path = None, timeout: float = None) -> dict:
+    """!
+    send the command line args to a running daemon, see GeneratorDaemon
+    @param args the dictionary of command line arguments
+    @param path the socket the daemon listens on, see utils.daemonSocket
+    @param timeout seconds to wait for the response, None to wait for as long
+           as the command takes
+    @returns dict response of the daemon, with `declined` set if no daemon
+             is listening or it declined the request. Once the daemon has
+             accepted the request it is never `declined`, if the connection
+             drops the response reports that as a failure.
+    """
+    args = dict(args)
+    for key in PATH_ARGS:
+        if args.get(key) is not None:
+            args[key] = os.path.abspath(args[key])
+    path = Path(path) if path is not None else daemonSocket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(str(path))
+            connection.settimeout(timeout)
+            connection.sendall(json.dumps({
+                "args": args, "cwd": os.getcwd(),
+                "env": dict(os.environ)}).encode() + b"\n")
+            lines = connection.makefile("rb")
+            answer = json.loads(lines.readline())
+        except (OSError, ValueError) as e:
+            return {"declined": f"no daemon on '{path}'. {e}"}
+        if not answer.get("accepted"):
+            return answer
+        try:
+            return json.loads(lines.readline())
+        except (OSError, ValueError) as e:
+            # the project may well have been generated by now, so running
+            # the command again locally could do it twice
+            return {"status": 1, "stdout": "",
+                    "stderr": f"ERROR: lost the daemon on '{path}' while it "
+                              f"served the request. {e}\n"}
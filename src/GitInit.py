@@ -0,0 +1,340 @@
+import hashlib
+import io
+import os
+import stat
+import struct
+import time
+import zlib
+
+from ProjectManifest import blobHash
+
+
+class GitInit:
+    """!
+    Initialises a new git repository, and its first commit, by writing the
+    repository files directly instead of running `git init` and `git commit`.
+
+    The repository is laid out as `git init` would lay it out, with HEAD on
+    `master`. Its first commit is either empty, or holds the tree of files
+    given. In the latter case the blob hashes already known for those files
+    (see ProjectManifest) are reused rather than re-hashing the tree ahead of
+    time, every object is written into a single pack and the index is
+    written to match, so the files committed are clean straight away. Any
+    other file in the working tree is left untracked. Blobs are hashed as
+    they are streamed into the pack, and should a file no longer match the
+    hash it was given, say as a filter changed it on export, the pack is
+    written again under the hashes of the files as they are.
+
+    Only the user's identity is read through GitPython's config parser, no
+    git process is started.
+    """
+
+    BRANCH = "master"
+    MESSAGE = "#===>[BEGIN]<===#"
+
+    ## the modes git records for files, executables, symlinks and trees
+    FILE, EXECUTABLE, SYMLINK, TREE = 0o100644, 0o100755, 0o120000, 0o40000
+
+    ## the mode git records for submodules, whose entries name a commit
+    GITLINK = 0o160000
+
+    ## the stat data recorded for index entries without a file of their own
+    NO_STAT = os.stat_result((0,) * os.stat_result.n_fields)
+
+    ## object type numbers used in pack files
+    PACK_TYPES = {b"commit": 1, b"tree": 2, b"blob": 3}
+
+    ## bytes of a file read into the pack at a time
+    CHUNK = 1024 * 1024
+
+    def __init__(self, path: str):
+        """!
+        @param path string path of the working tree to initialise
+        """
+        self.path = path
+        self.gitDir = os.path.join(path, ".git")
+
+    def init(self, files: dict[str, str | None] = None,
+             gitlinks: dict[str, str] = None) -> str:
+        """!
+        create the repository and its first commit on master
+        @param files dict mapping the relative paths of the files to commit to
+               their blob hashes (None where it is not known), or None for an
+               empty first commit
+        @param gitlinks dict mapping the relative paths of submodules to the
+               commits to record for them, committed along with files. Their
+               `.gitmodules` is one of files (optional)
+        @returns string hash of the first commit
+        @exception FileExistsError if path already contains a repository
+        @exception RuntimeError if no user identity is configured
+        """
+        os.makedirs(self.path, exist_ok=True)
+        os.mkdir(self.gitDir)
+        self.__writeSkeleton()
+        author = self.__identity("author")
+        committer = self.__identity("committer")
+
+        files = dict(files or {})
+        while True:
+            objects = []
+            entries = []
+            for name in sorted(files):
+                info = os.lstat(os.path.join(self.path, name))
+                blob = files[name] or blobHash(os.path.join(self.path, name))
+                entries.append((name, self.__mode(info), bytes.fromhex(blob),
+                                info))
+                objects.append((b"blob", bytes.fromhex(blob), name))
+            for name, commit in sorted((gitlinks or {}).items()):
+                # the commit lives in the submodule's repository, not in the
+                # pack
+                entries.append((name, self.GITLINK, bytes.fromhex(commit),
+                                self.NO_STAT))
+            tree = self.__writeTrees(entries, objects)
+            body = (f"tree {tree.hex()}\nauthor {author}\n"
+                    f"committer {committer}\n\n{self.MESSAGE}\n").encode()
+            commit = self.__hash(b"commit", body)
+            objects.append((b"commit", commit, body))
+
+            changed = self.__writePack(objects)
+            if not changed:
+                break
+            files.update(changed)
+        self.__writeIndex(entries)
+        self.__writeFile(f"refs/heads/{self.BRANCH}", f"{commit.hex()}\n")
+        log = (f"{'0' * 40} {commit.hex()} {committer}\tcommit (initial): "
+               f"{self.MESSAGE}\n")
+        self.__writeFile("logs/HEAD", log)
+        self.__writeFile(f"logs/refs/heads/{self.BRANCH}", log)
+        return commit.hex()
+
+    def __writeSkeleton(self):
+        for directory in ("objects/info", "objects/pack", "refs/heads",
+                          "refs/tags", "info", "logs/refs/heads"):
+            os.makedirs(os.path.join(self.gitDir, directory))
+        self.__writeFile("HEAD", f"ref: refs/heads/{self.BRANCH}\n")
+        self.__writeFile("config", "[core]\n"
+                                   "\trepositoryformatversion = 0\n"
+                                   "\tfilemode = true\n"
+                                   "\tbare = false\n"
+                                   "\tlogallrefupdates = true\n")
+        self.__writeFile("description", "Unnamed repository; edit this file "
+                         "'description' to name the repository.\n")
+
+    def __writeFile(self, name: str, contents: str | bytes):
+        mode = "wb" if isinstance(contents, bytes) else "w"
+        with open(os.path.join(self.gitDir, name), mode) as f:
+            f.write(contents)
+
+    def __identity(self, role: str) -> str:
+        """!
+        @param role `author` or `committer`
+        @returns the identity and date line for role, as git would write it,
+                 honouring the same environment variables and config keys
+        """
+        from git.config import GitConfigParser, get_config_path
+        from git.objects.util import altz_to_utctz_str, parse_date
+
+        env = f"GIT_{role.upper()}_"
+        name = os.environ.get(env + "NAME")
+        email = os.environ.get(env + "EMAIL")
+        if name is None or email is None:
+            paths = [get_config_path("user"),
+                     os.environ.get("GIT_CONFIG_GLOBAL",
+                                    get_config_path("global"))]
+            if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+                paths.insert(0, os.environ.get("GIT_CONFIG_SYSTEM",
+                                               get_config_path("system")))
+            config = GitConfigParser([p for p in paths if os.path.exists(p)],
+                                     read_only=True)
+            name = name or config.get_value(role, "name", "") or \
+                config.get_value("user", "name", "")
+            email = email or config.get_value(role, "email", "") or \
+                config.get_value("user", "email", "") or \
+                os.environ.get("EMAIL")
+        if not name or not email:
+            raise RuntimeError("no git identity, please set user.name and "
+                               "user.email")
+
+        date = os.environ.get(env + "DATE")
+        if date:
+            seconds, offset = parse_date(date)
+        else:
+            seconds = int(time.time())
+            offset = -time.localtime(seconds).tm_gmtoff
+        return f"{name} <{email}> {seconds} {altz_to_utctz_str(offset)}"
+
+    def __mode(self, info: os.stat_result) -> int:
+        if stat.S_ISLNK(info.st_mode):
+            return self.SYMLINK
+        return self.EXECUTABLE if info.st_mode & stat.S_IXUSR else self.FILE
+
+    def __writeTrees(self, entries: list, objects: list) -> bytes:
+        """!
+        build the tree objects for the index entries, bottom up
+        @returns the hash of the root tree
+        """
+        trees = {"": []}
+        for name, mode, blob, _ in entries:
+            parent = os.path.dirname(name)
+            while parent not in trees:
+                trees[parent] = []
+                parent = os.path.dirname(parent)
+            trees[os.path.dirname(name)].append((os.path.basename(name),
+                                                 mode, blob))
+
+        # deepest first, so every subtree is hashed before its parent
+        for directory in sorted(trees, key=lambda d: -d.count("/") - bool(d)):
+            # git orders tree entries as if directory names ended in a slash
+            children = sorted(
+                (os.fsencode(name), mode, blob)
+                for name, mode, blob in trees[directory])
+            children.sort(key=lambda child: child[0] + b"/"
+                          if child[1] == self.TREE else child[0])
+            body = b"".join(b"%o %s\0%s" % (mode, name, blob)
+                            for name, mode, blob in children)
+            tree = self.__hash(b"tree", body)
+            objects.append((b"tree", tree, body))
+            if directory:
+                trees[os.path.dirname(directory)].append(
+                    (os.path.basename(directory), self.TREE, tree))
+        return tree
+
+    @staticmethod
+    def __hash(kind: bytes, body: bytes) -> bytes:
+        return hashlib.sha1(b"%s %d\0" % (kind, len(body)) + body).digest()
+
+    def __writePack(self, objects: list) -> dict[str, str]:
+        """!
+        write every object into one (undeltified) pack with its v2 index,
+        unless a blob's contents do not match its hash.
+        @param objects list of (type, hash, body) tuples, the body of a blob
+               being the relative path of the file that holds it
+        @returns dict mapping the relative paths of the files whose contents
+                 do not match their hash to the hash of their contents, in
+                 which case nothing is written. Empty once the pack is.
+        """
+        # files and directories with identical contents share one object,
+        # the duplicates are only hashed to make sure they are identical
+        unique = {}
+        for entry in objects:
+            unique.setdefault(entry[1], entry)
+        packDir = os.path.join(self.gitDir, "objects", "pack")
+        temp = os.path.join(packDir, "tmp_pack")
+        checksum = hashlib.sha1()
+        offsets = {}
+        changed = {}
+        with open(temp, "wb") as pack:
+            def write(data: bytes, crc: int = 0) -> int:
+                pack.write(data)
+                checksum.update(data)
+                return zlib.crc32(data, crc)
+
+            write(b"PACK" + struct.pack(">II", 2, len(unique)))
+            for entry in objects:
+                kind, sha, body = entry
+                packed = unique[sha] is entry
+                if kind == b"blob":
+                    offset = pack.tell()
+                    blob, crc = self.__packBlob(body,
+                                                write if packed else None)
+                    if blob != sha:
+                        changed[body] = blob.hex()
+                elif packed:
+                    offset = pack.tell()
+                    header = self.__packHeader(self.PACK_TYPES[kind],
+                                               len(body))
+                    crc = write(zlib.compress(body, 1), write(header))
+                if packed:
+                    offsets[sha] = (offset, crc)
+            pack.write(checksum.digest())
+        if changed:
+            os.unlink(temp)
+            return changed
+
+        name = checksum.hexdigest()
+        shas = sorted(offsets)
+        fanout = [0] * 256
+        for sha in shas:
+            fanout[sha[0]] += 1
+        index = [b"\377tOc", struct.pack(">I", 2),
+                 struct.pack(">256I", *(sum(fanout[:i + 1])
+                                        for i in range(256)))]
+        index.extend(shas)
+        index.extend(struct.pack(">I", offsets[sha][1]) for sha in shas)
+        large = []
+        for sha in shas:
+            position = offsets[sha][0]
+            if position >= 0x80000000:
+                large.append(struct.pack(">Q", position))
+                position = 0x80000000 | (len(large) - 1)
+            index.append(struct.pack(">I", position))
+        index.extend(large)
+        index.append(checksum.digest())
+        data = b"".join(index)
+        with open(os.path.join(packDir, f"pack-{name}.idx"), "wb") as f:
+            f.write(data + hashlib.sha1(data).digest())
+        os.replace(temp, os.path.join(packDir, f"pack-{name}.pack"))
+        return {}
+
+    def __packBlob(self, name: str, write=None) -> tuple[bytes, int]:
+        """!
+        stream the contents of a file into the pack as a blob, hashing them
+        along the way
+        @param name string relative path of the file
+        @param write the pack's write function, see __writePack, or None to
+               only hash the file
+        @returns tuple of the hash of the contents and the crc32 of what was
+                 written
+        """
+        path = os.path.join(self.path, name)
+        if os.path.islink(path):
+            stream = io.BytesIO(os.fsencode(os.readlink(path)))
+            size = len(stream.getbuffer())
+        else:
+            stream = open(path, "rb")
+            size = os.fstat(stream.fileno()).st_size
+        digest = hashlib.sha1(b"blob %d\0" % size)
+        crc = 0
+        with stream:
+            if write is not None:
+                compressor = zlib.compressobj(1)
+                crc = write(self.__packHeader(self.PACK_TYPES[b"blob"],
+                                              size))
+            for chunk in iter(lambda: stream.read(self.CHUNK), b""):
+                digest.update(chunk)
+                if write is not None:
+                    crc = write(compressor.compress(chunk), crc)
+            if write is not None:
+                crc = write(compressor.flush(), crc)
+        return digest.digest(), crc
+
+    @staticmethod
+    def __packHeader(kind: int, size: int) -> bytes:
+        header = bytearray([(kind << 4) | (size & 0x0F)])
+        size >>= 4
+        while size:
+            header[-1] |= 0x80
+            header.append(size & 0x7F)
+            size >>= 7
+        return bytes(header)
+
+    def __writeIndex(self, entries: list):
+        """!
+        write a version 2 index holding entries, with the stat data of each
+        file so git sees the working tree as unchanged without re-reading it.
+        """
+        data = [b"DIRC", struct.pack(">II", 2, len(entries))]
+        for name, mode, blob, info in sorted(
+                entries, key=lambda entry: os.fsencode(entry[0])):
+            path = os.fsencode(name)
+            entry = struct.pack(
+                ">10I20sH",
+                int(info.st_ctime) & 0xFFFFFFFF, info.st_ctime_ns % 10**9,
+                int(info.st_mtime) & 0xFFFFFFFF, info.st_mtime_ns % 10**9,
+                info.st_dev & 0xFFFFFFFF, info.st_ino & 0xFFFFFFFF, mode,
+                info.st_uid & 0xFFFFFFFF, info.st_gid & 0xFFFFFFFF,
+                info.st_size & 0xFFFFFFFF, blob, min(len(path), 0xFFF)) + path
+            # entries are NUL padded to a multiple of eight bytes
+            data.append(entry + b"\0" * (8 - len(entry) % 8))
+        index = b"".join(data)
+        self.__writeFile("index", index + hashlib.sha1(index).digest())
@@ -0,0 +1,228 @@
+import errno
+import fcntl
+import os
+import shutil
+import stat
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+
+
+## ioctl request to clone (reflink) a whole file on btrfs, xfs and friends
+FICLONE = 0x40049409
+
+## errors meaning a copy primitive is unsupported here, rather than failed
+UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+               errno.ENOTTY, errno.EBADF)
+
+
+class LocalCopy:
+    """!
+    Copies the working tree of a template that lives on the local filesystem
+    straight into a new project, without going through git.
+
+    The tree is scanned once, directories are created up front and the files
+    are then copied by a pool of worker threads in batches. Each file is
+    copied with the cheapest primitive the filesystem supports: a reflink
+    (FICLONE), then an in-kernel `os.copy_file_range`, then a buffered copy.
+    Hardlinking is available as the `hardlink` mode but is not the default,
+    as edits to the new project would then also change the template.
+
+    When the template is a git working tree only the files git would not
+    ignore are copied, so build output and the like never reach the project.
+    """
+
+    DEFAULT_JOBS = min(32, (os.cpu_count() or 1) * 4)
+
+    ## number of files handed to a worker at a time
+    BATCH = 64
+
+    def __init__(self, jobs: int = DEFAULT_JOBS, mode: str = "copy"):
+        """!
+        @param jobs the number of worker threads copying files
+        @param mode `copy` or `hardlink`
+        """
+        if mode not in ("copy", "hardlink"):
+            raise ValueError(f"unknown local copy mode '{mode}'")
+        self.jobs = max(1, jobs)
+        self.mode = mode
+        self.__reflink = True
+        self.__copyRange = hasattr(os, "copy_file_range")
+
+    @staticmethod
+    def isLocalTree(project: str) -> bool:
+        """!
+        @param project string URL or path of a template
+        @returns bool true iff project is a directory on the local filesystem
+                 that is not itself a git directory, a bare repository has
+                 no working tree to copy
+        """
+        path = project.removeprefix("file://")
+        if not os.path.isdir(path):
+            return False
+        # what git itself looks for to tell a git directory
+        return not (os.path.isfile(os.path.join(path, "HEAD")) and
+                    os.path.isdir(os.path.join(path, "objects")) and
+                    os.path.isdir(os.path.join(path, "refs")))
+
+    def copy(self, source: str, path: str, skip: list[str] = (),
+             subdir: str = None) -> DataStruct:
+        """!
+        copy the working tree at source into path, leaving out every `.git`
+        and the top level files named in skip.
+        @param source string path of the template directory
+        @param path string target directory, created if missing
+        @param skip list of top level file names not to copy
+        @param subdir string directory of source to copy as the root of path
+               (optional)
+        @returns DataStruct with the number of files and bytes copied
+        """
+        files = self.listFiles(source, skip, subdir)
+        source = os.path.join(source.removeprefix("file://"), subdir or "")
+
+        os.makedirs(path, exist_ok=True)
+        # only the deepest directories need creating, makedirs does the rest
+        parents = sorted({os.path.dirname(rel) for rel in files} - {""})
+        for parent, following in zip(parents, parents[1:] + [""]):
+            if not following.startswith(parent + os.sep):
+                os.makedirs(os.path.join(path, parent), exist_ok=True)
+
+        batches = [files[i:i + self.BATCH]
+                   for i in range(0, len(files), self.BATCH)]
+        stats = DataStruct(files=0, bytes=0)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for count, size in pool.map(
+                    lambda batch: self.__copyBatch(source, path, batch),
+                    batches):
+                stats.files += count
+                stats.bytes += size
+        return stats
+
+    def listFiles(self, source: str, skip: list[str] = (),
+                  subdir: str = None) -> list[str]:
+        """!
+        @param source string path of the template directory
+        @param skip list of top level file names to leave out
+        @param subdir string directory of source to list, the paths returned
+               being relative to it (optional)
+        @returns the relative paths of every file, or symlink, to copy. For
+                 git working trees this is whatever git does not ignore, in
+                 subdir just as in the whole tree.
+        """
+        source = source.removeprefix("file://")
+        return [rel for rel in self.__listFiles(source, subdir)
+                if rel not in skip and ".git" not in rel.split(os.sep)]
+
+    @staticmethod
+    def commit(source: str) -> str | None:
+        """!
+        @param source string path of the template directory
+        @returns the commit checked out in source, None if it is not a git
+                 working tree
+        """
+        if not os.path.exists(os.path.join(source, ".git")):
+            return None
+        proc = subprocess.run(["git", "-C", source, "rev-parse", "HEAD"],
+                              capture_output=True, text=True)
+        return proc.stdout.strip() if proc.returncode == 0 else None
+
+    def __listFiles(self, source: str, subdir: str = None) -> list[str]:
+        tree = os.path.join(source, subdir or "")
+        if os.path.exists(os.path.join(source, ".git")):
+            # listed from the top of the working tree, so that the ignore
+            # rules above subdir apply as well
+            prefix = os.path.join(os.path.normpath(subdir), "") \
+                if subdir else ""
+            proc = subprocess.run(
+                ["git", "-C", source, "ls-files", "-z", "--cached",
+                 "--others", "--exclude-standard", "--", prefix or "."],
+                capture_output=True)
+            if proc.returncode == 0:
+                files = []
+                listed = set(proc.stdout.decode().split("\0")) - {""}
+                for rel in sorted(name[len(prefix):] for name in listed
+                                  if name.startswith(prefix)):
+                    try:
+                        mode = os.lstat(os.path.join(tree, rel)).st_mode
+                    except FileNotFoundError:
+                        continue  # deleted from the working tree
+                    if stat.S_ISDIR(mode):
+                        files.extend(self.__walk(tree, rel))  # submodules
+                    else:
+                        files.append(rel)
+                return files
+        return self.__walk(tree, "")
+
+    def __walk(self, source: str, rel: str) -> list[str]:
+        files = []
+        for dirpath, dirnames, filenames in os.walk(os.path.join(source, rel)):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            base = os.path.relpath(dirpath, source)
+            files.extend(os.path.normpath(os.path.join(base, name))
+                         for name in filenames)
+            # symlinks to directories are copied as links, not followed
+            files.extend(os.path.normpath(os.path.join(base, name))
+                         for name in dirnames
+                         if os.path.islink(os.path.join(dirpath, name)))
+            dirnames[:] = [d for d in dirnames
+                           if not os.path.islink(os.path.join(dirpath, d))]
+        return files
+
+    def __copyBatch(self, source: str, target: str,
+                    batch: list[str]) -> tuple[int, int]:
+        size = 0
+        for rel in batch:
+            size += self.__copyFile(os.path.join(source, rel),
+                                    os.path.join(target, rel))
+        return len(batch), size
+
+    def __copyFile(self, src: str, dst: str) -> int:
+        """!
+        copy a single file (or symlink) preserving its permission bits
+        @returns the number of bytes copied
+        """
+        info = os.lstat(src)
+        if stat.S_ISLNK(info.st_mode):
+            os.symlink(os.readlink(src), dst)
+            return 0
+        if self.mode == "hardlink":
+            os.link(src, dst)
+            return 0
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            if not (self.__clone(fsrc, fdst) or
+                    self.__copyFileRange(fsrc, fdst, info.st_size)):
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            os.fchmod(fdst.fileno(), stat.S_IMODE(info.st_mode))
+        return info.st_size
+
+    def __clone(self, fsrc, fdst) -> bool:
+        if not self.__reflink:
+            return False
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError as e:
+            if e.errno in UNSUPPORTED:
+                self.__reflink = False
+                return False
+            raise
+
+    def __copyFileRange(self, fsrc, fdst, size: int) -> bool:
+        if not self.__copyRange:
+            return False
+        try:
+            remaining = size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                            remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return True
+        except OSError as e:
+            if e.errno in UNSUPPORTED and remaining == size:
+                self.__copyRange = False
+                return False
+            raise
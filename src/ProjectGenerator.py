@@ -1,21 +1,64 @@
 import sys
 import os
 import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
+from Config import DataStruct
+from ConfigContext import ConfigContext
 from ConfigManager import ConfMgr as Conf
+from TemplateArchive import TemplateArchive, archiveSuffix
+from TemplateBundle import TemplateBundle
+from TemplateCache import TemplateCache
+from TemplateExport import exportTree, listTree, sparseClone
+from TemplateLayers import mergeTrees
+from TemplateSource import parseSource, splitLayers
+from TemplateSubmodules import TemplateSubmodules
+from GitInit import GitInit
+from Trace import span, treeStats
+from TemplateRender import (TemplateRender, projectVariables,
+                            renderExclusions)
+from LocalCopy import LocalCopy
+from ProjectManifest import ProjectManifest
+from ProjectHooks import ProjectHooks
+from StagedTarget import StagedTarget
+from ThreadOutput import carryOutput
+from utils import cacheDir
 
-from git import Repo
+
+class GenerationError(Exception):
+    """!
+    raised when a project could not be generated, so that callers generating
+    many projects can report the failure instead of exiting.
+    """
 
 
 class ProjectGenerator:
     """!
     This class handles the process of creating new projects by:
-        - Cloning a template repository to a specified directory
+        - Exporting (or cloning) a template repository to a stage next to the
+          specified directory
+        - Fetching the template's submodules into it, or registering them
         - Removing the original repository information
+        - Rendering the template variables into its files and paths
+        - Recording the template it came from in a ProjectManifest
         - Re-initializing it as a fresh Git repository
+        - Moving it into place as the specified directory, see StagedTarget
+        - Running the post-generation hooks configured for it, see
+          ProjectHooks
     """
 
-    def run(self, args: dict):
+    ## git files at the top of a template that never make it into a project
+    GIT_FILES = [".gitignore", ".gitattributes", ".gitmodules"]
+
+    def __init__(self, config: ConfigContext = None):
+        """!
+        @param config ConfigContext to generate with, that of ConfMgr if not
+               given
+        """
+        self.config = config if config is not None else Conf().context
+
+    def run(self, args: dict, config: ConfigContext = None):
         """!
         Processes command line arguments to generate a new project based on
         specified language and project type templates.
@@ -25,76 +68,732 @@ class ProjectGenerator:
                     - <LANGUAGE>: Programming language of the template
                     - <PROJECT_TYPE>: Type of project to generate
                     - <PROJECT_PATH>: Target directory for the new project
+                    - --ref: commit-ish of the template to use (optional)
+                    - --full-clone: clone the template history rather than
+                      exporting its tree (optional)
+                    - --commit-template: make the template's files the
+                      first commit rather than an empty one (optional)
+                    - --var: list of KEY=VALUE template variables, these
+                      override those of the config (optional)
+                    - --no-render: leave the template's placeholders as they
+                      are (optional)
+                    - --submodules: `flatten` the template's submodules into
+                      the project or `register` them in its repository
+                      (optional)
+                    - --jobs: the number of submodules fetched, or hooks
+                      run, concurrently (optional)
+                    - --no-hooks: do not run the post-generation hooks
+                      (optional)
+                    - --bundle: generate from the templates bundled in this
+                      file rather than from the templates themselves
+                      (optional)
+        @param config ConfigContext to generate with, rather than the one
+               given when constructed (optional)
         """
+        if config is not None:
+            self.config = config
         langArg = args["<LANGUAGE>"]
         projectArg = args["<PROJECT_TYPE>"]
         path = args["<PROJECT_PATH>"]
         try:
-            project = Conf().projects.get(langArg).get(projectArg)
+            project = self.config.projects.get(langArg).get(projectArg)
         except AttributeError as e:
             sys.exit("ERROR:" + str(e))
 
-        self.__cloneRepo(project, path)
-        self.__cleanProject(path)
-        self.__reinitialiseProject(path)
+        try:
+            self.generate(project, path, args)
+        except GenerationError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+
+    def generate(self, project: str, path: str, args: dict):
+        """!
+        Generates a single project at path from the template project. Unlike
+        run() this never exits, failures are raised as GenerationError.
+
+        @param project string URL or path of the template repository
+        @param path string target directory for the new project
+        @param args Dictionary of command line arguments, see run()
+
+        @exception GenerationError if any stage of the generation fails
+        """
+        if project is None:
+            raise GenerationError("no template project given")
+        ref = self.templateRef(project, args)
+        mode = args.get("--submodules") or "flatten"
+        if mode not in TemplateSubmodules.MODES:
+            modes = ", ".join(TemplateSubmodules.MODES)
+            raise GenerationError(f"unknown submodules mode '{mode}', use "
+                                  f"one of {modes}")
+        jobs = int(args.get("--jobs") or TemplateSubmodules.DEFAULT_JOBS)
+        variables = self.__projectVariables(path, args)
+        with span("generate", template=project, ref=ref):
+            target = StagedTarget(path)
+            try:
+                target.open()
+            except FileExistsError as e:
+                raise GenerationError(str(e))
+            except OSError as e:
+                raise GenerationError(f"could not stage project. {e}")
+            try:
+                self.__build(project, ref, target.stage, args, variables,
+                             jobs)
+                try:
+                    target.commit()
+                except OSError as e:
+                    raise GenerationError("could not move project into "
+                                          f"place. {e}")
+            finally:
+                target.close()
+
+            # hooks run where the project stays, a virtualenv for one
+            # remembers its absolute path
+            hooks = self.__startHooks(path, args, variables, jobs)
+            failed = self.__reportHooks(hooks)
+            if failed:
+                raise GenerationError("post-generation hooks failed: "
+                                      f"{', '.join(failed)}. Logs are in "
+                                      f"{hooks.logs}")
+
+    def __build(self, project: str, ref: str, path: str, args: dict,
+                variables: dict[str, str], jobs: int):
+        """!
+        Builds the project in path, its stage, from fetching the template up
+        to initialising its repository.
+
+        @param project string URL or path of the template repository
+        @param ref string the ref of the template, see templateRef()
+        @param path string the empty directory to build the project in
+        @param args Dictionary of command line arguments, see run()
+        @param variables dict of the project's template variables
+        @param jobs the number of submodules fetched concurrently
+
+        @exception GenerationError if any stage of the generation fails
+        """
+        if args.get("--bundle"):
+            with span("bundle") as fetching:
+                fetched = self.__extractBundle(args["--bundle"], project,
+                                               ref, path, fetching)
+        else:
+            fetched = self.fetchTemplate(project, path, args)
+        commit, blobs = fetched.commit, fetched.blobs
+        submodules = fetched.submodules
+
+        cleaning = span("clean")
+        if cleaning:  # measured before the span starts timing
+            cleaning.set(**treeStats(os.path.join(path, ".git")))
+        with cleaning:
+            self.__cleanProject(path, jobs, submodules.paths)
+        with span("render") as rendering:
+            changed = {} if args.get("--no-render") else \
+                self.__renderProject(path, variables, args)
+            rendering.set(files=len(changed))
+        # the blobs of rendered files are no longer those of the template
+        origins = {new: list(old) for new, old in changed.items()}
+        blobs = {name: blob for name, blob in blobs.items()
+                 if name not in {old for old, _ in changed.values()}}
+        with span("manifest") as hashing:
+            try:
+                registered = [sub.path for sub in submodules.registered]
+                manifest = ProjectManifest.create(
+                    path, project, ref, commit, known=blobs,
+                    origins=origins, submodules=registered)
+            except OSError as e:
+                raise GenerationError("could not write project manifest. "
+                                      f"{e}")
+            if hashing:
+                hashing.set(files=len(manifest.files), hashed=len(
+                    manifest.files.keys() - blobs.keys()))
+        with span("reinit") as reinit:
+            try:
+                # the manifest is committed along with the template, so
+                # the working tree is clean and clones of the project can
+                # still be scanned for drift
+                self.__reinitialiseProject(
+                    path, dict(manifest.files, **{ProjectManifest.FILE: None})
+                    if args.get("--commit-template") else None,
+                    submodules.registered)
+            except Exception as e:
+                raise GenerationError(f"could not initialise project. {e}")
+        if reinit:
+            reinit.set(**treeStats(os.path.join(path, ".git")))
+
+    @staticmethod
+    def templateRef(project: str, args: dict) -> str:
+        """!
+        @param project string URL or path of the template repository
+        @param args Dictionary of command line arguments, see run()
+        @returns string the ref of the template to generate from; --ref if
+                 given, otherwise the ref of the template's source, or HEAD.
+                 That of the base layer for a layered template.
+
+        @exception GenerationError if project is not a valid source
+        """
+        try:
+            source = parseSource(splitLayers(project)[0])
+        except ValueError as e:
+            raise GenerationError(str(e))
+        # an explicit --ref wins over the ref given in the config, even when
+        # it is HEAD
+        ref = args.get("--ref")
+        if ref is None:
+            ref = source.ref or "HEAD"
+        return ref
 
-    def __cloneRepo(self, project: str, path: str):
+    def fetchTemplate(self, project: str, path: str,
+                      args: dict) -> DataStruct:
         """!
-        Clones the template repository to the target path
+        Fetches the template project into path, submodules and all, as the
+        first stages of generate() do. Nothing is cleaned up or rendered.
+        The layers of a layered template are fetched concurrently and merged
+        into one tree, see __fetchLayers.
+
+        @param project string URL or path of the template repository, or the
+               comma separated layers of the template, see splitLayers
+        @param path string target directory for the template's files
+        @param args Dictionary of command line arguments, see run()
+        @returns DataStruct with the `commit` fetched (None if not known), the
+                 `blobs` known for its files, see __knownBlobs, and its
+                 `submodules`, see __addSubmodules
+
+        @exception GenerationError if fetching fails
+        """
+        try:
+            layers = splitLayers(project)
+        except ValueError as e:
+            raise GenerationError(str(e))
+        if len(layers) > 1:
+            return self.__fetchLayers(layers, path, args)
+        ref = self.templateRef(project, args)
+        source = parseSource(project)
+        url, subdir = source.url, source.subdir
+        refresh = args.get("--refresh", False)
+        mode = args.get("--submodules") or "flatten"
+        jobs = int(args.get("--jobs") or TemplateSubmodules.DEFAULT_JOBS)
+        copied = False
+        if archiveSuffix(url):
+            if ref != "HEAD":
+                raise GenerationError(f"archive templates have no refs, can "
+                                      f"not use '{ref}'")
+            with span("extract") as fetching:
+                stats = self.__extractArchive(url, path, fetching, subdir)
+            commit, blobs = None, stats.blobs
+        elif args.get("--full-clone"):
+            with span("clone") as fetching:
+                commit = self.__cloneRepo(url, path, ref, refresh, subdir)
+            if fetching:
+                fetching.set(**treeStats(path))
+            blobs = self.__knownBlobs(url if subdir else path, commit,
+                                      subdir)
+        elif ref == "HEAD" and LocalCopy.isLocalTree(url):
+            with span("copy") as fetching:
+                commit = self.__copyTree(url, path, fetching, subdir)
+            blobs = {}
+            copied = True
+        else:
+            with span("export") as fetching:
+                commit = self.__exportRepo(url, path, ref, refresh,
+                                           fetching, subdir)
+            blobs = self.__knownBlobs(url, commit, subdir)
+        with span("submodules", mode=mode) as fetching:
+            submodules = self.__addSubmodules(
+                url, path, commit, subdir, mode, jobs, refresh, blobs,
+                copied, fetching)
+        return DataStruct(commit=commit, blobs=blobs, submodules=submodules)
+
+    def __fetchLayers(self, layers: list[str], path: str,
+                      args: dict) -> DataStruct:
+        """!
+        Fetches every layer of a template into a directory of its own next to
+        path, all at once, and merges them into path with later layers taking
+        precedence, see TemplateLayers. --ref only applies to the base layer,
+        the overlays are fetched at the ref their source gives.
+
+        @param layers list of the sources of the layers, the base first
+        @param path string target directory for the template's files
+        @param args Dictionary of command line arguments, see run()
+        @returns DataStruct as fetchTemplate() returns it, the commit being
+                 that of the base layer
+
+        @exception GenerationError if fetching or merging fails
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise GenerationError(f"destination path '{path}' already exists "
+                                  "and is not an empty directory")
+        overlayArgs = dict(args, **{"--ref": None})
+        jobs = int(args.get("--jobs") or TemplateSubmodules.DEFAULT_JOBS)
+        parent, name = os.path.split(os.path.abspath(path))
+        with span("layers", layers=len(layers)) as merging, \
+                tempfile.TemporaryDirectory(dir=parent,
+                                            prefix=f".{name}.layers-") as tmp:
+            trees = [os.path.join(tmp, str(index))
+                     for index in range(len(layers))]
+            fetchOne = carryOutput(lambda index: self.fetchTemplate(
+                layers[index], trees[index], overlayArgs if index else args))
+            with ThreadPoolExecutor(max_workers=max(1, min(
+                    jobs, len(layers)))) as pool:
+                futures = [pool.submit(fetchOne, index)
+                           for index in range(len(layers))]
+                fetched = [future.result() for future in futures]
+            try:
+                merged = mergeTrees(trees, path)
+            except OSError as e:
+                raise GenerationError(f"could not merge template layers. {e}")
+            print(f"Merged {len(layers)} layers ({merged.files} files, "
+                  f"{merged.overridden} overridden)")
+            merging.set(files=merged.files, overridden=merged.overridden)
+
+        # only what made it into the project is known to come from a layer
+        blobs, paths, registered = {}, [], []
+        for layer, kept in zip(fetched, merged.kept):
+            blobs.update((file, blob) for file, blob in layer.blobs.items()
+                         if file in kept)
+            paths += [sub for sub in layer.submodules.paths
+                      if any(file.startswith(f"{sub}/") for file in kept)]
+            registered += [sub for sub in layer.submodules.registered
+                           if sub.path in kept]
+        return DataStruct(commit=fetched[0].commit, blobs=blobs,
+                          submodules=DataStruct(paths=paths,
+                                                registered=registered))
+
+    def __extractBundle(self, bundle: str, project: str, ref: str, path: str,
+                        fetching=None) -> DataStruct:
+        """!
+        Extracts the template project at ref from a bundle written by
+        --export-bundle, without reaching the template itself.
+
+        @param bundle string path of the bundle file
+        @param project string URL or path of the template repository
+        @param ref string the ref of the template, as it was bundled
+        @param path string target directory for the template's files
+        @param fetching Span to record the files and bytes extracted on
+        @returns DataStruct as fetchTemplate() returns it
+
+        @exception GenerationError if the template is not in the bundle
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise GenerationError(f"destination path '{path}' already exists "
+                                  "and is not an empty directory")
+        try:
+            with TemplateBundle.open(bundle) as opened:
+                stats = opened.extract(project, ref, path)
+        except Exception as e:
+            raise GenerationError("could not extract project template from "
+                                  f"bundle. {e}")
+        print(f"Extracted {stats.files} files ({stats.bytes} bytes) "
+              f"from {bundle}")
+        if fetching:
+            fetching.set(files=stats.files, bytes=stats.bytes)
+        # submodules were flattened into the bundle
+        return DataStruct(commit=stats.commit, blobs=stats.blobs,
+                          submodules=DataStruct(paths=stats.submodules,
+                                                registered=[]))
+
+    def __cloneRepo(self, project: str, path: str, ref: str = "HEAD",
+                    refresh: bool = False, subdir: str = None) -> str:
+        """!
+        Clones the template repository to the target path. Remote templates
+        are cloned by way of the local mirror cache, see TemplateCache.
 
         @param project string URL or path of the template repository to clone
         @param path string target directory where the repository will be cloned
+        @param ref string commit-ish to check out after cloning
+        @param refresh bool, fetch the cached mirror even if it is not stale
+        @param subdir string directory of the repository holding the template,
+               cloned sparsely and hoisted to be path (optional)
+        @returns string the commit that was checked out
 
-        @exception Exits the program if cloning fails
+        @exception GenerationError if cloning fails
         """
+        from git import Repo  # GitPython is slow to import, only load it here
+
         try:
-            Repo.clone_from(project, path)
+            if subdir and TemplateCache.isRemote(project):
+                return TemplateCache(self.config.meta).clone(
+                    project, path, refresh, ref, subdir)
+            if subdir:
+                return sparseClone(project, path, ref, subdir)
+            if TemplateCache.isRemote(project):
+                TemplateCache(self.config.meta).clone(project, path, refresh)
+            else:
+                from CloneProgress import CloneProgress
+                progress = CloneProgress(project)
+                Repo.clone_from(project, path, progress=progress)
+                progress.finish()
+            repo = Repo(path)
+            if ref != "HEAD":
+                repo.git.checkout(ref)
+            return repo.head.commit.hexsha
         except Exception as e:
-            print(f"ERROR: could not clone project repo. {e}")
-            sys.exit(1)
+            raise GenerationError(f"could not clone project repo. {e}")
+
+    def __exportRepo(self, project: str, path: str, ref: str = "HEAD",
+                     refresh: bool = False, fetching=None,
+                     subdir: str = None) -> str | None:
+        """!
+        Exports only the tree of the template repository at ref to the target
+        path. No history is transferred into, or deleted from, the project.
+        Remote templates are exported from the local mirror cache.
+
+        @param project string URL or path of the template repository
+        @param path string target directory for the template's files
+        @param ref string commit-ish of the template to export
+        @param refresh bool, fetch the cached mirror even if it is not stale
+        @param fetching Span to record the files and bytes exported on
+        @param subdir string directory of the repository holding the template
+               (optional)
+        @returns string the commit that was exported, None if not known
+
+        @exception GenerationError if exporting fails
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise GenerationError(f"destination path '{path}' already exists "
+                                  "and is not an empty directory")
+        try:
+            if TemplateCache.isRemote(project):
+                stats = TemplateCache(self.config.meta).export(
+                    project, ref, path, refresh, subdir)
+            else:
+                stats = exportTree(project.removeprefix("file://"), ref, path,
+                                   subdir)
+        except Exception as e:
+            raise GenerationError(f"could not export project template. {e}")
+        print(f"Exported {stats.files} files ({stats.bytes} bytes) "
+              f"from {stats.commit or ref}")
+        if fetching:
+            fetching.set(files=stats.files, bytes=stats.bytes)
+        return stats.commit
+
+    def __copyTree(self, project: str, path: str, fetching=None,
+                   subdir: str = None) -> str | None:
+        """!
+        Copies the working tree of a template on the local filesystem to the
+        target path, leaving out everything __cleanProject would remove.
+
+        @param project string path of the template directory
+        @param path string target directory for the template's files
+        @param fetching Span to record the files and bytes copied on
+        @param subdir string directory of the template to copy (optional)
+        @returns string the commit checked out in the template, None if it is
+                 not a git working tree
+
+        @exception GenerationError if copying fails
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise GenerationError(f"destination path '{path}' already exists "
+                                  "and is not an empty directory")
+        try:
+            mode = self.config.meta.get("localcopymode", "copy")
+            source = project.removeprefix("file://")
+            if not os.path.isdir(os.path.join(source, subdir or "")):
+                raise FileNotFoundError(f"'{subdir}' is not a directory of "
+                                        "the template")
+            stats = LocalCopy(mode=mode).copy(source, path, self.GIT_FILES,
+                                              subdir)
+        except Exception as e:
+            raise GenerationError(f"could not copy project template. {e}")
+        print(f"Copied {stats.files} files ({stats.bytes} bytes) "
+              f"from {project}")
+        if fetching:
+            fetching.set(files=stats.files, bytes=stats.bytes)
+        return LocalCopy.commit(project.removeprefix("file://"))
+
+    def __extractArchive(self, project: str, path: str, fetching=None,
+                         subdir: str = None) -> DataStruct:
+        """!
+        Extracts a template published as an archive to the target path, see
+        TemplateArchive.
+
+        @param project string path of the archive
+        @param path string target directory for the template's files
+        @param fetching Span to record the files and bytes extracted on
+        @param subdir string directory of the archive holding the template,
+               stripped off its files (optional)
+        @returns DataStruct with the `blobs` of the files extracted
 
-    def __cleanProject(self, path: str):
+        @exception GenerationError if extracting fails
+        """
+        if os.path.exists(path) and os.listdir(path):
+            raise GenerationError(f"destination path '{path}' already exists "
+                                  "and is not an empty directory")
+        try:
+            stats = TemplateArchive(project).extract(path, subdir)
+        except Exception as e:
+            raise GenerationError(f"could not extract project template. {e}")
+        print(f"Extracted {stats.files} files ({stats.bytes} bytes) "
+              f"from {project}")
+        if fetching:
+            fetching.set(files=stats.files, bytes=stats.bytes)
+        return stats
+
+    def __knownBlobs(self, repo: str, commit: str | None,
+                     subdir: str = None) -> dict[str, str]:
+        """!
+        Looks up the blob hashes of the template's files as git already knows
+        them, so the generated files need not be hashed again.
+
+        @param repo string URL or path of the repository holding commit
+        @param commit string the commit the project was generated from
+        @param subdir string directory of the repository holding the template
+               (optional)
+        @returns dict mapping file paths to blob hashes, empty if they are not
+                 known or the files may differ from the blobs, as happens when
+                 .gitattributes asks for substitutions or conversions
+        """
+        if commit is None:
+            return {}
+        try:
+            if TemplateCache.isRemote(repo):
+                blobs = TemplateCache(self.config.meta).listTree(
+                    repo, commit, subdir=subdir)
+            else:
+                blobs = listTree(repo.removeprefix("file://"), commit, subdir)
+        except Exception:
+            return {}
+        if any(os.path.basename(name) == ".gitattributes" for name in blobs):
+            return {}
+        return blobs
+
+    def __addSubmodules(self, project: str, path: str, commit: str | None,
+                        subdir: str = None, mode: str = "flatten",
+                        jobs: int = TemplateSubmodules.DEFAULT_JOBS,
+                        refresh: bool = False, blobs: dict = None,
+                        copied: bool = False, fetching=None) -> DataStruct:
+        """!
+        Fetches the submodules of the template into the project, or in
+        `register` mode looks them up to be registered in the project's
+        repository instead, see TemplateSubmodules.
+
+        @param project string URL or path of the template repository
+        @param path string the project directory
+        @param commit string the commit the project was generated from, no
+               submodules are looked for if it is not known
+        @param subdir string directory of the repository holding the template
+               (optional)
+        @param mode string `flatten` or `register`
+        @param jobs the number of submodules fetched concurrently
+        @param refresh bool, fetch cached mirrors even if they are not stale
+        @param blobs dict of the known blob hashes, see __knownBlobs, that the
+               blob hashes of the fetched files are added to
+        @param copied bool, the template's working tree was copied, along with
+               the submodules checked out in it
+        @param fetching Span to record the files and bytes fetched on
+        @returns DataStruct with the `paths` of the submodules in the project
+                 and those `registered` instead, see TemplateSubmodules.find
+
+        @exception GenerationError if the submodules can not be fetched
+        """
+        if commit is None:
+            return DataStruct(paths=[], registered=[])
+        if TemplateCache.isRemote(project):
+            repo = str(TemplateCache(self.config.meta).mirrorPath(
+                project, bool(subdir)))
+        else:
+            repo = project.removeprefix("file://")
+        submodules = TemplateSubmodules(self.config.meta, jobs, refresh)
+        try:
+            if mode == "register":
+                registered = submodules.find(repo, commit, project, subdir)
+                for sub in registered:
+                    # left empty for `git submodule update --init` to fill
+                    shutil.rmtree(os.path.join(path, sub.path),
+                                  ignore_errors=True)
+                    os.makedirs(os.path.join(path, sub.path))
+                return DataStruct(paths=[], registered=registered)
+            stats = submodules.fetch(repo, commit, project, path, subdir,
+                                     missing=copied)
+        except Exception as e:
+            raise GenerationError(f"could not fetch submodules. {e}")
+        if stats.submodules:
+            print(f"Fetched {stats.submodules} submodules ({stats.files} "
+                  f"files, {stats.bytes} bytes)")
+        if blobs is not None:
+            blobs.update(stats.blobs)
+        if fetching:
+            fetching.set(files=stats.files, bytes=stats.bytes,
+                         submodules=stats.submodules)
+        return DataStruct(paths=stats.paths, registered=[])
+
+    def __cleanProject(self, path: str,
+                       jobs: int = TemplateSubmodules.DEFAULT_JOBS,
+                       submodules: list[str] = ()):
         """!
         Removes all Git-related files and directories from the cloned project
 
         This ensures the generated project doesn't contain any Git history
-        or configuration from the template repository.
+        or configuration from the template repository, nor from any of its
+        submodules. The GIT_FILES at the top of the project go, as does every
+        `.git` and `.gitmodules` within a submodule. A single walk, scanning
+        directories on a pool of threads, finds them all; it only descends as
+        far as the submodules outside of them, as neither exporting nor
+        copying a template leaves git files anywhere else.
 
         @param path string representing path to the project directory to clean
+        @param jobs the number of directories scanned concurrently
+        @param submodules list of the paths of the submodules fetched into, or
+               copied along with, the project (optional)
         """
-        git_path = os.path.join(path, ".git")
+        ancestors = set()
+        for sub in submodules:
+            parent = os.path.dirname(sub)
+            while parent and parent not in ancestors:
+                ancestors.add(parent)
+                parent = os.path.dirname(parent)
+        within = set(submodules)
+        skip = len(os.path.join(path, ""))
 
-        if os.path.exists(os.path.join(path, ".git")):
-            shutil.rmtree(git_path)
-            print(f"Removed: {git_path}")
+        def scan(directory: str, deep: bool) -> tuple[list[str], list]:
+            removed, subdirs = [], []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name in (".git", ".gitmodules") or (
+                            directory == path and
+                            entry.name in self.GIT_FILES):
+                        if entry.is_dir(follow_symlinks=False):
+                            shutil.rmtree(entry.path)
+                        else:
+                            os.remove(entry.path)
+                        removed.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        rel = entry.path[skip:]
+                        if deep or rel in within or rel in ancestors:
+                            subdirs.append((entry.path,
+                                            deep or rel in within))
+            return removed, subdirs
 
-        # Remove other Git-related files
-        git_files = [".gitignore", ".gitattributes", ".gitmodules"]
-        for file in git_files:
-            file_path = os.path.join(path, file)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Removed: {file_path}")
+        removed = []
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            pending = {pool.submit(scan, path, False)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, subdirs = future.result()
+                    removed.extend(found)
+                    pending.update(pool.submit(scan, *d) for d in subdirs)
+        for removedPath in sorted(removed):
+            print(f"Removed: {removedPath}")
         print("project templated cleaned")
 
-    def __reinitialiseProject(self, path: str):
+    def __projectVariables(self, path: str, args: dict) -> dict[str, str]:
+        """!
+        @param path string representing path to the project directory
+        @param args Dictionary of command line arguments, see run()
+        @returns dict of the template variables of the project's language,
+                 and those given with --var, see projectVariables
+
+        @exception GenerationError if a --var is not KEY=VALUE
+        """
+        language = args.get("<LANGUAGE>")
+        try:
+            return projectVariables(
+                path, language, args.get("<PROJECT_TYPE>"),
+                self.config.vars.get(language) if language else None,
+                args.get("--var") or [])
+        except ValueError as e:
+            raise GenerationError(f"could not render template variables. {e}")
+
+    def __renderProject(self, path: str, variables: dict[str, str],
+                        args: dict) -> dict:
+        """!
+        Substitutes the template variables into the project's files and
+        paths, but for those the language's `render.exclude` leaves out.
+
+        @param path string representing path to the project directory
+        @param variables dict of the project's template variables
+        @param args Dictionary of command line arguments, see run()
+        @returns dict of the files changed, see TemplateRender.render
+
+        @exception GenerationError if rendering fails
+        """
+        language = args.get("<LANGUAGE>")
+        exclude = renderExclusions(
+            self.config.vars.get(language) if language else None)
+        try:
+            return TemplateRender(variables, exclude=exclude).render(path)
+        except (OSError, ValueError) as e:
+            raise GenerationError(f"could not render template variables. {e}")
+
+    def __startHooks(self, path: str, args: dict, variables: dict[str, str],
+                     jobs: int) -> ProjectHooks:
+        """!
+        Starts the post-generation hooks configured for the project's
+        language and type, unless --no-hooks is given, in the project as
+        moved into place.
+
+        @param path string representing path to the project directory
+        @param args Dictionary of command line arguments, see run()
+        @param variables dict of the project's template variables
+        @param jobs the maximum number of hooks run concurrently
+        @returns ProjectHooks running, holding no hooks if there are none
+
+        @exception GenerationError if the hooks are misconfigured
+        """
+        language = args.get("<LANGUAGE>")
+        if args.get("--no-hooks") or not language:
+            return ProjectHooks()
+        meta = self.config.meta
+        try:
+            hooks = ProjectHooks(
+                self.config.hooks.get(language), args.get("<PROJECT_TYPE>"),
+                variables, float(meta.get("hooktimeout",
+                                          ProjectHooks.DEFAULT_TIMEOUT)))
+            hooks.start(path, cacheDir(meta) / "hooks", jobs)
+        except (OSError, ValueError) as e:
+            raise GenerationError(f"could not run post-generation hooks. {e}")
+        return hooks
+
+    def __reportHooks(self, hooks: ProjectHooks) -> list[str]:
+        """!
+        Waits for the post-generation hooks, printing each one's outcome as
+        it finishes.
+
+        @param hooks ProjectHooks started by __startHooks
+        @returns list of the names of the hooks that did not succeed
+        """
+        failed = []
+        for result in hooks.wait():
+            if result.status == "ok":
+                print(f"Hook '{result.name}' finished in "
+                      f"{result.seconds:.2f}s")
+                continue
+            failed.append(result.name)
+            if result.status == "skipped":
+                print(f"Hook '{result.name}' skipped, '{result.blocked}' did "
+                      "not succeed")
+            elif result.status == "timeout":
+                print(f"Hook '{result.name}' timed out after "
+                      f"{result.seconds:.2f}s, see {result.log}")
+            else:
+                print(f"Hook '{result.name}' failed with exit status "
+                      f"{result.returncode}, see {result.log}")
+        return failed
+
+    def __reinitialiseProject(self, path: str, files: dict = None,
+                              submodules: list = ()):
         """!
         Initialize a fresh Git repository in the project directory
 
-        Creates a new Git repository with an initial empty commit to mark
-        the beginning of the project history.
+        Creates a new Git repository with an initial commit to mark the
+        beginning of the project history. The repository is written in process
+        by GitInit rather than by running git.
 
         @param path string representing the path to the project directory to
                     initialize
+        @param files dict mapping the project's files to their blob hashes, to
+                     commit them as the initial commit (optional)
+        @param submodules list of the submodules to register, see
+                          TemplateSubmodules.find. They are committed, along
+                          with their `.gitmodules`, in the initial commit
 
-        @note The repository is initialized with a 'master' branch and an empty
-              commit with the message "#===>[BEGIN]<===#"
+        @note The repository is initialized with a 'master' branch and an
+              initial commit with the message "#===>[BEGIN]<===#", which is
+              empty unless files are given
         """
-        repo = Repo.init(path)
+        gitlinks = None
+        if submodules:
+            with open(os.path.join(path, ".gitmodules"), "w") as f:
+                f.write(TemplateSubmodules.gitmodules(submodules))
+            files = dict(files or {}, **{".gitmodules": None})
+            gitlinks = {sub.path: sub.commit for sub in submodules}
+        GitInit(path).init(files, gitlinks)
         print("Project Initialised")
-        # Ensure HEAD is on 'master' (Git 2.28+ uses 'main' by default)
-        if repo.head.is_detached or "master" not in repo.heads:
-            repo.git.checkout("-b", "master")
-
-        # Make an empty commit
-        repo.git.commit("--allow-empty", "-m", "#===>[BEGIN]<===#")
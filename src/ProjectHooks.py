@@ -0,0 +1,288 @@
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from Config import DataStruct
+from TemplateRender import TemplateRender
+from Trace import span
+
+
+class ProjectHooks:
+    """!
+    Runs the post-generation hooks of a project, e.g. creating a virtualenv,
+    installing dependencies or configuring a build, which the `[hooks]` and
+    `[hooks.<language>]` config sections declare as
+
+        venv = python -m venv .venv
+        deps = .venv/bin/pip install -r requirements.txt
+        deps.after = venv
+        deps.timeout = 900
+        precommit = pre-commit install
+        precommit.after = deps
+        precommit.types = standard, lib
+
+    Every `<name> = <command>` is a hook, run by the shell in the project
+    directory with `{{NAME}}` placeholders rendered as in the project's files.
+    Every value rendered is quoted for the shell, so a placeholder always
+    stands for a single word, whatever spaces or `;` the value holds.
+    Commands are read from the config as written, so `$HOME` or `$(...)` are
+    the shell's and need no escaping, unlike `$` in any other section.
+    `<name>.after` lists the hooks it needs to have succeeded first,
+    `<name>.timeout` overrides the default seconds it may take (0 for no
+    limit) and `<name>.types` limits it to some project types. A language
+    disables a hook by giving it no command.
+
+    The hooks form a graph run on a bounded pool of worker threads, each hook
+    starting as soon as all it needs has succeeded and being skipped if any of
+    it failed. They only start once the project, its repository included, is
+    in place, so GIT in `<name>.after` is always satisfied and is accepted
+    only for configs that name it. Each hook's output is captured in a log
+    file of its own.
+    """
+
+    DEFAULT_JOBS = 4
+
+    ## seconds a hook may take unless configured otherwise
+    DEFAULT_TIMEOUT = 600
+
+    ## the name standing for the project's repository in `<name>.after`
+    GIT = "git"
+
+    ## the attributes a hook can be given as `<name>.<attribute>`
+    ATTRIBUTES = ("after", "timeout", "types")
+
+    ## the number of generations whose hook logs are kept
+    KEEP_LOGS = 50
+
+    def __init__(self, configured: DataStruct = None, projectType: str = None,
+                 variables: dict[str, str] = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """!
+        @param configured DataStruct of the hooks configured for the language
+               (optional)
+        @param projectType string the type of project generated, hooks
+               limited to other types are left out
+        @param variables dict of the project's template variables, rendered
+               into the commands
+        @param timeout the default seconds a hook may take
+        @exception ValueError if the hooks are not configured correctly
+        """
+        self.hooks = self.parse(vars(configured) if configured else {},
+                                projectType, variables or {}, timeout)
+        self.logs = None
+        self.__pool = None
+        self.__condition = threading.Condition()
+        self.__started = set()
+        self.__finished = []
+
+    @classmethod
+    def parse(cls, configured: dict[str, str], projectType: str = None,
+              variables: dict[str, str] = None,
+              timeout: float = DEFAULT_TIMEOUT) -> dict[str, DataStruct]:
+        """!
+        @param configured dict of the `[hooks]` options, see ProjectHooks
+        @param projectType string the type of project generated
+        @param variables dict of template variables to render into commands,
+               each quoted for the shell
+        @param timeout the default seconds a hook may take
+        @returns dict mapping the name of every hook to run, in the order
+                 configured, to a DataStruct with its `name`, `command`,
+                 the hooks it runs `after`, never GIT, and its `timeout`
+        @exception ValueError if a hook is misconfigured, depends on a hook
+                   that does not exist or the hooks depend on each other
+        """
+        render = TemplateRender({
+            key: shlex.quote(value)
+            for key, value in (variables or {}).items()}).renderBytes
+        hooks, attributes, disabled = {}, {}, set()
+        for key, value in configured.items():
+            name, _, attribute = key.partition(".")
+            if name == cls.GIT:
+                raise ValueError(f"'{cls.GIT}' can not be a hook name")
+            if not attribute:
+                if value.strip():
+                    hooks[name] = DataStruct(
+                        name=name, after=[], timeout=float(timeout),
+                        command=os.fsdecode(render(os.fsencode(value))))
+                else:
+                    disabled.add(name)
+            elif attribute in cls.ATTRIBUTES:
+                attributes.setdefault(name, {})[attribute] = value
+            else:
+                raise ValueError(f"unknown hook attribute '{key}'")
+
+        for name, given in attributes.items():
+            if name not in hooks:
+                if name in disabled:
+                    continue
+                raise ValueError(f"hook '{name}' has no command")
+            types = splitNames(given.get("types", ""))
+            if types and projectType not in types:
+                del hooks[name]
+                disabled.add(name)
+                continue
+            hooks[name].after = splitNames(given.get("after", ""))
+            try:
+                hooks[name].timeout = float(given.get("timeout", timeout))
+            except ValueError:
+                raise ValueError(f"timeout of hook '{name}' is not a number")
+
+        for hook in hooks.values():
+            unknown = [n for n in hook.after if n != cls.GIT and
+                       n not in hooks and n not in disabled]
+            if unknown:
+                raise ValueError(f"hook '{hook.name}' runs after unknown hook "
+                                 f"'{unknown[0]}'")
+            # a hook that is not run holds nothing up, nor does the
+            # repository that is always there by the time hooks start
+            hook.after = [n for n in hook.after
+                          if n not in disabled and n != cls.GIT]
+        cls.__checkAcyclic(hooks)
+        return hooks
+
+    @classmethod
+    def __checkAcyclic(cls, hooks: dict[str, DataStruct]):
+        """!
+        @exception ValueError naming the hooks that depend on each other
+        """
+        waiting = {name: set(hook.after) for name, hook in hooks.items()}
+        while waiting:
+            ready = [name for name, after in waiting.items() if not after]
+            if not ready:
+                raise ValueError("hooks " + ", ".join(sorted(waiting)) +
+                                 " depend on each other")
+            for name in ready:
+                del waiting[name]
+            for after in waiting.values():
+                after.difference_update(ready)
+
+    def start(self, path: str, logs: Path, jobs: int = DEFAULT_JOBS):
+        """!
+        start running every hook that does not need anything else first, the
+        rest start as what they need finishes.
+        @param path string path of the project directory
+        @param logs Path of the directory to keep the logs of the hooks in, a
+               directory of its own is made in it for this project
+        @param jobs the maximum number of hooks run concurrently
+        """
+        if not self.hooks:
+            return
+        logs.mkdir(parents=True, exist_ok=True)
+        self.__pruneLogs(logs)
+        name = os.path.basename(os.path.abspath(path))
+        self.logs = Path(tempfile.mkdtemp(
+            dir=logs, prefix=time.strftime("%Y%m%d-%H%M%S-") + f"{name}-"))
+        self.__path = path
+        self.__pool = ThreadPoolExecutor(max_workers=max(1, jobs))
+        with self.__condition:
+            self.__schedule()
+
+    def wait(self):
+        """!
+        wait for every hook to finish.
+        @returns generator of a DataStruct for each hook as it finishes, with
+                 its `name`, `status` (ok, failed, timeout or skipped), its
+                 `returncode`, `seconds`, `log` file and, if skipped, the hook
+                 it was `blocked` by
+        """
+        if self.__pool is None:
+            return
+        try:
+            for index in range(len(self.hooks)):
+                with self.__condition:
+                    self.__condition.wait_for(
+                        lambda: len(self.__finished) > index)
+                    result = self.__finished[index]
+                yield result
+        finally:
+            self.__pool.shutdown(wait=True)
+
+    def __schedule(self):
+        """!
+        start, or skip, every hook whose requirements have all finished. Must
+        be called holding the condition.
+        """
+        changed = True
+        while changed:
+            changed = False
+            for name, hook in self.hooks.items():
+                if name in self.__started:
+                    continue
+                state = [self.__state(after) for after in hook.after]
+                if None in state:
+                    continue
+                self.__started.add(name)
+                changed = True
+                if all(state):
+                    self.__pool.submit(self.__runOne, hook)
+                else:
+                    blocked = hook.after[state.index(False)]
+                    self.__finished.append(DataStruct(
+                        name=name, status="skipped", returncode=None,
+                        seconds=0.0, log=None, blocked=blocked))
+                    self.__condition.notify_all()
+
+    def __state(self, name: str) -> bool | None:
+        """!
+        @returns bool whether name succeeded, None if it has not finished
+        """
+        for result in self.__finished:
+            if result.name == name:
+                return result.status == "ok"
+        return None
+
+    def __runOne(self, hook: DataStruct):
+        result = DataStruct(name=hook.name, status="failed", returncode=None,
+                            seconds=0.0, log=self.logs / f"{hook.name}.log",
+                            blocked=None)
+        start = time.perf_counter()
+        try:
+            with span("hook", hook=hook.name) as running, \
+                    open(result.log, "wb") as log:
+                # a session of its own, so a timeout kills what it started too
+                proc = subprocess.Popen(
+                    hook.command, shell=True, cwd=self.__path,
+                    stdin=subprocess.DEVNULL, stdout=log,
+                    stderr=subprocess.STDOUT, start_new_session=True)
+                try:
+                    result.returncode = proc.wait(timeout=hook.timeout or None)
+                    if result.returncode == 0:
+                        result.status = "ok"
+                except subprocess.TimeoutExpired:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    proc.wait()
+                    result.status = "timeout"
+                running.set(status=result.status)
+        except Exception as e:
+            with open(result.log, "a") as log:
+                log.write(f"could not run hook. {e}\n")
+        result.seconds = time.perf_counter() - start
+        with self.__condition:
+            self.__finished.append(result)
+            self.__schedule()
+            self.__condition.notify_all()
+
+    def __pruneLogs(self, logs: Path):
+        """!
+        remove the logs of all but the most recent KEEP_LOGS generations
+        """
+        try:
+            kept = sorted(logs.iterdir(), reverse=True)
+        except OSError:
+            return
+        for old in kept[self.KEEP_LOGS - 1:]:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def splitNames(value: str) -> list[str]:
+    """!
+    @returns list of the comma separated names in value
+    """
+    return [name.strip() for name in value.split(",") if name.strip()]
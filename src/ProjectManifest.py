@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+
+
+def blobHash(path: str) -> str | None:
+    """!
+    hash a file the way git hashes a blob, so that hashes taken from a
+    project can be compared directly with those git reports for a template.
+    Symlinks are hashed by their target, as git stores them.
+    @param path string path of the file
+    @returns the hex sha1 of the blob, None if path does not exist
+    """
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    if stat.S_ISLNK(info.st_mode):
+        data = os.fsencode(os.readlink(path))
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    digest = hashlib.sha1(b"blob %d\0" % info.st_size)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashFiles(root: str, files: list[str], jobs: int = 4) -> dict[str, str]:
+    """!
+    blob hash many files below root concurrently, hashlib releases the GIL
+    while hashing so the work spreads across threads.
+    @param root string directory the files are relative to
+    @param files list of relative file paths
+    @param jobs the number of hashing threads
+    @returns dict mapping each relative path to its hash, or None if missing
+    """
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        hashes = pool.map(lambda rel: blobHash(os.path.join(root, rel)),
+                          files, chunksize=64)
+        return dict(zip(files, hashes))
+
+
+class ProjectManifest:
+    """!
+    The record, kept in `.progenrtr.json` at the top of every generated
+    project, of the template it was generated from: the template's source,
+    the ref asked for, the commit that ref resolved to (when known) and the
+    git blob hash of every file the template provided. Files that were
+    renamed or changed by rendering template variables also record their
+    `origins`: the path and blob hash they had in the template.
+
+    The manifest is written compactly as one JSON object so that it stays
+    cheap to read when scanning many projects for drift, see DriftScanner.
+    """
+
+    FILE = ".progenrtr.json"
+    VERSION = 1
+
+    @classmethod
+    def create(cls, path: str, template: str, ref: str, commit: str | None,
+               jobs: int = 4, known: dict[str, str] = None,
+               origins: dict[str, list[str]] = None,
+               submodules: list[str] = None) -> DataStruct:
+        """!
+        hash every file of a freshly generated project and write its manifest
+        @param path string path of the project directory
+        @param template string URL or path of the template it came from
+        @param ref string ref of the template that was asked for
+        @param commit string commit ref resolved to, None if not known
+        @param jobs the number of hashing threads
+        @param known dict of blob hashes already known for files, which are
+               then not hashed again
+        @param origins dict mapping rendered files to the [path, blob hash]
+               they had in the template
+        @param submodules list of the paths of the submodules registered in
+               the project rather than generated into it
+        @returns DataStruct of the manifest written
+        """
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            base = os.path.relpath(dirpath, path)
+            # symlinks to directories are stored as links, as in git
+            names = filenames + [d for d in dirnames
+                                 if os.path.islink(os.path.join(dirpath, d))]
+            files.extend(os.path.normpath(os.path.join(base, name))
+                         for name in names)
+        files = sorted(rel for rel in files if rel != cls.FILE)
+        known = known or {}
+        hashes = hashFiles(path, [rel for rel in files if rel not in known],
+                           jobs)
+        hashes.update((rel, known[rel]) for rel in files if rel in known)
+
+        manifest = DataStruct(version=cls.VERSION, template=template, ref=ref,
+                              commit=commit,
+                              files={rel: hashes[rel] for rel in files})
+        if origins:
+            manifest.origins = origins
+        if submodules:
+            manifest.submodules = submodules
+        cls.write(path, manifest)
+        return manifest
+
+    @classmethod
+    def read(cls, path: str) -> DataStruct:
+        """!
+        @param path string path of the project directory
+        @returns DataStruct of the project's manifest
+        @exception OSError if the project has no manifest
+        @exception ValueError if the manifest can not be understood
+        """
+        with open(os.path.join(path, cls.FILE)) as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            raise ValueError(f"unsupported manifest version in '{path}'")
+        return DataStruct(**data)
+
+    @classmethod
+    def write(cls, path: str, manifest: DataStruct):
+        """!
+        @param path string path of the project directory
+        @param manifest DataStruct as returned by create() or read()
+        """
+        with open(os.path.join(path, cls.FILE), "w") as f:
+            json.dump(vars(manifest), f, separators=(",", ":"))
+            f.write("\n")
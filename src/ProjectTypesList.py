@@ -1,6 +1,10 @@
+import json
 import pprint, sys
+from ConfigContext import ConfigContext
 from ConfigManager import ConfMgr as Config
 from Config import DataStruct
+from CatalogIndex import CatalogIndex
+from TemplateCheck import TemplateCheck
 
 class ProjectTypesList:
     """!
@@ -9,18 +13,128 @@ class ProjectTypesList:
 
     NO_LANG = DataStruct(ERROR = "No projects found for language")
 
-    def run(self, args: dict):
+    def __init__(self, config: ConfigContext = None):
+        """!
+        @param config ConfigContext to list the projects of, that of ConfMgr
+               if not given
+        """
+        self.config = config if config is not None else Config().context
+
+    def run(self, args: dict, config: ConfigContext = None):
         """!
         entry point to this command
         @param args the dictionary of command line arguments provided at the
                command line.
+        @param config ConfigContext to list the projects of, rather than the
+               one given when constructed (optional)
         """
-        if args["--lang"] is None:
+        if config is not None:
+            self.config = config
+        if args.get("--check"):
+            self.__check(args)
+        elif self.__wantsIndex(args):
+            self.__query(args)
+        elif args["--lang"] is None:
             print("Listing all known projects for all known languages")
             self.__print()
         else:
             self.__print(args["--lang"])
 
+    def __wantsIndex(self, args: dict) -> bool:
+        """!
+        plain listings keep their original output, anything that searches,
+        filters, pages or asks for machine readable output uses the index.
+        """
+        return bool(args.get("--search") or args.get("--tag")
+                    or args.get("--page") or args.get("--page-size")
+                    or args.get("--format", "text") != "text")
+
+    def __query(self, args: dict):
+        """!
+        search the catalog index and stream the requested page of results
+        @param args the dictionary of command line arguments
+        """
+        fmt = args.get("--format") or "text"
+        if fmt not in ("text", "json", "ndjson"):
+            sys.exit(f"ERROR: unknown format '{fmt}'")
+        try:
+            size = int(args.get("--page-size") or 0)
+            page = int(args.get("--page") or 1)
+        except ValueError as e:
+            sys.exit(f"ERROR: invalid page. {e}")
+
+        lang = args["--lang"]
+        tags = list(args.get("--tag") or [])
+        if lang is None:
+            index = CatalogIndex(self.config.projects.resolve())
+        else:
+            # only the language asked for needs loading
+            index = CatalogIndex(DataStruct(**{
+                lang: self.config.projects.get(lang, DataStruct())}))
+            tags.append(lang)
+        results = index.search(args.get("--search"), tags)
+        if size > 0:
+            results = results[(page - 1) * size:page * size]
+
+        out = sys.stdout
+        if fmt == "json":
+            out.write("[")
+        for number, result in enumerate(results):
+            entry = index.entry(result)
+            if fmt == "text":
+                out.write(f"   {number + 1}. {entry['language']}/"
+                          f"{entry['name']} ({entry['source']})\n")
+            elif fmt == "ndjson":
+                out.write(json.dumps(entry) + "\n")
+            else:
+                out.write(("," if number else "") + json.dumps(entry))
+        if fmt == "json":
+            out.write("]\n")
+
+    def __check(self, args: dict):
+        """!
+        check that every listed template can be reached and report the commit
+        each one currently points at.
+        @param args the dictionary of command line arguments
+        """
+        lang = args["--lang"]
+        if lang is None:
+            projects = vars(self.config.projects.resolve())
+        elif lang in self.config.projects.names():
+            projects = {lang: self.config.projects.get(lang)}
+        else:
+            sys.exit(f"ERROR: Language '{lang}' not found")
+        entries = [(language, name, source)
+                   for language, templates in projects.items()
+                   for name, source in vars(templates).items()]
+        jobs = int(args.get("--jobs") or TemplateCheck.DEFAULT_JOBS)
+        try:
+            timeout = float(args.get("--timeout")
+                            or TemplateCheck.DEFAULT_TIMEOUT)
+        except ValueError as e:
+            sys.exit(f"ERROR: {e}")
+
+        results = TemplateCheck(self.config.meta, jobs, timeout,
+                                args.get("--refresh", False)).check(entries)
+
+        fmt = args.get("--format") or "text"
+        broken = 0
+        for result in results:
+            broken += result.error is not None
+            if fmt == "ndjson":
+                print(json.dumps(vars(result)))
+            elif result.error is None:
+                print(f"[ok]     {result.language}/{result.name} "
+                      f"{result.head or 'directory'}"
+                      f"{' (cached)' if result.cached else ''}")
+            else:
+                print(f"[broken] {result.language}/{result.name} "
+                      f"({result.source}): {result.error}")
+        if fmt != "ndjson":
+            print(f"{len(results) - broken} ok, {broken} broken")
+        if broken:
+            sys.exit(1)
+
     def __print(self, lang: str = None):
         """!
         if a language is provided handle the printing of all the projects
@@ -31,12 +145,13 @@ class ProjectTypesList:
                None.
         """
         if lang is None:
-            for language,entries in vars(Config().projects).items():
+            projects = self.config.projects.resolve()
+            for language,entries in vars(projects).items():
                 print(f"- {language}")
                 self.__printProjects(entries)
         else:
             try:
-                self.__printProjects(Config().projects.get(lang))
+                self.__printProjects(self.config.projects.get(lang))
             except AttributeError as e:
                 sys.exit("ERROR: Language " + str(e))
 
@@ -0,0 +1,173 @@
+import fcntl
+import glob
+import hashlib
+import os
+import secrets
+import subprocess
+import sys
+from pathlib import Path
+
+from utils import cacheDir
+
+
+def removeInBackground(path: str):
+    """!
+    delete the directory at path in a process of its own, so that the caller
+    never waits on it however large it is. Nothing is reported if it fails.
+    @param path string path of the directory, which nothing else may use
+    """
+    subprocess.Popen(
+        [sys.executable, "-c", "import shutil, sys; "
+         "shutil.rmtree(sys.argv[1], ignore_errors=True)", path],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+class StagedTarget:
+    """!
+    A directory built in a stage next to it and moved into place in one
+    rename once complete, so it either appears whole or not at all.
+
+    open() takes an advisory lock on the target, waiting for whoever holds
+    it, and makes the stage, `.<name>.stage-<random>` in the same directory
+    and so on the same filesystem. commit() renames the stage to the target.
+    close() releases the lock, and if the stage was never committed renames
+    it to `.<name>.trash-<random>` and deletes it in the background. Stages
+    left behind by a run that was killed are cleared away the same way by
+    the next run to open the target.
+
+    The lock files are kept in a `locks` directory of the default cache
+    directory, as the `[META]` cacheDir may differ between configs used to
+    generate the same target. Each is removed again by close(), so they do
+    not pile up one per target ever generated.
+    """
+
+    def __init__(self, path: str, locks: Path = None):
+        """!
+        @param path string path of the target directory
+        @param locks Path of the directory to keep lock files in (optional)
+        """
+        self.path = os.path.abspath(path)
+        self.parent, self.name = os.path.split(self.path)
+        self.locks = locks if locks is not None else cacheDir() / "locks"
+        self.stage = None
+        self.__lock = None
+        self.__lockPath = None
+        self.__committed = False
+
+    def __enter__(self) -> "StagedTarget":
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+    def open(self):
+        """!
+        lock the target and make its stage
+        @exception FileExistsError if the target exists and is not an empty
+                   directory
+        @exception OSError if the lock or stage can not be made
+        """
+        self.__acquire()
+        try:
+            if os.path.lexists(self.path) and not (
+                    os.path.isdir(self.path) and not os.listdir(self.path)):
+                raise FileExistsError(f"destination path '{self.path}' "
+                                      "already exists and is not an empty "
+                                      "directory")
+            os.makedirs(self.parent, exist_ok=True)
+            self.__sweep()
+            while self.stage is None:
+                stage = os.path.join(self.parent, f".{self.name}.stage-"
+                                                  f"{secrets.token_hex(4)}")
+                try:
+                    os.mkdir(stage)
+                    self.stage = stage
+                except FileExistsError:
+                    pass
+        except BaseException:
+            self.__release()
+            raise
+
+    def commit(self):
+        """!
+        move the stage into place as the target
+        @exception OSError if the target appeared in the meantime
+        """
+        os.rename(self.stage, self.path)
+        self.__committed = True
+
+    def close(self):
+        """!
+        release the target, discarding its stage unless committed
+        """
+        try:
+            if self.stage is not None and not self.__committed:
+                self.__discard(self.stage)
+        finally:
+            self.stage = None
+            self.__release()
+
+    def __acquire(self):
+        self.locks.mkdir(parents=True, exist_ok=True)
+        key = hashlib.sha1(os.path.join(os.path.realpath(self.parent),
+                                        self.name).encode()).hexdigest()
+        path = self.locks / f"{key}.lock"
+        waited = False
+        while True:
+            lock = open(path, "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if not waited:
+                    print(f"Waiting for another run generating "
+                          f"'{self.path}'", flush=True)
+                    waited = True
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # whoever held the lock removed its file on release, in which
+            # case the lock is on a file nobody else will ever open again
+            try:
+                held = os.fstat(lock.fileno())
+                current = os.stat(path)
+                if (held.st_dev, held.st_ino) == \
+                        (current.st_dev, current.st_ino):
+                    self.__lock, self.__lockPath = lock, path
+                    return
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def __release(self):
+        if self.__lock is not None:
+            try:
+                os.unlink(self.__lockPath)  # while held, see __acquire
+            except OSError:
+                pass
+            self.__lock.close()  # releases the lock
+            self.__lock = None
+
+    def __sweep(self):
+        """!
+        discard the stages of runs that were killed before closing theirs,
+        only possible while holding the lock
+        """
+        prefix = os.path.join(glob.escape(self.parent),
+                              glob.escape(f".{self.name}."))
+        for old in glob.glob(prefix + "trash-*"):
+            removeInBackground(old)
+        for old in glob.glob(prefix + "stage-*"):
+            self.__discard(old)
+
+    def __discard(self, stage: str):
+        """!
+        rename a stage aside and delete it in the background
+        """
+        suffix = os.path.basename(stage)[len(f".{self.name}.stage-"):]
+        trash = os.path.join(self.parent, f".{self.name}.trash-{suffix}")
+        try:
+            os.rename(stage, trash)
+        except OSError:
+            return
+        removeInBackground(trash)
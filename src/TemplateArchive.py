@@ -0,0 +1,339 @@
+import contextlib
+import hashlib
+import io
+import os
+import posixpath
+import shutil
+import stat
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+from TemplateExport import extractMember
+
+## the archive suffixes templates may be published as, and the programs that
+## decompress each, in order of preference. Tars compressed otherwise than by
+## gzip, xz or bzip2 can only be read with one of them.
+DECOMPRESSORS = {
+    ".tar": (), ".tar.gz": (["pigz", "-dc"], ["gzip", "-dc"]),
+    ".tgz": (["pigz", "-dc"], ["gzip", "-dc"]), ".tar.zst": (["zstd", "-dc"],),
+    ".tzst": (["zstd", "-dc"],), ".tar.xz": (["xz", "-dc", "-T0"],),
+    ".txz": (["xz", "-dc", "-T0"],), ".tar.bz2": (["bzip2", "-dc"],),
+    ".zip": (),
+}
+
+## the tarfile stream mode reading each compressed tar when none of its
+## programs is installed
+FALLBACK_MODES = {".tar": "r|", ".tar.gz": "r|gz", ".tgz": "r|gz",
+                  ".tar.xz": "r|xz", ".txz": "r|xz", ".tar.bz2": "r|bz2"}
+
+## files read whole and handed to the writers, larger ones are written as
+## they are read
+SMALL_FILE = 4 * 1024 * 1024
+
+## bytes read ahead of the writers at most
+READ_AHEAD = 64 * 1024 * 1024
+
+
+def archiveSuffix(project: str) -> str | None:
+    """!
+    @param project string URL or path of a template
+    @returns string the archive suffix of project, see DECOMPRESSORS, None if
+             it is not an archive on the local filesystem
+    """
+    path = project.removeprefix("file://")
+    lowered = path.lower()
+    for suffix in sorted(DECOMPRESSORS, key=len, reverse=True):
+        if lowered.endswith(suffix) and "://" not in path:
+            return suffix
+    return None
+
+
+def blob(data: bytes) -> str:
+    """!
+    @returns string the git blob hash of data
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class TemplateArchive:
+    """!
+    Extracts a template published as an archive, a tar (plain or compressed
+    with gzip, zstd, xz or bzip2) or a zip, straight into a project in one
+    pass. Nothing is copied to a temporary file first.
+
+    A compressed tar is decompressed by a program of its own, see
+    DECOMPRESSORS, while its members are read from the pipe. Small files
+    are handed to a pool of writer threads, so decompressing, reading and
+    writing all overlap. The members of a zip are independent of each other,
+    so the writers decompress them as well.
+
+    Every member must stay inside the project. Absolute names, `..` and links
+    leading out of it fail the extraction. A `subdir` strips that leading
+    directory off the members, leaving out everything outside of it, e.g.
+    `tool-1.2` for a release tarball of `tool-1.2/...`. The git blob hash of
+    every file is taken as it is written, so the project's manifest need not
+    read them again.
+    """
+
+    DEFAULT_JOBS = min(32, (os.cpu_count() or 1) * 4)
+
+    def __init__(self, path: str, jobs: int = DEFAULT_JOBS):
+        """!
+        @param path string path of the archive
+        @param jobs the number of writer threads
+        """
+        self.path = path.removeprefix("file://")
+        self.suffix = archiveSuffix(self.path)
+        if self.suffix is None:
+            raise ValueError(f"'{path}' is not a known kind of archive")
+        self.jobs = max(1, jobs)
+        self.__root = None
+        self.__prefix = ""
+        self.__parents = set()
+
+    def extract(self, dest: str, subdir: str = None) -> DataStruct:
+        """!
+        @param dest string the directory to extract into, which may not hold
+               anything the archive does
+        @param subdir string directory of the archive to extract as the
+               root of dest (optional)
+        @returns DataStruct with the `files` and `bytes` written, the `blobs`
+                 of the files and `commit` None, as an archive has none
+        @exception ValueError if a member would leave dest, or subdir is not
+                   in the archive
+        @exception RuntimeError if the archive can not be decompressed
+        @exception OSError if it can not be read or written
+        """
+        os.makedirs(dest, exist_ok=True)
+        self.__root = os.path.realpath(dest)
+        self.__prefix = f"{subdir}/" if subdir else ""
+        self.__parents = set()  # the directories checked to be inside dest
+        stats = DataStruct(commit=None, files=0, bytes=0, blobs={})
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            if self.suffix == ".zip":
+                self.__extractZip(pool, stats)
+            else:
+                with self.__tar() as tar:
+                    self.__extractMembers(tar, pool, stats)
+        if subdir and not stats.files and not os.listdir(dest):
+            raise ValueError(f"'{subdir}' is not a directory of the archive")
+        return stats
+
+    def blobs(self, subdir: str = None) -> dict[str, str]:
+        """!
+        hash every file of the archive as extract() would write it, without
+        writing any
+        @param subdir string directory of the archive holding the template
+               (optional)
+        @returns dict mapping relative file paths to their git blob hashes
+        @exception ValueError if a member would leave the template
+        @exception RuntimeError if the archive can not be decompressed
+        """
+        self.__prefix = f"{subdir}/" if subdir else ""
+        files = {}
+        if self.suffix == ".zip":
+            with zipfile.ZipFile(self.path) as archive:
+                for info in archive.infolist():
+                    name = self.__strip(info.filename)
+                    if name is not None and not info.is_dir():
+                        files[name] = blob(archive.read(info))
+            return files
+        with self.__tar() as tar:
+            for member in tar:
+                name = self.__strip(member.name)
+                if name is None:
+                    continue
+                if member.isfile():
+                    files[name] = blob(tar.extractfile(member).read())
+                elif member.issym():
+                    files[name] = blob(os.fsencode(member.linkname))
+                elif member.islnk():
+                    files[name] = files.get(self.__strip(member.linkname))
+        return files
+
+    @contextlib.contextmanager
+    def __tar(self):
+        """!
+        read the tar, through the first of its decompressors installed
+        """
+        program = next((cmd for cmd in DECOMPRESSORS[self.suffix]
+                        if shutil.which(cmd[0])), None)
+        if program is None and self.suffix not in FALLBACK_MODES:
+            raise RuntimeError(f"{DECOMPRESSORS[self.suffix][0][0]} is needed "
+                               f"to extract {self.suffix} templates")
+        if program is None:
+            with open(self.path, "rb") as f, \
+                    tarfile.open(fileobj=f,
+                                 mode=FALLBACK_MODES[self.suffix]) as tar:
+                yield tar
+            return
+
+        unreadable = None
+        # stderr goes to a file, see exportTree
+        with tempfile.TemporaryFile() as errors, \
+                subprocess.Popen(program + [self.path],
+                                 stdout=subprocess.PIPE,
+                                 stderr=errors) as proc:
+            try:
+                with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+                    yield tar
+                proc.stdout.read()  # the padding after the end of the archive
+            except tarfile.ReadError as e:
+                unreadable = e  # the program may report why on stderr
+                proc.kill()
+            except BaseException:
+                proc.kill()
+                raise
+            proc.wait()
+            errors.seek(0)
+            error = errors.read().decode().strip()
+        if proc.returncode != 0 and (error or unreadable is None):
+            raise RuntimeError(f"{program[0]} could not decompress "
+                               f"{self.path}: {error}")
+        if unreadable is not None:
+            raise unreadable
+
+    def __extractMembers(self, tar: tarfile.TarFile, pool: ThreadPoolExecutor,
+                         stats: DataStruct):
+        pending, ahead = deque(), 0
+        for member in tar:
+            name = self.__strip(member.name)
+            if name is None:
+                continue
+            if not member.isfile():
+                while pending:  # links may point at files still pending
+                    ahead -= self.__record(stats, *pending.popleft())
+                member.name = name
+                if member.islnk():
+                    member.linkname = self.__strip(member.linkname)
+                    if member.linkname is None:
+                        raise ValueError(f"archive link '{name}' leaves the "
+                                         "template")
+                if member.isdir() or member.issym() or member.islnk():
+                    extractMember(tar, member, self.__root)
+                    stats.files += not member.isdir()
+                if member.issym():
+                    stats.blobs[name] = blob(os.fsencode(member.linkname))
+                elif member.islnk():
+                    stats.blobs[name] = stats.blobs.get(member.linkname)
+                continue
+            source = tar.extractfile(member)
+            target = self.__target(name)
+            executable = bool(member.mode & stat.S_IXUSR)
+            if member.size > SMALL_FILE:
+                digest = self.__write(target, source, member.size, executable)
+                self.__record(stats, name, digest, member.size)
+                continue
+            data = io.BytesIO(source.read())
+            pending.append((name, pool.submit(
+                self.__write, target, data, member.size, executable),
+                member.size))
+            ahead += member.size
+            while ahead > READ_AHEAD:
+                ahead -= self.__record(stats, *pending.popleft())
+        while pending:
+            self.__record(stats, *pending.popleft())
+
+    def __extractZip(self, pool: ThreadPoolExecutor, stats: DataStruct):
+        with zipfile.ZipFile(self.path) as archive:
+            jobs = []
+            for info in archive.infolist():
+                name = self.__strip(info.filename)
+                if name is None:
+                    continue
+                mode = info.external_attr >> 16
+                if info.is_dir():
+                    os.makedirs(self.__target(name), exist_ok=True)
+                elif stat.S_ISLNK(mode):
+                    link = archive.read(info).decode()
+                    self.__symlink(name, link)
+                    stats.files += 1
+                    stats.blobs[name] = blob(os.fsencode(link))
+                else:
+                    jobs.append((name, self.__target(name), info,
+                                 bool(mode & stat.S_IXUSR)))
+
+            def write(job: tuple) -> str:
+                _, target, info, executable = job
+                # the shared file of a ZipFile is safe to read from threads
+                with archive.open(info) as source:
+                    return self.__write(target, source, info.file_size,
+                                        executable)
+
+            for (name, _, info, _), digest in zip(jobs, pool.map(write, jobs)):
+                self.__record(stats, name, digest, info.file_size)
+
+    def __strip(self, name: str) -> str | None:
+        """!
+        @returns string the path of an archive member within the project, None
+                 if it is outside of subdir or is subdir itself
+        @exception ValueError if the member would leave the project
+        """
+        rel = posixpath.normpath(name.replace("\\", "/"))
+        if name.startswith("/") or rel == ".." or rel.startswith("../"):
+            raise ValueError(f"archive member '{name}' leaves the template")
+        if rel == "." or not (rel + "/").startswith(self.__prefix) or \
+                rel + "/" == self.__prefix:
+            return None
+        return rel[len(self.__prefix):]
+
+    def __target(self, name: str) -> str:
+        """!
+        @returns string where to write the member name, its parent directory
+                 made
+        @exception ValueError if a link made earlier would lead it out of the
+                   project
+        """
+        target = os.path.join(self.__root, name)
+        parent = os.path.dirname(target)
+        if parent not in self.__parents:
+            os.makedirs(parent, exist_ok=True)
+            real = os.path.realpath(parent)
+            if real != self.__root and \
+                    not real.startswith(self.__root + os.sep):
+                raise ValueError(f"archive member '{name}' leaves the "
+                                 "template")
+            self.__parents.add(parent)
+        return target
+
+    def __symlink(self, name: str, link: str):
+        target = self.__target(name)
+        real = os.path.realpath(os.path.join(os.path.dirname(target), link))
+        if os.path.isabs(link) or (real != self.__root and not real.startswith(
+                self.__root + os.sep)):
+            raise ValueError(f"archive link '{name}' leaves the template")
+        os.symlink(link, target)
+
+    @staticmethod
+    def __write(target: str, source, size: int, executable: bool) -> str:
+        """!
+        write a file as it is read from source, hashing it on the way
+        @returns string its git blob hash
+        """
+        digest = hashlib.sha1(b"blob %d\0" % size)
+        # like git, only the executable bit is taken from the archive, and
+        # O_EXCL never writes through a link
+        fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                     0o777 if executable else 0o666)
+        with os.fdopen(fd, "wb") as f:
+            while chunk := source.read(1024 * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def __record(stats: DataStruct, name: str, digest, size: int) -> int:
+        """!
+        count a file written, digest being its blob hash or the future of it
+        @returns int its size
+        """
+        stats.files += 1
+        stats.bytes += size
+        stats.blobs[name] = digest if isinstance(digest, str) else \
+            digest.result()
+        return size
@@ -0,0 +1,187 @@
+import contextlib
+import io
+import json
+import mmap
+import os
+import struct
+import tarfile
+import tempfile
+import threading
+
+from Config import DataStruct
+from TemplateExport import extractMember
+
+
+class _Slice(io.RawIOBase):
+    """!
+    a read only file over part of a memory map, so that a tar stream can be
+    read out of a bundle without copying it out first
+    """
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self.view) - self.position)
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+
+class TemplateBundle:
+    """!
+    A single file holding the templates of a whole catalog, for generating
+    projects where the templates themselves can not be reached.
+
+    Each template is stored as an uncompressed tar of the files that fetching
+    it would produce, submodules already flattened into it, one after the
+    other. A JSON table of contents follows them, recording for each template
+    and ref where its tar lies along with the commit and blob hashes a
+    project's manifest needs. The file ends in the offset of the table and a
+    magic number:
+
+        MAGIC | tar | tar | ... | table of contents | offset | MAGIC
+
+    Bundles are read through a memory map, so extracting one template only
+    touches the pages of its own tar, however large the bundle. The map is
+    shared by every user of a bundle in the process and unmapped once the
+    last of them is done, see open(), so a long running daemon does not
+    keep every bundle it ever served mapped.
+    """
+
+    MAGIC = b"PGBUNDL1"
+    VERSION = 1
+
+    ## bundles in use in this process, with their number of users, see open()
+    __opened = {}
+    __openLock = threading.Lock()
+
+    def __init__(self, path: str):
+        """!
+        @param path string path of the bundle file
+        @exception OSError if the bundle can not be read
+        @exception ValueError if path is not a bundle
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # an empty file
+                raise ValueError(f"'{path}' is not a template bundle")
+        footer = len(self.MAGIC) + 8
+        if len(self.__map) < len(self.MAGIC) + footer or \
+                self.__map[:len(self.MAGIC)] != self.MAGIC or \
+                self.__map[-len(self.MAGIC):] != self.MAGIC:
+            raise ValueError(f"'{path}' is not a template bundle")
+        offset, = struct.unpack(">Q", self.__map[-footer:-len(self.MAGIC)])
+        toc = json.loads(self.__map[offset:-footer])
+        if toc.get("version") != self.VERSION:
+            raise ValueError(f"unsupported bundle version in '{path}'")
+        self.templates = {(entry["template"], entry["ref"]): DataStruct(
+            **entry) for entry in toc["templates"]}
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, path: str):
+        """!
+        @param path string path of the bundle file
+        @returns context manager giving the TemplateBundle of path, shared by
+                 everyone using the unchanged file at the same time and
+                 closed once the last of them is done
+        """
+        info = os.stat(path)
+        key = (os.path.abspath(path), info.st_mtime_ns, info.st_size)
+        with cls.__openLock:
+            bundle, users = cls.__opened.get(key, (None, 0))
+            if bundle is None:
+                bundle = cls(path)
+            cls.__opened[key] = (bundle, users + 1)
+        try:
+            yield bundle
+        finally:
+            with cls.__openLock:
+                bundle, users = cls.__opened.pop(key)
+                if users > 1:
+                    cls.__opened[key] = (bundle, users - 1)
+                else:
+                    bundle.close()
+
+    def close(self):
+        """!
+        unmap the bundle, it can not be extracted from afterwards
+        """
+        self.__map.close()
+
+    def extract(self, template: str, ref: str, path: str) -> DataStruct:
+        """!
+        unpack a single template into path
+        @param template string the template as given in the config
+        @param ref string the ref of the template that was bundled
+        @param path string directory to unpack the template into
+        @returns DataStruct with the `commit` bundled, the `files` and `bytes`
+                 unpacked, the `blobs` known for them and the paths of the
+                 flattened `submodules`
+        @exception KeyError if the bundle does not hold template at ref
+        """
+        entry = self.templates.get((template, ref))
+        if entry is None:
+            raise KeyError(f"'{template}' at '{ref}' is not in {self.path}")
+        stats = DataStruct(commit=entry.commit, files=0, bytes=0,
+                           blobs=dict(entry.blobs),
+                           submodules=list(entry.submodules))
+        view = memoryview(self.__map)[entry.offset:entry.offset + entry.size]
+        try:
+            os.makedirs(path, exist_ok=True)
+            with tarfile.open(fileobj=_Slice(view), mode="r|") as tar:
+                for member in tar:
+                    extractMember(tar, member, path)
+                    if member.isfile():
+                        stats.files += 1
+                        stats.bytes += member.size
+        finally:
+            view.release()
+        return stats
+
+    @classmethod
+    def create(cls, path: str, templates):
+        """!
+        write a bundle of templates to path. The bundle is written next to
+        path and moved into place once complete.
+        @param path string path of the bundle file to write
+        @param templates iterable of DataStructs, in any order, each with the
+               `template` and `ref` bundled, the `directory` its files were
+               fetched to and the `commit`, `blobs` and `submodules` that
+               extract() hands back
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=".bundle-")
+        contents = []
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(cls.MAGIC)
+                for template in templates:
+                    offset = f.tell()
+                    with tarfile.open(fileobj=f, mode="w|",
+                                      format=tarfile.GNU_FORMAT) as tar:
+                        for name in sorted(os.listdir(template.directory)):
+                            tar.add(os.path.join(template.directory, name),
+                                    arcname=name)
+                    contents.append({
+                        "template": template.template, "ref": template.ref,
+                        "commit": template.commit, "offset": offset,
+                        "size": f.tell() - offset, "blobs": template.blobs,
+                        "submodules": template.submodules})
+                offset = f.tell()
+                f.write(json.dumps({"version": cls.VERSION,
+                                    "templates": contents},
+                                   separators=(",", ":")).encode())
+                f.write(struct.pack(">Q", offset) + cls.MAGIC)
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
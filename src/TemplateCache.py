@@ -0,0 +1,345 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from Config import DataStruct
+from TemplateExport import exportTree, listTree, fetchMissing, sparseClone
+from Trace import span, treeStats
+from TransferStats import TransferStats
+from utils import cacheDir
+
+
+class TemplateCache:
+    """!
+    Keeps a local bare mirror of every remote template repository so that
+    generating a project does not have to transfer the template's history over
+    the network every time.
+
+    Mirrors live under `<cacheDir>/mirrors` and are keyed by a hash of the
+    template URL. A mirror is only fetched again once it is older than the
+    configured TTL (or when a refresh is explicitly requested). Every access to
+    a mirror is guarded by a cross-process `flock` so that concurrent runs can
+    share the cache safely, and a mirror is pinned, by a shared lock of its
+    own, from before it is made up to date until its user is done with it, so
+    it is never evicted in between. Clones and fetches of mirrors show their
+    progress and record what they transferred, see CloneProgress and
+    TransferStats. Mirrors are only evicted once a clone or fetch grew the
+    cache, and the size of each mirror is recorded as it changes, so using
+    a mirror that is up to date costs no more than its locks.
+
+    The following keys of the `[META]` config section are honoured:
+        - cacheDir:      root directory of the cache
+        - cacheTTL:      seconds before a mirror is considered stale
+        - cacheMaxSize:  maximum size of all mirrors in MiB (0 = unbounded)
+        - cacheEviction: `lru` (least recently used) or `fifo` (oldest fetch)
+    """
+
+    DEFAULT_TTL = 3600
+    DEFAULT_MAX_SIZE = 2048
+    DEFAULT_EVICTION = "lru"
+
+    ## stamp files kept inside each mirror to track fetch and use times
+    FETCHED_STAMP = "progenrtr.fetched"
+    USED_STAMP = "progenrtr.used"
+
+    ## stamp file kept inside each mirror holding its size in bytes
+    SIZE_STAMP = "progenrtr.size"
+
+    ## the filter partial mirrors are cloned with
+    PARTIAL_FILTER = "blob:none"
+
+    def __init__(self, meta: DataStruct = None):
+        meta = meta if meta is not None else DataStruct()
+        self.root = cacheDir(meta) / "mirrors"
+        self.ttl = int(meta.get("cachettl", self.DEFAULT_TTL))
+        self.maxSize = int(meta.get("cachemaxsize", self.DEFAULT_MAX_SIZE))
+        self.maxSize *= 1024 * 1024
+        self.eviction = meta.get("cacheeviction", self.DEFAULT_EVICTION)
+        if self.eviction not in ("lru", "fifo"):
+            raise ValueError(f"unknown cacheEviction policy '{self.eviction}'")
+        self.stats = TransferStats(meta)
+
+    @staticmethod
+    def isRemote(project: str) -> bool:
+        """!
+        only remote repositories are worth mirroring, local paths are already
+        as close as they are going to get.
+        @param project string URL or path of the template repository
+        @returns bool true iff project refers to a remote repository
+        """
+        return ("://" in project and not project.startswith("file://")) \
+            or project.startswith("git@")
+
+    def clone(self, url: str, path: str, refresh: bool = False,
+              ref: str = "HEAD", subdir: str = None) -> str | None:
+        """!
+        clone the template at url into path by way of the local mirror. The
+        clone is made from the mirror on the local filesystem so git hardlinks
+        the object database instead of copying it.
+        @param url string URL of the template repository
+        @param path string target directory of the clone
+        @param refresh force a fetch even if the mirror is not stale yet
+        @param ref the commit-ish to check out, only used with subdir
+        @param subdir clone sparsely and hoist this directory of the
+               repository to be path, see TemplateExport.sparseClone
+        @returns string the commit checked out with subdir, otherwise None
+        """
+        from git import Repo  # GitPython is slow to import, only load it here
+
+        if subdir:
+            with self.__filled(url, ref, subdir, refresh) as mirror:
+                return sparseClone(mirror.as_uri(), path, ref, subdir)
+        from CloneProgress import CloneProgress
+
+        with self.using(url, refresh) as mirror:
+            # a local clone, only worth showing and not worth recording
+            progress = CloneProgress(url)
+            Repo.clone_from(str(mirror), path, progress=progress)
+            progress.finish()
+        return None
+
+    def export(self, url: str, ref: str, path: str,
+               refresh: bool = False, subdir: str = None) -> DataStruct:
+        """!
+        export the tree of the template at url and ref into path straight from
+        the local mirror, without writing any history to path.
+        @param url string URL of the template repository
+        @param ref the commit-ish to export
+        @param path string target directory of the export
+        @param refresh force a fetch even if the mirror is not stale yet
+        @param subdir export only this directory of the repository (optional)
+        @returns DataStruct of export statistics, see TemplateExport.exportTree
+        """
+        using = self.__filled(url, ref, subdir, refresh) if subdir \
+            else self.using(url, refresh)
+        with using as mirror:
+            return exportTree(mirror, ref, path, subdir)
+
+    def listTree(self, url: str, ref: str, refresh: bool = False,
+                 subdir: str = None) -> dict[str, str]:
+        """!
+        list the files of the template at url and ref from the local mirror
+        @param url string URL of the template repository
+        @param ref the commit-ish to list
+        @param refresh force a fetch even if the mirror is not stale yet
+        @param subdir list only this directory of the repository, which needs
+               no blobs at all (optional)
+        @returns dict of file blob hashes, see TemplateExport.listTree
+        """
+        with self.using(url, refresh, partial=bool(subdir)) as mirror:
+            return listTree(mirror, ref, subdir)
+
+    @contextmanager
+    def using(self, url: str, refresh: bool = False, partial: bool = False):
+        """!
+        make sure an up to date mirror of url exists, cloning or fetching it
+        as needed, and keep it from being evicted or fetched while in use
+        @param url string URL of the template repository
+        @param refresh force a fetch even if the mirror is not stale yet
+        @param partial use the blobless mirror of url
+        @returns context manager giving the Path to the bare mirror
+        """
+        with self.__pinned(url, refresh, partial) as mirror, \
+                self.__lock(mirror, exclusive=False):
+            yield mirror
+
+    def mirrorPath(self, url: str, partial: bool = False) -> Path:
+        """!
+        @param url string URL of the template repository
+        @param partial the blobless mirror rather than the full one
+        @returns Path at which the mirror for url is (or would be) stored
+        """
+        key = url + self.PARTIAL_FILTER if partial else url
+        key = hashlib.sha256(key.encode()).hexdigest()[:24]
+        return self.root / f"{key}.git"
+
+    def evict(self, keep: Path = None):
+        """!
+        remove mirrors, according to the eviction policy, until the cache fits
+        in its configured size. Mirrors that are pinned, in use by this or any
+        other process, are skipped rather than waited for.
+        @param keep Path of a mirror that must not be evicted (optional)
+        """
+        if self.maxSize <= 0 or not self.root.is_dir():
+            return
+        stamp = self.USED_STAMP if self.eviction == "lru" \
+            else self.FETCHED_STAMP
+        mirrors = [(self.__mtime(m / stamp), m, self.__recordedSize(m))
+                   for m in self.root.glob("*.git")]
+        total = sum(size for _, _, size in mirrors)
+        for _, mirror, size in sorted(mirrors, key=lambda m: m[0]):
+            if total <= self.maxSize:
+                break
+            if mirror == keep:
+                continue
+            try:
+                with self.__lock(mirror, exclusive=True, block=False,
+                                 suffix=".pin"):
+                    shutil.rmtree(mirror, ignore_errors=True)
+                    total -= size
+            except BlockingIOError:
+                continue
+
+    @contextmanager
+    def __pinned(self, url: str, refresh: bool, partial: bool):
+        """!
+        make sure an up to date mirror of url exists and keep it pinned, so
+        that no other run evicts it, until the context is left. The pin is
+        taken before the mirror is even looked at, so there is never a moment
+        between bringing the mirror up to date and using it that it could be
+        evicted in. Other mirrors are evicted if this one had to be cloned or
+        fetched.
+        @returns context manager giving the Path to the bare mirror
+        """
+        mirror = self.mirrorPath(url, partial)
+        with self.__lock(mirror, exclusive=False, suffix=".pin"):
+            if self.__update(url, mirror, refresh, partial):
+                self.evict(keep=mirror)
+            yield mirror
+
+    def __update(self, url: str, mirror: Path, refresh: bool,
+                 partial: bool) -> bool:
+        """!
+        clone the mirror of url if there is none yet, or fetch it if stale
+        @returns bool whether the mirror was cloned or fetched
+        """
+        updated = True
+        with self.__lock(mirror, exclusive=True):
+            if not (mirror / "HEAD").exists():
+                with span("mirror.clone", url=url) as fetching:
+                    self.__createMirror(url, mirror, partial)
+                if fetching:
+                    fetching.set(**treeStats(mirror))
+            elif refresh or self.__isStale(mirror):
+                fetching = span("mirror.fetch", url=url)
+                before = treeStats(mirror) if fetching else None
+                with fetching:
+                    self.__fetchMirror(url, mirror)
+                if fetching:
+                    after = treeStats(mirror)
+                    fetching.set(files=after["files"] - before["files"],
+                                 bytes=after["bytes"] - before["bytes"])
+            else:
+                updated = False
+            if updated:
+                self.__recordSize(mirror)
+            (mirror / self.USED_STAMP).touch()
+        return updated
+
+    def __createMirror(self, url: str, mirror: Path, partial: bool = False):
+        """!
+        clone a bare mirror of url next to its final location and move it into
+        place once complete, so an interrupted clone never looks valid.
+        Partial mirrors serve filtered clones themselves, see clone().
+        """
+        from git import Repo
+        from CloneProgress import CloneProgress
+
+        incomplete = mirror.with_suffix(".partial")
+        shutil.rmtree(incomplete, ignore_errors=True)
+        progress = CloneProgress(url, "clone", stats=self.stats)
+        if partial:
+            repo = Repo.clone_from(url, incomplete, mirror=True,
+                                   filter=self.PARTIAL_FILTER,
+                                   progress=progress)
+            repo.git.config("uploadpack.allowFilter", "true")
+        else:
+            Repo.clone_from(url, incomplete, mirror=True, progress=progress)
+        progress.finish()
+        os.replace(incomplete, mirror)
+        (mirror / self.FETCHED_STAMP).touch()
+
+    @contextmanager
+    def __filled(self, url: str, ref: str, subdir: str, refresh: bool):
+        """!
+        make sure the partial mirror of url holds every blob of subdir at ref,
+        and keep it from being evicted or fetched while in use
+        @returns context manager giving the Path to the partial mirror
+        """
+        with self.__pinned(url, refresh, partial=True) as mirror:
+            with self.__lock(mirror, exclusive=True):
+                with span("mirror.blobs", url=url, subdir=subdir) \
+                        as fetching:
+                    fetched = fetchMissing(mirror, ref, subdir)
+                    fetching.set(files=fetched)
+                if fetched:
+                    self.__recordSize(mirror)
+            if fetched:
+                self.evict(keep=mirror)
+            with self.__lock(mirror, exclusive=False):
+                yield mirror
+
+    def __fetchMirror(self, url: str, mirror: Path):
+        """!
+        bring an existing mirror up to date with its remote
+        """
+        from git import Repo
+        from CloneProgress import CloneProgress
+
+        progress = CloneProgress(url, "fetch", stats=self.stats)
+        Repo(mirror).remote().fetch(prune=True, progress=progress)
+        progress.finish()
+        (mirror / self.FETCHED_STAMP).touch()
+
+    def __isStale(self, mirror: Path) -> bool:
+        return time.time() - self.__mtime(mirror / self.FETCHED_STAMP) \
+            > self.ttl
+
+    @staticmethod
+    def __mtime(path: Path) -> float:
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def __recordSize(self, mirror: Path):
+        """!
+        note the size of mirror in its stamp, for evict() to read rather than
+        walk every file of every mirror. Must be called holding its `.lock`.
+        """
+        (mirror / self.SIZE_STAMP).write_text(str(self.__size(mirror)))
+
+    def __recordedSize(self, mirror: Path) -> int:
+        """!
+        @returns int the size of mirror as last recorded, measured afresh if
+                 it never was
+        """
+        try:
+            return int((mirror / self.SIZE_STAMP).read_text())
+        except (OSError, ValueError):
+            return self.__size(mirror)
+
+    @staticmethod
+    def __size(path: Path) -> int:
+        total = 0
+        for dirpath, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    @contextmanager
+    def __lock(self, mirror: Path, exclusive: bool, block: bool = True,
+               suffix: str = ".lock"):
+        """!
+        hold an advisory lock for a mirror. Lock files sit beside the mirror so
+        that evicting a mirror does not pull the lock out from under a waiter.
+        `.lock` guards the contents of the mirror, `.pin` its existence, see
+        __pinned.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not block:
+            flags |= fcntl.LOCK_NB
+        with open(mirror.with_suffix(suffix), "a") as lock:
+            fcntl.flock(lock, flags)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
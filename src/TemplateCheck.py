@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+from TemplateArchive import archiveSuffix
+from TemplateSource import parseSource, splitLayers
+from utils import cacheDir
+
+
+class TemplateCheck:
+    """!
+    Verifies that every template in the config can actually be reached, by
+    resolving the HEAD of each one with `git ls-remote`.
+
+    Lookups run concurrently on a bounded thread pool, each with a timeout.
+    Successfully resolved heads are remembered in `<cacheDir>/refs.json` for
+    `checkTTL` seconds (see the `[META]` section), so repeating a check soon
+    afterwards costs next to nothing. Failures are never cached.
+    """
+
+    DEFAULT_TTL = 300
+    DEFAULT_TIMEOUT = 10.0
+    DEFAULT_JOBS = 4
+
+    ## a full commit hash, SHA-1 or SHA-256, that a template may be pinned to
+    COMMIT = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+
+    def __init__(self, meta: DataStruct = None, jobs: int = DEFAULT_JOBS,
+                 timeout: float = DEFAULT_TIMEOUT, refresh: bool = False):
+        """!
+        @param meta DataStruct of the `[META]` config section (optional)
+        @param jobs the maximum number of concurrent lookups
+        @param timeout seconds after which a single lookup is abandoned
+        @param refresh ignore previously cached results
+        """
+        meta = meta if meta is not None else DataStruct()
+        self.ttl = int(meta.get("checkttl", self.DEFAULT_TTL))
+        self.cachePath = cacheDir(meta) / "refs.json"
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.refresh = refresh
+
+    def check(self, entries: list[tuple[str, str, str]]) -> list[DataStruct]:
+        """!
+        resolve every entry, each distinct source is only looked up once.
+        Every layer of a layered template is looked up, see splitLayers.
+        @param entries list of (language, name, source) tuples
+        @returns list of DataStructs, one per entry in order, holding the
+                 language, name, source, resolved head (or None), the error
+                 (or None) and whether the result came from the cache. The
+                 head of a layered template is that of its base layer.
+        """
+        cache = {} if self.refresh else self.__loadCache()
+        now = time.time()
+        fresh = {key: hit for key, hit in cache.items()
+                 if now - hit["time"] <= self.ttl}
+        layers = {}
+        for _, _, source in entries:
+            try:
+                layers[source] = splitLayers(source)
+            except ValueError:
+                layers[source] = [source]  # its lookup reports the error
+        keys = {layer: self.__key(layer)
+                for sources in layers.values() for layer in sources}
+        pending = sorted(source for source, key in keys.items()
+                         if key not in fresh)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            resolved = dict(zip(pending, pool.map(self.resolve, pending)))
+
+        updated = dict(fresh)
+        updated.update({keys[source]: {"head": head, "time": now}
+                        for source, (head, error) in resolved.items()
+                        if error is None})
+        if updated != fresh or len(cache) != len(fresh):
+            self.__storeCache(updated)
+
+        def lookup(source: str) -> tuple[str | None, str | None, bool]:
+            if keys[source] in fresh:
+                return fresh[keys[source]]["head"], None, True
+            return *resolved[source], False
+
+        results = []
+        for language, name, source in entries:
+            found = [lookup(layer) for layer in layers[source]]
+            errors = [error if len(found) == 1 else f"layer '{layer}': {error}"
+                      for layer, (_, error, _) in zip(layers[source], found)
+                      if error is not None]
+            results.append(DataStruct(
+                language=language, name=name, source=source,
+                head=found[0][0], error=errors[0] if errors else None,
+                cached=all(cached for _, _, cached in found)))
+        return results
+
+    def resolve(self, source: str) -> tuple[str | None, str | None]:
+        """!
+        look up the commit the ref of a template points at, HEAD unless the
+        source gives one. Tags and branches are matched by their full name,
+        and a template pinned to a full commit hash needs only be reachable.
+        @param source URL or path of the template repository
+        @returns tuple of (head, None) on success, (None, None) for a plain
+                 directory or (None, error message)
+        """
+        try:
+            splitLayers(source)  # rejects the empty layers check() passes on
+            source = parseSource(source)
+        except ValueError as e:
+            return None, str(e)
+        local = source.url.removeprefix("file://")
+        if archiveSuffix(local):
+            if not os.path.isfile(local):
+                return None, f"no such archive '{local}'"
+            return None, None  # extracted as is
+        if os.path.isdir(local) and not os.path.exists(f"{local}/.git") \
+                and not os.path.exists(f"{local}/HEAD"):
+            return None, None  # a plain directory, copied as is
+        ref = source.ref or "HEAD"
+        if self.COMMIT.fullmatch(ref):
+            # a pinned commit is not a ref ls-remote could list, so only
+            # check that the repository can be reached
+            _, error = self.__lsRemote(source.url, ["HEAD"])
+            return (ref, None) if error is None else (None, error)
+        if ref == "HEAD" or ref.startswith("refs/"):
+            names = [ref]
+        else:
+            names = [f"refs/{ref}", f"refs/tags/{ref}", f"refs/heads/{ref}"]
+        # annotated tags are peeled to the commit they point at
+        refs, error = self.__lsRemote(
+            source.url, [n for name in names for n in (name, f"{name}^{{}}")])
+        if error is not None:
+            return None, error
+        for name in names:
+            head = refs.get(f"{name}^{{}}") or refs.get(name)
+            if head is not None:
+                return head, None
+        return None, f"repository has no {ref}"
+
+    def __lsRemote(self, url: str, patterns: list[str]) \
+            -> tuple[dict[str, str] | None, str | None]:
+        """!
+        list the refs of the repository at url matching patterns. git matches
+        patterns against the end of ref names, so callers look up the exact
+        names they asked for in the result.
+        @returns tuple of (dict mapping ref names to their objects, None) or
+                 (None, error message)
+        """
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        try:
+            proc = subprocess.run(["git", "ls-remote", url, *patterns],
+                                  capture_output=True, text=True, env=env,
+                                  timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            return None, f"timed out after {self.timeout:g}s"
+        except OSError as e:
+            return None, str(e)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            fatal = [line for line in lines if line.startswith("fatal:")]
+            return None, (fatal or lines or [f"exit {proc.returncode}"])[0]
+        refs = {}
+        for line in proc.stdout.splitlines():
+            head, _, name = line.partition("\t")
+            refs[name] = head
+        return refs, None
+
+    @staticmethod
+    def __key(source: str) -> str:
+        """!
+        relative paths are resolved against the working directory, so cache
+        them under their absolute path, keeping any `#<ref>:<subdir>`.
+        """
+        url, hash, fragment = source.partition("#")
+        if "://" in url or (":" in url and not os.path.exists(url)):
+            return source  # a URL, or `host:path` as scp and git take it
+        return os.path.abspath(url) + hash + fragment
+
+    def __loadCache(self) -> dict:
+        try:
+            with open(self.cachePath) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __storeCache(self, cache: dict):
+        try:
+            self.cachePath.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cachePath.parent,
+                                       suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cachePath)
+        except OSError:
+            pass
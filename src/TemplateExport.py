@@ -0,0 +1,201 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+
+from Config import DataStruct
+
+
+def exportTree(repo: str, ref: str, path: str,
+               subdir: str = None) -> DataStruct:
+    """!
+    materialise the tree of repo at ref in path without copying any history.
+    `git archive` streams the tree as a tar which is unpacked as it arrives, so
+    neither the template's object database nor the archive itself is written
+    to disk.
+
+    @param repo path to a local (bare or non-bare) git repository
+    @param ref the commit-ish to export
+    @param path the directory to unpack the tree into
+    @param subdir export only this directory of the tree, as the root of path
+           (optional)
+    @returns DataStruct with the exported commit, file count and bytes written
+    @exception RuntimeError if git fails to produce the archive
+    """
+    commit = None
+    if subdir:
+        # a subtree carries no commit of its own, so resolve it up front
+        commit = resolveCommit(repo, ref)
+        ref = f"{commit}:{subdir}"
+    cmd = ["git", "-C", str(repo), "archive", "--format=tar", ref]
+    stats = DataStruct(commit=commit, files=0, bytes=0)
+    # stderr goes to a file, a pipe read only once stdout is done would
+    # block git as soon as it warns about more than the pipe holds
+    with tempfile.TemporaryFile() as errors, \
+            subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                             stderr=errors) as proc:
+        try:
+            with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+                for member in tar:
+                    extractMember(tar, member, path)
+                    if member.isfile():
+                        stats.files += 1
+                        stats.bytes += member.size
+                stats.commit = commit or tar.pax_headers.get("comment")
+            proc.stdout.read()  # the padding after the end of the archive
+        except tarfile.ReadError:
+            proc.kill()  # git reports the reason on stderr, handled below
+        except BaseException:
+            proc.kill()
+            raise
+        proc.wait()
+        errors.seek(0)
+        error = errors.read().decode().strip()
+    if proc.returncode != 0:
+        raise RuntimeError(f"git archive {ref} failed: {error}")
+    return stats
+
+
+def listTree(repo: str, ref: str, subdir: str = None) -> dict[str, str]:
+    """!
+    list every file in the tree of repo at ref along with its blob hash,
+    without reading any of the files themselves.
+
+    @param repo path to a local (bare or non-bare) git repository
+    @param ref the commit-ish to list
+    @param subdir list only this directory of the tree, relative to itself
+           (optional)
+    @returns dict mapping relative file paths to their git blob hashes,
+             submodules are left out
+    @exception RuntimeError if git can not list the tree
+    """
+    treeish = f"{ref}:{subdir}" if subdir else ref
+    cmd = ["git", "-C", str(repo), "ls-tree", "-r", "-z", "--full-tree",
+           treeish]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"git ls-tree {ref} failed: "
+                           f"{proc.stderr.decode().strip()}")
+    files = {}
+    for line in proc.stdout.split(b"\0"):
+        if line:
+            info, name = line.split(b"\t", 1)
+            _, kind, blob = info.split()
+            if kind == b"blob":
+                files[name.decode(errors="surrogateescape")] = blob.decode()
+    return files
+
+
+def resolveCommit(repo: str, ref: str) -> str:
+    """!
+    @param repo path to a local git repository
+    @param ref the commit-ish to resolve
+    @returns string the full hash of the commit ref points at
+    @exception RuntimeError if ref is not a commit of repo
+    """
+    proc = subprocess.run(["git", "-C", str(repo), "rev-parse", "--verify",
+                           "--quiet", f"{ref}^{{commit}}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{ref}' is not a commit")
+    return proc.stdout.strip()
+
+
+def fetchMissing(repo: str, ref: str, subdir: str = None) -> int:
+    """!
+    fetch, in a single request, every blob of the tree at ref that a partial
+    clone does not hold yet. Left to itself git would fetch them one at a
+    time as they are read. The fetch is the one git makes for its own lazy
+    fetches, so it works against every server that supports partial clones.
+
+    @param repo path to a local partial clone
+    @param ref the commit-ish whose tree is needed
+    @param subdir only fetch the blobs below this directory (optional)
+    @returns int the number of blobs fetched
+    @exception RuntimeError if git fails to list or fetch the blobs
+    """
+    treeish = f"{ref}:{subdir}" if subdir else ref
+    proc = subprocess.run(["git", "-C", str(repo), "rev-list", "--objects",
+                           "--missing=print", treeish],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"git rev-list {treeish} failed: "
+                           f"{proc.stderr.strip()}")
+    missing = [line[1:] for line in proc.stdout.splitlines()
+               if line.startswith("?")]
+    if not missing:
+        return 0
+    proc = subprocess.run(["git", "-C", str(repo), "-c",
+                           "fetch.negotiationAlgorithm=noop", "fetch",
+                           "origin", "--no-tags", "--no-write-fetch-head",
+                           "--recurse-submodules=no", "--filter=blob:none",
+                           "--stdin"], input="\n".join(missing) + "\n",
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"could not fetch {len(missing)} blobs: "
+                           f"{proc.stderr.strip()}")
+    return len(missing)
+
+
+def sparseClone(source: str, path: str, ref: str, subdir: str) -> str:
+    """!
+    clone source into path with only subdir checked out and then hoist
+    subdir to be path itself, leaving the rest of the repository behind.
+    Sources given as URLs are cloned blobless, so only the blobs of subdir
+    are transferred.
+
+    @param source URL or path of the repository to clone
+    @param path the directory to clone into, must not exist yet
+    @param ref the commit-ish to check out
+    @param subdir the directory of the repository to keep
+    @returns string the commit that was checked out
+    @exception RuntimeError if any git command fails
+    """
+    partial = ["--filter=blob:none"] if "://" in source else []
+    steps = [("clone", ["clone", "--quiet", "--no-checkout", "--sparse"]
+              + partial + [source, path]),
+             ("sparse-checkout", ["-C", path, "sparse-checkout", "set",
+                                  "--no-cone", f"/{subdir}/"]),
+             ("checkout", ["-C", path, "checkout", "--quiet", ref])]
+    for name, cmd in steps:
+        proc = subprocess.run(["git"] + cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"git {name} failed: {proc.stderr.strip()}")
+    commit = resolveCommit(path, "HEAD")
+    hoist(path, subdir)
+    return commit
+
+
+def hoist(path: str, subdir: str):
+    """!
+    replace the directory path with its own subdirectory subdir, discarding
+    everything else in path, `.git` included.
+
+    @param path the directory to replace
+    @param subdir the directory below path to take its place
+    @exception FileNotFoundError if subdir does not exist below path
+    """
+    inner = os.path.join(path, subdir)
+    if not os.path.isdir(inner):
+        raise FileNotFoundError(f"'{subdir}' is not a directory of the "
+                                "template")
+    # a sibling of path, so every move below is a rename
+    parent = os.path.dirname(os.path.abspath(path))
+    holding = tempfile.mkdtemp(dir=parent, prefix=".hoist-")
+    kept = os.path.join(holding, "kept")
+    os.rename(inner, kept)
+    shutil.rmtree(path)
+    os.rename(kept, path)
+    os.rmdir(holding)
+
+
+def extractMember(tar: tarfile.TarFile, member: tarfile.TarInfo, path: str):
+    """!
+    extract a single member, refusing anything that would land outside of path
+    where this python provides the tarfile extraction filters.
+    """
+    if hasattr(tarfile, "data_filter"):
+        tar.extract(member, path, filter="data")
+    else:
+        tar.extract(member, path)
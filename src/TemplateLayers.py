@@ -0,0 +1,113 @@
+import os
+import posixpath
+
+from Config import DataStruct
+
+
+def resolveLayers(layers: list[dict[str, bool]]) -> list[set[str]]:
+    """!
+    decide which paths of each layer of a template make it into the project.
+    A path of a layer hides the same path in the layers before it and a file
+    also hides whatever they have below it, so a file and a directory in
+    its place never mix. The contents of directories are merged.
+
+    @param layers list of dicts, the base layer first, mapping the relative
+           paths of the files of each layer (with `/` separators) to whether
+           the path is an empty directory
+    @returns list of the set of paths kept of each layer
+    """
+    files, dirs = set(), set()
+    kept = [set() for _ in layers]
+    for index in reversed(range(len(layers))):
+        for rel, empty in layers[index].items():
+            if rel in files or (not empty and rel in dirs):
+                continue
+            parent = posixpath.dirname(rel)
+            while parent and parent not in files:
+                parent = posixpath.dirname(parent)
+            if not parent:
+                kept[index].add(rel)
+        for rel in kept[index]:
+            if not layers[index][rel]:
+                files.add(rel)
+            else:
+                dirs.add(rel)
+            parent = posixpath.dirname(rel)
+            while parent and parent not in dirs:
+                dirs.add(parent)
+                parent = posixpath.dirname(parent)
+    return kept
+
+
+def scanTree(root: str) -> dict[str, bool]:
+    """!
+    @param root string directory a layer was fetched into
+    @returns dict mapping the relative path of every file, symlink and empty
+             directory below root to whether it is an empty directory, as
+             resolveLayers takes them. The repository at the top is left out.
+    """
+    found = {}
+    pending = [""]
+    while pending:
+        rel = pending.pop()
+        empty = True
+        with os.scandir(os.path.join(root, rel)) as entries:
+            for entry in entries:
+                empty = False
+                if not rel and entry.name == ".git":
+                    continue
+                path = posixpath.join(rel, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(path)
+                else:
+                    found[path] = False
+        if empty and rel:
+            found[rel] = True
+    return found
+
+
+def mergeTrees(trees: list[str], path: str) -> DataStruct:
+    """!
+    merge the layers of a template, each fetched into a directory of its
+    own, into path in one pass, see resolveLayers. Nothing is copied, the
+    files are renamed into place and so trees must be on the filesystem of
+    path. A directory only one layer has anything in is renamed whole.
+
+    @param trees list of the directories of the layers, the base first
+    @param path string the empty directory to merge them into
+    @returns DataStruct with the `kept` set of paths of each layer, the
+             number of `files` merged and of those `overridden` by a later
+             layer
+    """
+    layers = [scanTree(tree) for tree in trees]
+    kept = resolveLayers(layers)
+
+    # the layers with anything kept in each directory
+    owners = {}
+    for index, paths in enumerate(kept):
+        for rel in paths:
+            parent = rel if layers[index][rel] else posixpath.dirname(rel)
+            while parent:
+                owners.setdefault(parent, set()).add(index)
+                parent = posixpath.dirname(parent)
+
+    moved = set()
+    for index, paths in enumerate(kept):
+        for rel in sorted(paths):
+            parts = rel.split("/")
+            unit = next((top for top in ("/".join(parts[:depth])
+                                         for depth in range(1, len(parts)))
+                         if owners[top] == {index}), rel)
+            if unit in moved:
+                continue
+            moved.add(unit)
+            target = os.path.join(path, unit)
+            if os.path.isdir(target):
+                continue  # an empty directory some other layer has too
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(os.path.join(trees[index], unit), target)
+
+    files = sum(not empty for layer in layers for empty in layer.values())
+    merged = sum(not layers[index][rel]
+                 for index, paths in enumerate(kept) for rel in paths)
+    return DataStruct(kept=kept, files=merged, overridden=files - merged)
@@ -0,0 +1,236 @@
+import fnmatch
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+from ProjectManifest import blobHash
+
+## the [vars] key listing the globs of paths never rendered, it is not a
+## variable itself
+EXCLUDE = "render.exclude"
+
+
+class TemplateRender:
+    """!
+    Substitutes `{{NAME}}` placeholders in the file contents and path names of
+    a freshly generated project. Names are matched case-insensitively, as
+    configparser lower-cases the variable names in the config, and
+    placeholders naming an unknown variable are left untouched.
+
+    One prefilter pass reads each file, memory-mapping the large ones, skips
+    it if it looks binary (a NUL byte in its first 8000 bytes, as git decides)
+    and otherwise searches it for any known placeholder. Only the files that
+    contain one are rewritten, streamed through in chunks so that large files
+    are never held in memory whole. Both passes run on a pool of worker
+    threads.
+
+    Paths matching one of the `exclude` globs, relative to the project, are
+    neither rewritten nor renamed, nor is anything below a directory matching
+    one. Templates shipping `{{ }}` of their own, Helm charts or Jinja
+    templates, keep them that way.
+    """
+
+    DEFAULT_JOBS = 4
+
+    ## bytes read at a time when rewriting a file
+    CHUNK = 1024 * 1024
+
+    ## bytes git looks at to decide whether a file is binary
+    SNIFF = 8000
+
+    ## placeholders longer than this can not straddle two chunks
+    LONGEST = 256
+
+    def __init__(self, variables: dict[str, str], jobs: int = DEFAULT_JOBS,
+                 exclude: list[str] = ()):
+        """!
+        @param variables dict mapping variable names to their values
+        @param jobs the number of worker threads
+        @param exclude list of globs of the paths not to render (optional)
+        """
+        self.variables = {name.lower(): str(value).encode()
+                          for name, value in variables.items()}
+        self.jobs = max(1, jobs)
+        self.exclude = list(exclude)
+        names = "|".join(re.escape(name) for name in sorted(
+            self.variables, key=len, reverse=True))
+        self.pattern = re.compile(
+            rb"\{\{\s*(?i:(%s))\s*\}\}" % names.encode()) if names else None
+
+    def render(self, path: str) -> dict[str, tuple[str, str]]:
+        """!
+        render every placeholder in the project at path, in place
+        @param path string path of the project directory
+        @returns dict mapping the relative path of every file that was changed
+                 or renamed to the relative path and blob hash it had before
+        """
+        if self.pattern is None:
+            return {}
+        files, renames = [], []
+        skip = len(os.path.join(path, ""))
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            relative = dirpath[skip:]
+            files.extend(os.path.join(relative, name) for name in filenames)
+            renames.extend(os.path.join(dirpath, name)
+                           for name in filenames + dirnames if "{{" in name
+                           and not self.excluded(os.path.join(relative,
+                                                              name)))
+        rendered = [name for name in files if not self.excluded(name)]
+
+        # hand each worker a whole batch, one future per file costs more
+        # than reading most files does
+        batches = [rendered[i::self.jobs] for i in range(self.jobs)]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            matched = [name for batch in pool.map(
+                lambda batch: [name for name in batch if self.__contains(
+                    os.path.join(path, name))], batches) for name in batch]
+            originals = dict(zip(matched, pool.map(
+                lambda name: blobHash(os.path.join(path, name)), matched)))
+            list(pool.map(lambda name: self.__renderFile(
+                os.path.join(path, name)), matched))
+
+        self.__renamePaths(renames)
+        changed = {}
+        for name in files:
+            new = self.__renderName(name) if "{{" in name else name
+            if name in originals:
+                changed[new] = (name, originals[name])
+            elif new != name:
+                changed[new] = (name, blobHash(os.path.join(path, new)))
+        return changed
+
+    def renderBytes(self, data: bytes) -> bytes:
+        """!
+        @param data bytes to substitute the placeholders in
+        @returns data with every known placeholder replaced by its value
+        """
+        if self.pattern is None:
+            return data
+        return self.pattern.sub(
+            lambda match: self.variables[match[1].lower().decode()], data)
+
+    def excluded(self, name: str) -> bool:
+        """!
+        @param name string path relative to the project
+        @returns bool true iff name, or a directory it is in, matches one of
+                 the exclude globs
+        """
+        parts = name.split(os.sep)
+        return any(fnmatch.fnmatchcase("/".join(parts[:depth]), glob)
+                   for glob in self.exclude
+                   for depth in range(1, len(parts) + 1))
+
+    def __renderName(self, name: str) -> str:
+        """!
+        @returns string the path name is renamed to, see __renamePaths
+        """
+        parts = name.split(os.sep)
+        return os.sep.join(
+            part if "{{" not in part or self.excluded(
+                os.sep.join(parts[:depth + 1])) else
+            os.fsdecode(self.renderBytes(os.fsencode(part)))
+            for depth, part in enumerate(parts))
+
+    def __contains(self, path: str) -> bool:
+        """!
+        @returns bool true iff path is a text file holding a placeholder.
+                 Symlinks are never followed, files larger than a chunk are
+                 memory-mapped rather than read.
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return False  # a symlink, or gone
+        with open(fd, "rb") as f:
+            size = os.fstat(fd).st_size
+            if size <= self.CHUNK:
+                data = f.read()
+                return b"\0" not in data[:self.SNIFF] and \
+                    self.pattern.search(data) is not None
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as m:
+                if m.find(b"\0", 0, self.SNIFF) != -1:
+                    return False
+                return self.pattern.search(m) is not None
+
+    def __renderFile(self, path: str):
+        """!
+        rewrite path with its placeholders substituted, chunk by chunk. A
+        chunk ending part way into what may be a placeholder holds that tail
+        back until the next chunk has been read.
+        """
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix=".render-")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                carry = b""
+                while chunk := src.read(self.CHUNK):
+                    data = carry + chunk
+                    cut = data.rfind(b"{{", max(0, len(data) - self.LONGEST))
+                    if cut == -1 or data.find(b"}}", cut) != -1:
+                        # a lone brace may yet become the start of one
+                        cut = len(data) - 1 if data.endswith(b"{") \
+                            else len(data)
+                    data, carry = data[:cut], data[cut:]
+                    dst.write(self.renderBytes(data))
+                dst.write(self.renderBytes(carry))
+            shutil.copymode(path, temp)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def __renamePaths(self, paths: list[str]):
+        """!
+        rename every one of paths whose name holds a placeholder, deepest
+        first so that renaming a directory never moves a path that is still to
+        be renamed.
+        @param paths string paths that may need renaming, parents before
+               their children as os.walk() lists them
+        """
+        for old in reversed(paths):
+            dirname, name = os.path.split(old)
+            rendered = self.renderBytes(os.fsencode(name))
+            if rendered == os.fsencode(name):
+                continue
+            new = os.path.join(dirname, os.fsdecode(rendered))
+            if os.path.lexists(new):
+                raise FileExistsError(f"rendering '{old}' would "
+                                      f"overwrite '{new}'")
+            os.rename(old, new)
+
+
+def projectVariables(path: str, language: str, projectType: str,
+                     configured: DataStruct = None,
+                     given: list[str] = ()) -> dict[str, str]:
+    """!
+    collect the variables for a project, later sources overriding earlier
+    ones: the built in `project_name`, `language` and `project_type`, then
+    those configured for the language and then those given as `KEY=VALUE`
+    strings on the command line. EXCLUDE is not a variable and left out.
+    @exception ValueError if a given variable is not of the form KEY=VALUE
+    """
+    variables = {"project_name": os.path.basename(os.path.abspath(path)),
+                 "language": language or "", "project_type": projectType or ""}
+    if configured is not None:
+        variables.update(vars(configured))
+        variables.pop(EXCLUDE, None)
+    for assignment in given:
+        key, sep, value = assignment.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"variable '{assignment}' is not KEY=VALUE")
+        variables[key.strip().lower()] = value
+    return variables
+
+
+def renderExclusions(configured: DataStruct = None) -> list[str]:
+    """!
+    @param configured DataStruct of the variables configured for a language
+    @returns list of the globs of its EXCLUDE, comma or whitespace separated
+    """
+    value = configured.get(EXCLUDE) if configured is not None else None
+    return (value or "").replace(",", " ").split()
@@ -0,0 +1,73 @@
+import os
+
+from Config import DataStruct
+
+
+def parseSource(spec: str) -> DataStruct:
+    """!
+    split a template entry of the config into its parts. An entry is the URL
+    or path of a repository, optionally followed by `#<ref>`, by
+    `#<ref>:<subdir>` or by `#:<subdir>`, e.g.
+    `https://example.com/mono.git#main:templates/cpp` for the templates/cpp
+    directory of the main branch of a monorepo.
+
+    @param spec string template entry of the config
+    @returns DataStruct with the `url` of the repository, the `ref` given (or
+             None) and the `subdir` to use as the template root (or None)
+    @exception ValueError if subdir leaves the repository
+    """
+    url, _, fragment = spec.partition("#")
+    ref, _, subdir = fragment.partition(":")
+    parts = [part for part in subdir.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        raise ValueError(f"template subdirectory '{subdir}' leaves the "
+                         "repository")
+    return DataStruct(url=url, ref=ref or None,
+                      subdir="/".join(parts) or None)
+
+
+def splitLayers(spec: str) -> list[str]:
+    """!
+    split a template entry of the config into its layers. An entry may list
+    several comma separated sources, each as parseSource() takes them, e.g.
+    `https://example.com/base.git, https://example.com/ci.git#v2` for a base
+    template with CI config laid over it. The first is the base, the later
+    ones are overlays, each taking precedence over those before it.
+
+    @param spec string template entry of the config
+    @returns list of the sources of the layers, just spec for a template
+             that is not layered
+    @exception ValueError if a layer is left empty
+    """
+    if "," not in spec:
+        return [spec]
+    layers = [layer.strip() for layer in spec.split(",")]
+    if not all(layers):
+        raise ValueError(f"template '{spec}' has an empty layer")
+    return layers
+
+
+def absoluteSource(spec: str, cwd: str) -> str:
+    """!
+    make the relative local paths of a template entry of the config absolute,
+    e.g. for a process that does not share the working directory they are
+    relative to. URLs, `host:path` as git takes it and absolute paths are
+    left as they are, as is the `#<ref>:<subdir>` of every layer.
+
+    @param spec string template entry of the config, see splitLayers
+    @param cwd string absolute path of the directory spec is relative to
+    @returns string spec with its relative paths made absolute, spec as it
+             is if it is not a valid entry
+    """
+    try:
+        layers = splitLayers(spec)
+    except ValueError:
+        return spec  # left for generating from it to report
+    absolute = []
+    for layer in layers:
+        url, hash, fragment = layer.partition("#")
+        # git takes a colon before the first slash for `host:path`
+        if url and "://" not in url and ":" not in url.split("/")[0]:
+            url = os.path.join(cwd, url)
+        absolute.append(url + hash + fragment)
+    return ", ".join(absolute) if len(layers) > 1 else absolute[0]
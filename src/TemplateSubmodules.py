@@ -0,0 +1,248 @@
+import os
+import posixpath
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from Config import DataStruct
+from TemplateCache import TemplateCache
+from TemplateExport import exportTree, listTree, resolveCommit
+
+
+def resolveUrl(url: str, base: str) -> str:
+    """!
+    resolve the URL of a submodule as git does, URLs starting with `./` or
+    `../` being relative to the URL of the superproject.
+    @param url string URL of the submodule as given in `.gitmodules`
+    @param base string URL or path of the superproject
+    @returns string the URL or path of the submodule
+    """
+    if not url.startswith(("./", "../")):
+        return url
+    if "://" in base:
+        scheme, _, rest = base.partition("://")
+        host, _, path = rest.partition("/")
+        return f"{scheme}://{host}" + posixpath.normpath(
+            posixpath.join("/" + path, url))
+    if base.startswith("git@"):
+        host, _, path = base.partition(":")
+        return f"{host}:" + posixpath.normpath(posixpath.join(path, url))
+    return os.path.normpath(os.path.join(base, url))
+
+
+class TemplateSubmodules:
+    """!
+    Fills in the submodules of a template, which `git archive` and plain
+    clones leave behind as empty directories.
+
+    Submodules are found from the gitlinks in the template's tree, and their
+    URLs from its `.gitmodules`. Each is exported at the commit the template
+    pins, remote ones by way of the mirror cache, straight into the project as
+    plain files. Submodules of submodules follow a level at a time, every
+    level fetched concurrently on one pool of worker threads.
+    """
+
+    DEFAULT_JOBS = 4
+
+    ## what becomes of submodules: exported into the project, or recorded in
+    ## the project's repository for `git submodule update --init` to fetch
+    MODES = ("flatten", "register")
+
+    def __init__(self, meta: DataStruct = None, jobs: int = DEFAULT_JOBS,
+                 refresh: bool = False):
+        """!
+        @param meta DataStruct of the `[META]` config section (optional)
+        @param jobs the number of submodules fetched concurrently
+        @param refresh fetch cached mirrors even if they are not stale yet
+        """
+        self.meta = meta
+        self.jobs = max(1, jobs)
+        self.refresh = refresh
+
+    def find(self, repo: str, ref: str, url: str,
+             subdir: str = None) -> list[DataStruct]:
+        """!
+        @param repo string path of a local repository holding ref
+        @param ref string commit-ish of the superproject
+        @param url string URL or path of the superproject, which relative
+               submodule URLs are resolved against
+        @param subdir only list the submodules below this directory of the
+               tree, relative to it (optional)
+        @returns list of DataStructs with the `path`, `url` and pinned
+                 `commit` of every submodule
+        @exception RuntimeError if git can not list the tree, or a submodule
+                   has no URL in `.gitmodules`
+        """
+        # reading .gitmodules is cheap, listing a large tree is not
+        proc = subprocess.run(["git", "-C", str(repo), "config", "-z",
+                               "--blob", f"{ref}:.gitmodules", "--get-regexp",
+                               r"^submodule\..*\.(path|url)$"],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return []  # no .gitmodules, or no submodules in it
+        gitlinks = self.__gitlinks(repo, ref, subdir)
+        sections = {}
+        for record in proc.stdout.split("\0"):
+            key, _, value = record.partition("\n")
+            name, _, field = key.rpartition(".")
+            sections.setdefault(name, {})[field] = value
+        urls = {section["path"]: section.get("url")
+                for section in sections.values() if "path" in section}
+
+        prefix = f"{subdir}/" if subdir else ""
+        submodules = []
+        for path, commit in sorted(gitlinks.items()):
+            if not urls.get(prefix + path):
+                raise RuntimeError(f"submodule '{prefix + path}' has no url "
+                                   "in .gitmodules")
+            submodules.append(DataStruct(
+                path=path, url=resolveUrl(urls[prefix + path], url),
+                commit=commit))
+        return submodules
+
+    def fetch(self, repo: str, ref: str, url: str, path: str,
+              subdir: str = None, missing: bool = False) -> DataStruct:
+        """!
+        export every submodule of the template, and theirs, into path
+        @param repo string path of a local repository holding ref
+        @param ref string commit-ish of the template
+        @param url string URL or path of the template
+        @param path string directory the template was written to
+        @param subdir the directory of repo that is the template (optional)
+        @param missing only fetch the submodules whose directory is empty,
+               those checked out in a template's working tree having been
+               copied along with it
+        @returns DataStruct with the number of `submodules`, `files` and
+                 `bytes` fetched, the git `blobs` of the files keyed on their
+                 path in the project and the `paths` of every submodule in
+                 it, fetched or not
+        @exception RuntimeError if a submodule can not be fetched
+        """
+        paths = []
+
+        def export(source: str, sub: DataStruct, base: str) -> DataStruct:
+            paths.append(base)
+            stats = exportTree(source, sub.commit, os.path.join(path, base))
+            blobs = listTree(source, sub.commit)
+            if any(os.path.basename(name) == ".gitattributes"
+                   for name in blobs):
+                blobs = {}  # the files may not match their blobs
+            stats.blobs = {f"{base}/{name}": blob
+                           for name, blob in blobs.items()}
+            return stats
+
+        def populated(base: str) -> bool:
+            target = os.path.join(path, base)
+            if os.path.isdir(target) and os.listdir(target):
+                paths.append(base)
+                return True
+            return False
+
+        skip = populated if missing else None
+        total = DataStruct(submodules=0, files=0, bytes=0, blobs={})
+        for stats in self.__each(repo, ref, url, subdir, export, skip):
+            total.submodules += 1
+            total.files += stats.files
+            total.bytes += stats.bytes
+            total.blobs.update(stats.blobs)
+        total.paths = sorted(paths)
+        return total
+
+    def listTree(self, repo: str, ref: str, url: str,
+                 subdir: str = None) -> dict[str, str]:
+        """!
+        list the files fetch() would write, without writing any of them
+        @returns dict mapping the path of every file of every submodule, in
+                 the project, to its blob hash, see TemplateExport.listTree
+        """
+        files = {}
+        for blobs in self.__each(
+                repo, ref, url, subdir, lambda source, sub, base: {
+                    f"{base}/{name}": blob for name, blob in
+                    listTree(source, sub.commit).items()}):
+            files.update(blobs)
+        return files
+
+    @staticmethod
+    def gitmodules(submodules: list[DataStruct]) -> str:
+        """!
+        @param submodules list of DataStructs as returned by find()
+        @returns string the `.gitmodules` file registering submodules
+        """
+        return "".join(f'[submodule "{sub.path}"]\n\tpath = {sub.path}\n'
+                       f"\turl = {sub.url}\n" for sub in submodules)
+
+    def __each(self, repo: str, ref: str, url: str, subdir: str | None,
+               visit, skip=None) -> list:
+        """!
+        call visit on every submodule of the template, and on theirs, a level
+        at a time with each level spread over the pool
+        @param visit callable taking the path of a local repository holding
+               the submodule's commit, its DataStruct and its path in the
+               project
+        @param skip callable taking the path of a submodule in the project,
+               true for those visit is not called on. Their own submodules
+               are still visited (optional)
+        @returns list of what visit returned for each submodule
+        """
+        level = [("", sub) for sub in self.find(repo, ref, url, subdir)]
+        results = []
+
+        def visitOne(job: tuple) -> tuple:
+            parent, sub = job
+            base = posixpath.join(parent, sub.path)
+            skipped = skip is not None and skip(base)
+            return self.__using(sub, lambda source: (
+                skipped, None if skipped else visit(source, sub, base),
+                [(base, child) for child in self.find(source, sub.commit,
+                                                      sub.url)]))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while level:
+                done = list(pool.map(visitOne, level))
+                results.extend(result for skipped, result, _ in done
+                               if not skipped)
+                level = [job for _, _, children in done for job in children]
+        return results
+
+    def __using(self, sub: DataStruct, work):
+        """!
+        call work with the path of a local repository holding the commit of
+        sub. A cached mirror that does not hold it yet is fetched once more,
+        as it may simply predate the commit.
+        """
+        if not TemplateCache.isRemote(sub.url):
+            return work(sub.url.removeprefix("file://"))
+        cache = TemplateCache(self.meta)
+        for refresh in (self.refresh, True):
+            with cache.using(sub.url, refresh) as mirror:
+                try:
+                    resolveCommit(mirror, sub.commit)
+                except RuntimeError:
+                    if refresh:
+                        raise RuntimeError(f"submodule '{sub.path}' commit "
+                                           f"{sub.commit} is not in "
+                                           f"{sub.url}")
+                    continue
+                return work(str(mirror))
+
+    @staticmethod
+    def __gitlinks(repo: str, ref: str, subdir: str = None) -> dict[str, str]:
+        """!
+        @returns dict mapping the path of every gitlink in the tree of repo
+                 at ref to the commit it pins
+        """
+        treeish = f"{ref}:{subdir}" if subdir else ref
+        proc = subprocess.run(["git", "-C", str(repo), "ls-tree", "-r", "-z",
+                               "--full-tree", treeish], capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"git ls-tree {treeish} failed: "
+                               f"{proc.stderr.decode().strip()}")
+        gitlinks = {}
+        for line in proc.stdout.split(b"\0"):
+            if line:
+                info, name = line.split(b"\t", 1)
+                _, kind, commit = info.split()
+                if kind == b"commit":
+                    gitlinks[name.decode(errors="surrogateescape")] = \
+                        commit.decode()
+        return gitlinks
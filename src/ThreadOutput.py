@@ -0,0 +1,50 @@
+import io
+import sys
+import threading
+
+
+class ThreadOutput(io.TextIOBase):
+    """!
+    stands in for sys.stdout or sys.stderr, sending whatever a thread prints
+    to the buffer it has been given, and to the real stream when it has
+    none. The daemon gives each thread serving a request the buffer of that
+    request, see GeneratorDaemon.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+
+def carryOutput(work):
+    """!
+    wrap work that the calling thread hands to another thread, so that what
+    it prints goes where the calling thread's output goes. While the daemon
+    serves a request that is the request's buffer.
+    @param work the callable to wrap
+    @returns callable taking the same arguments as work
+    """
+    streams = [stream for stream in (sys.stdout, sys.stderr)
+               if isinstance(stream, ThreadOutput)]
+    buffers = [getattr(stream.local, "buffer", None) for stream in streams]
+
+    def carried(*args, **kwargs):
+        previous = [getattr(stream.local, "buffer", None)
+                    for stream in streams]
+        for stream, buffer in zip(streams, buffers):
+            stream.local.buffer = buffer
+        try:
+            return work(*args, **kwargs)
+        finally:
+            for stream, buffer in zip(streams, previous):
+                stream.local.buffer = buffer
+
+    return carried
@@ -0,0 +1,224 @@
+import os
+import sys
+import threading
+import time
+import weakref
+
+## the enabled tracers, which the one audit hook of this module counts
+## subprocesses for. Audit hooks can never be removed, so however many
+## tracers are made only that one is ever added.
+_TRACERS = weakref.WeakSet()
+_TRACERS_LOCK = threading.Lock()
+_hooked = False
+
+
+def _audit(event: str, args: tuple):
+    if event == "subprocess.Popen":
+        with _TRACERS_LOCK:
+            tracers = list(_TRACERS)
+        for tracer in tracers:
+            tracer.subprocessStarted()
+
+
+class Span:
+    """!
+    a single timed region of work, along with what it did: the bytes and
+    files it wrote or transferred and the subprocesses it started. Spans nest,
+    the counts of a span include those of the spans within it.
+    """
+
+    __slots__ = ("tracer", "name", "attrs", "start", "duration", "thread",
+                 "depth")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = dict(files=0, bytes=0, subprocesses=0, **attrs)
+        self.start = self.duration = 0
+        self.thread = threading.get_native_id()
+        self.depth = 0
+
+    def __enter__(self) -> "Span":
+        stack = self.tracer.stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.duration = time.perf_counter_ns() - self.start
+        self.tracer.stack().pop()
+        self.tracer.finish(self)
+        return False
+
+    def set(self, **attrs):
+        """!
+        record attributes of the span, e.g. `files` and `bytes`
+        """
+        self.attrs.update(attrs)
+
+    def __bool__(self) -> bool:
+        return True
+
+
+class NoSpan:
+    """!
+    stands in for a Span while tracing is disabled. It is falsy, so callers
+    can skip measuring anything that only a span would use.
+    """
+
+    def __enter__(self) -> "NoSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+
+class Tracer:
+    """!
+    Collects the spans of a run when enabled by `--timings` or `--trace`.
+
+    While disabled, span() hands out one shared NoSpan so instrumented code
+    pays a single function call per span. Once enabled, every subprocess
+    started is counted against the spans open in the thread starting it, by
+    way of the `subprocess.Popen` audit event.
+    """
+
+    NO_SPAN = NoSpan()
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.origin = time.perf_counter_ns()
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+
+    def enable(self):
+        global _hooked
+        self.enabled = True
+        with _TRACERS_LOCK:
+            _TRACERS.add(self)
+            if not _hooked:
+                sys.addaudithook(_audit)
+                _hooked = True
+
+    def disable(self):
+        self.enabled = False
+        with _TRACERS_LOCK:
+            _TRACERS.discard(self)
+
+    def reset(self):
+        with self.__lock:
+            self.spans = []
+        self.origin = time.perf_counter_ns()
+
+    def span(self, name: str, **attrs) -> Span | NoSpan:
+        """!
+        @param name the name of the span, spans of the same name are added up
+               in the summary
+        @param attrs initial attributes of the span
+        @returns a context manager timing the work done within it
+        """
+        if not self.enabled:
+            return self.NO_SPAN
+        return Span(self, name, attrs)
+
+    def stack(self) -> list[Span]:
+        try:
+            return self.__local.stack
+        except AttributeError:
+            self.__local.stack = []
+            return self.__local.stack
+
+    def finish(self, span: Span):
+        with self.__lock:
+            self.spans.append(span)
+
+    def subprocessStarted(self):
+        """!
+        count a subprocess against the spans open in the calling thread
+        """
+        for span in self.stack():
+            span.attrs["subprocesses"] += 1
+
+    def summary(self) -> str:
+        """!
+        @returns a table of every span name, in the order they first started,
+                 with their call count, total wall time and counters
+        """
+        totals = {}
+        for span in sorted(self.spans, key=lambda s: s.start):
+            total = totals.setdefault(span.name, [0, 0, 0, 0, 0])
+            total[0] += 1
+            total[1] += span.duration
+            total[2] += span.attrs["files"]
+            total[3] += span.attrs["bytes"]
+            total[4] += span.attrs["subprocesses"]
+        width = max([len(name) for name in totals] + [4])
+        lines = [f"{'span':<{width}}  {'calls':>5}  {'total ms':>10}  "
+                 f"{'files':>7}  {'bytes':>12}  {'procs':>5}"]
+        for name, (calls, ns, files, size, procs) in totals.items():
+            lines.append(f"{name:<{width}}  {calls:>5}  {ns / 1e6:>10.2f}  "
+                         f"{files:>7}  {size:>12}  {procs:>5}")
+        return "\n".join(lines)
+
+    def write(self, path: str):
+        """!
+        write every span to path, as NDJSON for `.ndjson` and `.jsonl` files
+        and otherwise in the Chrome trace event format, which can be opened
+        with chrome://tracing or https://ui.perfetto.dev
+        """
+        import json
+
+        spans = sorted(self.spans, key=lambda s: s.start)
+        with open(path, "w") as f:
+            if path.endswith((".ndjson", ".jsonl")):
+                for span in spans:
+                    f.write(json.dumps({
+                        "name": span.name, "thread": span.thread,
+                        "depth": span.depth,
+                        "start_ms": (span.start - self.origin) / 1e6,
+                        "duration_ms": span.duration / 1e6,
+                        **span.attrs}, default=str) + "\n")
+            else:
+                json.dump({"traceEvents": [{
+                    "name": span.name, "ph": "X", "pid": os.getpid(),
+                    "tid": span.thread,
+                    "ts": (span.start - self.origin) / 1e3,
+                    "dur": span.duration / 1e3, "args": span.attrs,
+                } for span in spans], "displayTimeUnit": "ms"}, f,
+                    default=str)
+
+
+def treeStats(path: str) -> dict:
+    """!
+    @param path string directory to measure
+    @returns dict with the number of `files` below path and their `bytes`,
+             meant to be recorded on a span only when tracing is enabled
+    """
+    files = size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, name)).st_size
+                files += 1
+            except OSError:
+                pass
+    return dict(files=files, bytes=size)
+
+
+## the tracer of this process
+TRACER = Tracer()
+
+
+def span(name: str, **attrs) -> Span | NoSpan:
+    """!
+    shorthand for TRACER.span(), see Tracer.span
+    """
+    return TRACER.span(name, **attrs)
@@ -0,0 +1,143 @@
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from Config import DataStruct
+from utils import cacheDir
+
+
+def formatBytes(size: float) -> str:
+    """!
+    @param size a number of bytes
+    @returns string size in the binary units git reports transfers in
+    """
+    for unit in ("bytes", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    return f"{int(size)} bytes" if unit == "bytes" else f"{size:.2f} {unit}"
+
+
+class TransferStats:
+    """!
+    Remembers what every clone and fetch of a template transferred, and how
+    fast, in `<cacheDir>/transfers.json`, so that bloated or slow templates
+    stand out and improvements can be tracked over time.
+
+    Transfers are keyed on the template URL, with any credentials in it
+    removed, and only the most recent HISTORY of each are kept. Concurrent
+    runs serialise their updates on a lock file next to the stats file.
+    """
+
+    HISTORY = 20
+
+    def __init__(self, meta: DataStruct = None):
+        """!
+        @param meta DataStruct of the `[META]` config section (optional)
+        """
+        self.path = cacheDir(meta) / "transfers.json"
+
+    def run(self, args: dict, config: "ConfigContext" = None):
+        """!
+        entry point to the `--transfers` command, listing every template
+        transferred so far, the largest first
+        @param args the dictionary of command line arguments provided at the
+               command line.
+        @param config ConfigContext whose `[META]` section locates the stats
+               file, that of ConfMgr if not given
+        """
+        from ConfigManager import ConfMgr as Conf
+
+        fmt = args.get("--format") or "text"
+        if fmt not in ("text", "ndjson"):
+            sys.exit(f"ERROR: unknown format '{fmt}'")
+        config = config if config is not None else Conf().context
+        summaries = TransferStats(config.meta).summary()
+        if fmt == "ndjson":
+            for summary in summaries:
+                print(json.dumps(vars(summary)))
+            return
+        if not summaries:
+            print("no transfers recorded yet")
+            return
+        width = max(len(s.url) for s in summaries)
+        print(f"{'template':<{width}}  {'count':>5}  {'objects':>8}  "
+              f"{'size':>12}  {'rate':>14}")
+        for s in summaries:
+            print(f"{s.url:<{width}}  {s.transfers:>5}  {s.objects:>8}  "
+                  f"{formatBytes(s.bytes):>12}  "
+                  f"{formatBytes(s.rate) + '/s':>14}")
+
+    def record(self, url: str, kind: str, objects: int, size: int,
+               seconds: float):
+        """!
+        add a finished transfer to the stats file. Failing to write it never
+        fails the transfer itself.
+        @param url string URL the template was transferred from
+        @param kind string `clone` or `fetch`
+        @param objects the number of objects received
+        @param size the number of bytes received
+        @param seconds how long the transfer took
+        """
+        entry = {"time": int(time.time()), "kind": kind, "objects": objects,
+                 "bytes": size, "seconds": round(seconds, 3)}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_suffix(".lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                stats = self.read()
+                history = stats.setdefault(self.key(url), [])
+                history.append(entry)
+                del history[:-self.HISTORY]
+                fd, tmp = tempfile.mkstemp(dir=self.path.parent,
+                                           suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(stats, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def read(self) -> dict[str, list[dict]]:
+        """!
+        @returns dict mapping every template URL to its recorded transfers,
+                 oldest first
+        """
+        try:
+            with open(self.path) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return stats if isinstance(stats, dict) else {}
+
+    def summary(self) -> list[DataStruct]:
+        """!
+        @returns list of DataStructs, one per template URL and largest first,
+                 with its number of `transfers`, the `objects` and `bytes` of
+                 its last clone (or of its last fetch, if never cloned) and
+                 its average `rate` in bytes per second over all transfers
+        """
+        summaries = []
+        for url, history in self.read().items():
+            clones = [t for t in history if t["kind"] == "clone"] or history
+            seconds = sum(t["seconds"] for t in history)
+            summaries.append(DataStruct(
+                url=url, transfers=len(history),
+                objects=clones[-1]["objects"], bytes=clones[-1]["bytes"],
+                rate=sum(t["bytes"] for t in history) / seconds
+                if seconds else 0))
+        return sorted(summaries, key=lambda s: (-s.bytes, s.url))
+
+    @staticmethod
+    def key(url: str) -> str:
+        """!
+        @returns string url without any user name or password in it
+        """
+        if "://" not in url:
+            return url
+        parts = urlsplit(url)
+        return urlunsplit(parts._replace(
+            netloc=parts.netloc.rpartition("@")[2]))
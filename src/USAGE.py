@@ -1,19 +1,38 @@
-import tomllib
-
-with open("pyproject.toml", "rb") as project:
-    data = tomllib.load(project)
-
-NAME = data["project"]["name"]
-VERSION = data["project"]["version"]
-DESCRIPTION = data["project"]["description"]
+## project metadata, kept in step with pyproject.toml by test/Startup_test.py
+## rather than read from it so that startup does no file I/O
+NAME = "ProGenrtr"
+VERSION = "0.3.0"
+DESCRIPTION = "A Project Generator based on template projects"
 
 USAGE = f"""
 {NAME} ({VERSION})
 {DESCRIPTION}
 
 Usage:
-  {NAME} [--config CONFIG_FILE] <LANGUAGE> <PROJECT_TYPE> <PROJECT_PATH>
-  {NAME} [--config CONFIG_FILE] (-l | --list) [--lang LANGUAGE]
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] [--refresh] [--ref REF]
+            [--full-clone] [--commit-template] [--var KEY=VALUE]...
+            [--no-render] [--submodules MODE] [--bundle FILE] [--no-hooks]
+            [--jobs N] [--timings] [--trace FILE]
+            <LANGUAGE> <PROJECT_TYPE> <PROJECT_PATH>
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] [--refresh] [--ref REF]
+            [--full-clone] [--commit-template] [--var KEY=VALUE]...
+            [--no-render] [--submodules MODE] [--bundle FILE] [--no-hooks]
+            [--jobs N] [--timings] [--trace FILE] (--batch MANIFEST)
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] [--refresh] [--jobs N]
+            [--timings] [--trace FILE] (--export-bundle FILE)
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] (-l | --list)
+            [--lang LANGUAGE] [--search TERM] [--tag TAG]... [--page N]
+            [--page-size N] [--format FORMAT] [--timings] [--trace FILE]
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] (-l | --list) --check
+            [--lang LANGUAGE] [--refresh] [--jobs N] [--timeout SECONDS]
+            [--format FORMAT] [--timings] [--trace FILE]
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] --drift [--refresh]
+            [--jobs N] [--format FORMAT] [--timings] [--trace FILE]
+            <PROJECT_DIR>...
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] --daemon [--socket PATH]
+            [--jobs N]
+  {NAME} [--config CONFIG_FILE] [--no-config-cache] --transfers
+            [--format FORMAT]
   {NAME} --todo
   {NAME} (-h | --help | --version)
 
@@ -22,12 +41,91 @@ Arguments:
     <PROJECT_TYPE>  The type of project to create, these are defined in the
                     config
     <PROJECT_PATH>  The path at which to create the new project.
+    <PROJECT_DIR>   A previously generated project to check for drift.
+    MANIFEST        A .toml, .ini or .ndjson file listing the projects to
+                    create, each entry giving a language, type and path.
 
 Options:
     -l --list               list the available project types.
     --lang LANGUAGE         used in conjuntion with --list to limit the list to
                             a specific language.
+    --search TERM           used with --list to show only projects whose name,
+                            language or source matches TERM by prefix,
+                            substring or fuzzy match, best matches first.
+    --tag TAG               used with --list to show only projects carrying
+                            TAG, e.g. a language, `local`, `remote` or a host
+                            such as `github.com`. May be repeated.
+    --page N                used with --list to show the Nth page of results.
+    --page-size N           the number of results per page.
+    --format FORMAT         output format of --list; text, json or ndjson,
+                            or of --drift and --transfers; text or ndjson
+                            [default: text].
+    --check                 used with --list to verify that every template
+                            can be reached and show the commit it points at.
+    --timeout SECONDS       give up on reaching a template after SECONDS
+                            [default: 10].
     -c FILE --config=FILE   Specify the config file to use.
+    --no-config-cache       parse the config files even if a cached copy of
+                            them is still valid.
+    --refresh               fetch the cached template mirror even if it is
+                            not stale yet. With --check, ignore cached
+                            results.
+    --ref REF               the branch, tag or commit of the template to
+                            generate from, by default the one the config
+                            gives the template or else HEAD.
+    --full-clone            clone the template's full history rather than
+                            exporting just the tree at REF.
+    --commit-template       make the template's files, and the project's
+                            manifest, the project's first commit instead of
+                            an empty commit.
+    --var KEY=VALUE         set the template variable KEY, replacing every
+                            {{{{KEY}}}} in the project's files and paths. Adds
+                            to, or overrides, the [vars] and [vars.LANGUAGE]
+                            config sections and the built in project_name,
+                            language and project_type. May be repeated.
+    --no-render             leave every {{{{KEY}}}} in the project as the
+                            template has it.
+    --submodules MODE       what to do with the template's submodules;
+                            flatten fetches them into the project as plain
+                            files, register records them in the project's
+                            first commit, along with .gitmodules, for
+                            `git submodule update --init` to fetch
+                            [default: flatten].
+    --no-hooks              do not run the post-generation hooks of the
+                            config, e.g. creating a virtualenv, once the
+                            project is created.
+    --batch MANIFEST        create every project listed in MANIFEST.
+    --export-bundle FILE    write every template in the config, at the ref
+                            it is configured with, into the single file FILE
+                            for --bundle to generate from. Submodules are
+                            always flattened into it.
+    --bundle FILE           generate from the templates in FILE, as written
+                            by --export-bundle, rather than fetching them.
+                            The options to fetch a template have no effect
+                            then.
+    --drift                 report the files of each <PROJECT_DIR> that
+                            differ from the current state of its template.
+    -j N --jobs=N           the number of projects to create, submodules to
+                            fetch, hooks to run, templates to check or
+                            bundle, projects to scan or daemon requests to
+                            serve concurrently
+                            [default: 4].
+    --timings               print how long each phase took, and what it did,
+                            once the command finishes.
+    --trace FILE            write every timed phase to FILE, as NDJSON if
+                            FILE ends in .ndjson or .jsonl and otherwise as
+                            a Chrome trace (chrome://tracing, Perfetto).
+    --daemon                serve --list and generation requests over a Unix
+                            socket, keeping the config and templates warm
+                            between requests. ProGenrtrClient takes the same
+                            arguments as {NAME} and runs whatever the daemon
+                            does not serve itself.
+    --socket PATH           the socket the daemon listens on, by default
+                            $PROGENRTR_SOCKET or daemon.sock in the cache
+                            directory.
+    --transfers             list every remote template cloned or fetched so
+                            far, largest first, with its size and average
+                            transfer rate.
     --todo                  Show stuff left to implement.
     -h --help               Show this screen.
     --version               Show version.
@@ -1,8 +1,52 @@
 from pathlib import Path
+from os.path import expanduser
+import os
+import sys
 
 PROJECT_ROOT = Path(__file__).parent.parent
 
 def verbose(args: dict, msg: str):
     if args["verbose"]:
         print(msg)
-    
+
+
+def checkJobs(args: dict):
+    """!
+    make sure `--jobs`, if given, is a positive number before any command
+    gets to use it
+    @param args dict of the command line arguments
+    @exception SystemExit with an error message if it is not
+    """
+    jobs = args.get("--jobs")
+    try:
+        valid = jobs is None or int(jobs) > 0
+    except ValueError:
+        valid = False
+    if not valid:
+        sys.exit(f"ERROR: --jobs must be a positive number, not '{jobs}'")
+
+
+def cacheDir(meta=None) -> Path:
+    """!
+    resolve the directory ProGenrtr keeps its caches in. The `cacheDir` key of
+    the `[META]` section wins, otherwise `$XDG_CACHE_HOME/progenrtr` is used.
+    @param meta DataStruct of the `[META]` config section (optional)
+    @returns Path to the (possibly not yet existing) cache directory
+    """
+    if meta is not None and meta.get("cachedir"):
+        return Path(expanduser(meta.get("cachedir")))
+    base = os.environ.get("XDG_CACHE_HOME", "~/.cache")
+    return Path(expanduser(base)) / "progenrtr"
+
+
+def daemonSocket() -> Path:
+    """!
+    resolve the Unix socket the daemon listens on and the client connects
+    to. `$PROGENRTR_SOCKET` wins, otherwise it is `daemon.sock` in the cache
+    directory. Neither side parses the config to find it, so the `[META]`
+    cacheDir is not consulted.
+    @returns Path to the socket
+    """
+    if os.environ.get("PROGENRTR_SOCKET"):
+        return Path(expanduser(os.environ["PROGENRTR_SOCKET"]))
+    return cacheDir() / "daemon.sock"
@@ -0,0 +1,92 @@
+import subprocess
+import pytest
+from docopt import docopt
+from pathlib import Path
+from typing import Iterator
+
+from BatchGenerator import BatchGenerator
+from Config import DataStruct
+from ConfigManager import ConfMgr
+from USAGE import USAGE
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def templateConfig(tmp_path: Path,
+                   monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    template = tmp_path / "template"
+    make_template_repo(template, {"README.md": "hello"}, commits=2)
+    ConfMgr().projects = DataStruct(
+        python=DataStruct(standard=str(template)))
+    yield tmp_path
+    ConfMgr.reset()
+
+
+@pytest.mark.parametrize("name, contents", [
+    ("batch.toml", '[[project]]\nlanguage = "python"\ntype = "standard"\n'
+                   'path = "a"\nref = "v1"\n'),
+    ("batch.ini", "[a]\nlanguage = python\ntype = standard\npath = a\n"
+                  "ref = v1\n"),
+    ("batch.ndjson", '{"language": "python", "type": "standard", '
+                     '"path": "a", "ref": "v1"}\n\n'),
+])
+def test_manifest_formats_are_read(tmp_path: Path, name: str,
+                                   contents: str) -> None:
+    (tmp_path / name).write_text(contents)
+    entries = BatchGenerator().readManifest(str(tmp_path / name))
+    assert len(entries) == 1
+    assert (entries[0].language, entries[0].type, entries[0].path,
+            entries[0].ref) == ("python", "standard", "a", "v1")
+
+
+def test_unknown_manifest_format_is_rejected(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        BatchGenerator().readManifest(str(tmp_path / "batch.yaml"))
+
+
+def test_failures_do_not_abort_the_batch(templateConfig: Path) -> None:
+    entries = [
+        DataStruct(language="python", type="standard",
+                   path=str(templateConfig / "one"), ref=None),
+        DataStruct(language="python", type="missing",
+                   path=str(templateConfig / "two"), ref=None),
+        DataStruct(language="python", type="standard",
+                   path=str(templateConfig / "one"), ref=None),
+        DataStruct(language="python", type="standard",
+                   path=str(templateConfig / "three"), ref="HEAD~1"),
+    ]
+    results = BatchGenerator().generate(entries, {"--ref": "HEAD"}, jobs=2)
+
+    assert [r.error is None for r in results] == [True, False, False, True]
+    assert (templateConfig / "one" / ".git").is_dir()
+    assert (templateConfig / "three" / "README.md").read_text() == "hello"
+    assert not (templateConfig / "two").exists()
+
+
+@pytest.mark.parametrize("argv, expected", [
+    ([], ["hello", "hello\n1", "hello\n1"]),
+    (["--ref", "master"], ["hello\n1", "hello\n1", "hello\n1"]),
+])
+def test_refs_are_taken_from_entry_then_command_line_then_config(
+        templateConfig: Path, monkeypatch: pytest.MonkeyPatch,
+        argv: list[str], expected: list[str]) -> None:
+    template = templateConfig / "template"
+    subprocess.run(["git", "-C", str(template), "tag", "v1", "HEAD~1"],
+                   check=True)
+    ConfMgr().projects = DataStruct(python=DataStruct(
+        standard=str(template), pinned=f"{template}#v1"))
+    manifest = templateConfig / "batch.ndjson"
+    manifest.write_text(
+        '{"language": "python", "type": "pinned", "path": "a"}\n'
+        '{"language": "python", "type": "pinned", "path": "b", '
+        '"ref": "master"}\n'
+        '{"language": "python", "type": "standard", "path": "c"}\n')
+
+    monkeypatch.chdir(templateConfig)
+    BatchGenerator().run(docopt(USAGE, argv=argv + ["--batch",
+                                                    str(manifest)]))
+    assert [(templateConfig / path / "README.md").read_text()
+            for path in "abc"] == expected
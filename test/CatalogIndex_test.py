@@ -0,0 +1,99 @@
+import json
+import pytest
+from typing import Iterator
+
+from CatalogIndex import CatalogIndex
+from Config import DataStruct
+from ConfigManager import ConfMgr
+from ProjectTypesList import ProjectTypesList
+
+PROJECTS: DataStruct = DataStruct(
+    cpp=DataStruct(normal="../../cpp/ProGenrtr-cpp/",
+                   test="https://github.com/jpchanson/test.git",
+                   cmake_test="git@gitlab.com:team/cmake.git"),
+    python=DataStruct(standard="../Progenrtr-python/",
+                      testing="file:///srv/templates/testing"),
+)
+
+
+@pytest.fixture
+def index() -> CatalogIndex:
+    return CatalogIndex(PROJECTS)
+
+
+@pytest.fixture
+def configured() -> Iterator[None]:
+    ConfMgr().projects = PROJECTS
+    yield
+    ConfMgr.reset()
+
+
+def names(index: CatalogIndex, results: list[int]) -> list[str]:
+    return [f"{index.languages[i]}/{index.names[i]}" for i in results]
+
+
+def test_no_term_lists_everything_in_config_order(index: CatalogIndex) -> None:
+    assert names(index, index.search()) == [
+        "cpp/normal", "cpp/test", "cpp/cmake_test",
+        "python/standard", "python/testing"]
+
+
+def test_matches_are_ranked_exact_prefix_then_substring(
+        index: CatalogIndex) -> None:
+    assert names(index, index.search("test")) == [
+        "cpp/test", "python/testing", "cpp/cmake_test"]
+
+
+def test_substring_matches_sources(index: CatalogIndex) -> None:
+    assert names(index, index.search("JPCHANSON")) == ["cpp/test"]
+
+
+def test_fuzzy_match_is_only_a_fallback(index: CatalogIndex) -> None:
+    assert names(index, index.search("pystd")) == ["python/standard"]
+    assert index.search("qqq") == []
+
+
+@pytest.mark.parametrize("tags, expected", [
+    (["python"], ["python/standard", "python/testing"]),
+    (["local"], ["cpp/normal", "python/standard", "python/testing"]),
+    (["remote"], ["cpp/test", "cpp/cmake_test"]),
+    (["gitlab.com"], ["cpp/cmake_test"]),
+    (["cpp", "local"], ["cpp/normal"]),
+])
+def test_tags_filter_results(index: CatalogIndex, tags: list[str],
+                             expected: list[str]) -> None:
+    assert names(index, index.search(tags=tags)) == expected
+
+
+def test_entry_describes_tags(index: CatalogIndex) -> None:
+    assert index.entry(1)["tags"] == ["cpp", "remote", "github.com"]
+    assert index.entry(4)["tags"] == ["python", "local"]
+
+
+def test_list_streams_paged_ndjson(configured: None, capsys) -> None:
+    ProjectTypesList().run({"--lang": None, "--search": "test", "--tag": [],
+                            "--page": "2", "--page-size": "2",
+                            "--format": "ndjson"})
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["cmake_test"]
+
+
+def test_list_json_is_restricted_by_lang(configured: None, capsys) -> None:
+    ProjectTypesList().run({"--lang": "python", "--search": None, "--tag": [],
+                            "--page": None, "--page-size": None,
+                            "--format": "json"})
+    entries = json.loads(capsys.readouterr().out)
+    assert [entry["name"] for entry in entries] == ["standard", "testing"]
+
+
+@pytest.mark.parametrize("tags, expected", [
+    (["remote"], ["cpp/app", "cpp/tool"]),
+    (["local"], ["cpp/lib"]),
+    (["gitlab.com"], ["cpp/tool"]),
+])
+def test_multi_line_sources_keep_tags_aligned(tags: list[str],
+                                              expected: list[str]) -> None:
+    index = CatalogIndex(DataStruct(cpp=DataStruct(
+        app="https://a.com/base.git,\nhttps://b.com/ci.git",
+        lib="../local/", tool="git@gitlab.com:x/y.git")))
+    assert names(index, index.search(tags=tags)) == expected
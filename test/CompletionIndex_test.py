@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from typing import Iterator
+
+from CompletionIndex import CompletionIndex
+from ConfigManager import ConfMgr
+from test.testUtils import PROJECT_ROOT
+
+COMPLETER = str(PROJECT_ROOT / "src" / "ProGenrtrComplete")
+
+
+@pytest.fixture
+def config(tmp_path: Path,
+           monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "config.conf"
+    path.write_text("[ProGenrtr]\nlanguages = cpp, python\n"
+                    "[project.cpp]\napp: a\nlib: b\n"
+                    "[project.python]\napp: c\n")
+    (tmp_path / "config.conf.d").mkdir()
+    (tmp_path / "config.conf.d" / "python.conf").write_text(
+        "[project.python]\nlambda: d\n")
+    yield path
+    ConfMgr.reset()
+
+
+def complete(config: Path, current: str, *words: str) -> list[str]:
+    index = CompletionIndex(str(config))
+    if not index.read():
+        index.rebuild()
+    return index.complete(current, ["--config", str(config), *words])
+
+
+def test_languages_types_and_options_are_completed(config: Path) -> None:
+    assert complete(config, "") == ["cpp", "python"]
+    assert complete(config, "", "python") == ["app", "lambda"]
+    assert complete(config, "l", "cpp") == ["lib"]
+    assert complete(config, "", "cpp", "app") == []
+    assert complete(config, "--sub") == ["--submodules"]
+    assert complete(config, "", "--submodules") == ["flatten", "register"]
+    assert complete(config, "p", "--list", "--lang") == ["python"]
+    assert complete(config, "", "--ref", "v1", "cpp") == ["app", "lib"]
+    assert complete(config, "", "--drift") == []
+
+
+def test_the_index_is_rebuilt_once_the_config_changes(config: Path) -> None:
+    assert complete(config, "", "cpp") == ["app", "lib"]
+    assert CompletionIndex(str(config)).read()
+
+    fragment = config.parent / "config.conf.d" / "python.conf"
+    fragment.write_text("[project.python]\nlambda: d\nweb: e\n")
+    assert not CompletionIndex(str(config)).read()
+    assert complete(config, "", "python") == ["app", "lambda", "web"]
+
+
+def test_completion_imports_nothing_else(config: Path) -> None:
+    run = [sys.executable, "-X", "importtime", COMPLETER, "complete", "",
+           "--config", str(config), "cpp"]
+    subprocess.run(run, check=True, capture_output=True)  # builds the index
+    proc = subprocess.run(run, capture_output=True, text=True,
+                          env=dict(os.environ))
+    assert proc.stdout.split() == ["app", "lib"]
+    imported = {line.split("|")[2].strip() for line in
+                proc.stderr.splitlines() if line.startswith("import time:")}
+    assert "CompletionIndex" in imported
+    for module in ("ConfigManager", "USAGE", "docopt", "git", "pathlib"):
+        assert module not in imported
+
+
+@pytest.mark.parametrize("shell", ["bash", "zsh", "fish"])
+def test_shell_scripts_call_the_completer(shell: str) -> None:
+    proc = subprocess.run([sys.executable, COMPLETER, "script", shell],
+                          capture_output=True, text=True, check=True)
+    assert f'"{COMPLETER}" complete' in proc.stdout
+    assert "ProGenrtrClient" in proc.stdout
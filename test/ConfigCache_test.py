@@ -0,0 +1,145 @@
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from os.path import expanduser
+from typing import Iterator
+
+import Config
+from ConfigCache import ConfigCache
+from ConfigManager import ConfMgr
+from test.testUtils import FALLBACK_PATH, MINIMAL_FALLBACK_INI
+
+USER_CONFIG: str = expanduser("~/.progenrtr.conf")
+
+CONFIG: str = """
+    [ProGenrtr]
+    languages = test_language
+
+    [project.test_language]
+    test_project: {}
+"""
+
+
+@pytest.fixture
+def testSetup(fs: FakeFilesystem) -> Iterator[FakeFilesystem]:
+    fs.create_file(FALLBACK_PATH, contents=MINIMAL_FALLBACK_INI)
+    fs.create_file(USER_CONFIG, contents=CONFIG.format("first"))
+    yield fs
+    ConfMgr.reset()
+
+
+def parseCounting(monkeypatch: pytest.MonkeyPatch, args: dict) -> int:
+    """!
+    parse with a fresh ConfMgr and return the number of files configparser
+    was asked to read.
+    """
+    calls = []
+    getConfig = Config.getConfig
+
+    def counting(path: str):
+        calls.append(path)
+        return getConfig(path)
+
+    monkeypatch.setattr("ConfigManager.getConfig", counting)
+    ConfMgr.reset()
+    ConfMgr().parse(args)
+    return len(calls)
+
+
+def test_valid_snapshot_skips_parsing(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert parseCounting(monkeypatch, {"--config": None}) == 2
+    assert parseCounting(monkeypatch, {"--config": None}) == 0
+    assert ConfMgr().projects.test_language.test_project == "first"
+    assert ConfMgr().meta.cfgpaths.startswith("~/.progenrtr.conf")
+
+
+def test_changed_config_invalidates_snapshot(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    parseCounting(monkeypatch, {"--config": None})
+    with open(USER_CONFIG, "w") as f:
+        f.write(CONFIG.format("changed"))
+
+    assert parseCounting(monkeypatch, {"--config": None}) == 2
+    assert ConfMgr().projects.test_language.test_project == "changed"
+
+
+def test_new_higher_priority_config_invalidates_snapshot(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    testSetup.remove(USER_CONFIG)
+    parseCounting(monkeypatch, {"--config": None})
+    assert ConfMgr().projects.test_lang.test_proj == "test"
+
+    testSetup.create_file(USER_CONFIG, contents=CONFIG.format("new"))
+    parseCounting(monkeypatch, {"--config": None})
+    assert ConfMgr().projects.test_language.test_project == "new"
+
+
+def test_no_config_cache_always_parses(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    args = {"--config": None, "--no-config-cache": True}
+    parseCounting(monkeypatch, {"--config": None})
+    assert parseCounting(monkeypatch, args) == 2
+
+
+def test_explicit_config_is_cached_separately(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    testSetup.create_file("/explicit.conf", contents=CONFIG.format("explicit"))
+    parseCounting(monkeypatch, {"--config": None})
+
+    assert parseCounting(monkeypatch, {"--config": "/explicit.conf"}) == 2
+    assert ConfMgr().projects.test_language.test_project == "explicit"
+    assert parseCounting(monkeypatch, {"--config": "/explicit.conf"}) == 0
+
+
+def test_corrupt_cache_is_ignored(testSetup: FakeFilesystem) -> None:
+    cache = ConfigCache()
+    testSetup.create_file(cache.file(""), contents="{not json")
+    assert cache.load("") is None
+
+
+def test_snapshots_are_kept_apart(testSetup: FakeFilesystem) -> None:
+    cache = ConfigCache()
+    cache.store("", [USER_CONFIG], meta={"size": "small"})
+    cache.store("/explicit.conf", [USER_CONFIG], meta={"size": "x" * 1000})
+    assert cache.file("") != cache.file("/explicit.conf")
+    assert "x" * 1000 not in open(cache.file("")).read()
+    assert cache.load("")["meta"] == {"size": "small"}
+
+
+def test_fragments_are_read_on_first_access_only(
+        testSetup: FakeFilesystem, monkeypatch: pytest.MonkeyPatch) -> None:
+    with open(USER_CONFIG, "w") as f:
+        f.write("[ProGenrtr]\nlanguages = cpp, python\n")
+    for lang in ("cpp", "python"):
+        testSetup.create_file(f"{USER_CONFIG}.d/{lang}.conf",
+                              contents=f"[project.{lang}]\nlib: {lang}\n")
+    reads = []
+    getConfig = Config.getConfig
+    monkeypatch.setattr("ConfigManager.getConfig",
+                        lambda path: reads.append(path) or getConfig(path))
+
+    for restored in (False, True):
+        reads.clear()
+        ConfMgr.reset()
+        ConfMgr().parse({"--config": None})
+        assert len(reads) == (0 if restored else 2)
+        assert ConfMgr().projects.cpp.lib == "cpp"
+        assert ConfMgr().vars.cpp is not None
+        assert reads[-1] == f"{USER_CONFIG}.d/cpp.conf"
+        assert ConfMgr().projects.names() == ["cpp", "python"]
+        assert not any(path.endswith("python.conf") for path in reads)
+
+    # fragments are never part of the snapshot, edits show up straight away
+    with open(f"{USER_CONFIG}.d/cpp.conf", "w") as f:
+        f.write("[project.cpp]\nlib: edited\n")
+    ConfMgr.reset()
+    ConfMgr().parse({"--config": None})
+    assert ConfMgr().projects.cpp.lib == "edited"
+
+    testSetup.create_file(f"{USER_CONFIG}.d/go.conf",
+                          contents="[project.go]\nmod: go\n")
+    with open(USER_CONFIG, "a") as f:
+        f.write("    , go\n")
+    ConfMgr.reset()
+    ConfMgr().parse({"--config": None})
+    assert list(vars(ConfMgr().projects.resolve())) == ["cpp", "python", "go"]
@@ -0,0 +1,176 @@
+import sys
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+from Config import DataStruct, LazyDataStruct
+from ConfigContext import ConfigContext
+from ConfigManager import ConfMgr
+from ProjectGenerator import ProjectGenerator
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def configs(tmp_path: Path,
+            monkeypatch: pytest.MonkeyPatch) -> Iterator[dict[str, str]]:
+    """!
+    two configs whose `c/app` templates differ, as does their `owner`
+    """
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    paths = {}
+    for name in ("first", "second"):
+        make_template_repo(tmp_path / name, {f"{name}.txt": "{{owner}}"})
+        paths[name] = tmp_path / f"{name}.conf"
+        paths[name].write_text(
+            f"[ProGenrtr]\nlanguages = c\n[project.c]\n"
+            f"app: {tmp_path / name}\n[vars]\nowner = {name}\n")
+    yield {name: str(path) for name, path in paths.items()}
+    ConfMgr.reset()
+
+
+def load(config: str) -> ConfigContext:
+    return ConfMgr.load({"--config": config, "--no-config-cache": True})
+
+
+def test_contexts_are_immutable() -> None:
+    context = ConfigContext(meta=DataStruct(cachedir="/a"))
+    with pytest.raises(AttributeError):
+        context.meta = DataStruct()
+    changed = context.replace(projects=DataStruct(c=DataStruct()))
+    assert changed.meta is context.meta
+    assert context.projects.names() == []
+    assert changed.projects.names() == ["c"]
+
+
+def test_the_singleton_is_created_once() -> None:
+    ConfMgr.reset()
+    barrier = threading.Barrier(16)
+
+    def create(_) -> int:
+        barrier.wait()
+        return id(ConfMgr())
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert len(set(pool.map(create, range(16)))) == 1
+
+
+def test_lazy_members_stay_readable_while_resolved() -> None:
+    # switch threads as often as possible, to hit resolve() part way through
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    stop = threading.Event()
+    structs, failures = [], []
+
+    def read():
+        while not stop.is_set():
+            try:
+                for lazy in structs[-2:]:
+                    assert (lazy.a, lazy.b) == (1, 2)
+            except AttributeError as e:
+                failures.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    try:
+        for _ in range(20000):
+            structs.append(LazyDataStruct({"b": lambda: 2}, a=1))
+            assert list(vars(structs[-1].resolve())) == ["a", "b"]
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+        sys.setswitchinterval(interval)
+    assert failures == []
+
+
+def test_parsing_never_mixes_configs(configs: dict[str, str]) -> None:
+    stop = threading.Event()
+    seen = []
+
+    def parse(name: str):
+        while not stop.is_set():
+            ConfMgr().parse({"--config": configs[name],
+                             "--no-config-cache": True})
+
+    def read():
+        while not stop.is_set():
+            context = ConfMgr().context
+            if context.projects.names():
+                seen.append((context.args["--config"],
+                             context.vars.c.owner))
+
+    threads = [threading.Thread(target=parse, args=(name,))
+               for name in configs for _ in range(2)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    stop.wait(1)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert {owner for _, owner in seen} == {"first", "second"}
+    assert all(config == configs[owner] for config, owner in seen)
+
+
+def test_shared_contexts_resolve_while_read(tmp_path: Path) -> None:
+    config = tmp_path / "shared.conf"
+    config.write_text("[ProGenrtr]\nlanguages = c, go\n[project.c]\n"
+                      "app: a\n[project.go]\ncli: b\n")
+    (tmp_path / "shared.conf.d").mkdir()
+    for lang in ("c", "go"):
+        (tmp_path / "shared.conf.d" / f"{lang}.conf").write_text(
+            f"[project.{lang}]\nlib: l\n[vars.{lang}]\nowner = {lang}\n"
+            f"[hooks.{lang}]\nfmt = true\n")
+    failures = []
+
+    for _ in range(50):
+        context = load(str(config))
+        barrier = threading.Barrier(4)
+
+        def resolve():
+            barrier.wait()
+            for _ in range(20):
+                assert list(vars(context.projects.resolve())) == ["c", "go"]
+                context.hooks.resolve()
+
+        def read():
+            barrier.wait()
+            try:
+                for _ in range(20):
+                    assert (context.projects.c.lib, context.vars.go.owner,
+                            context.hooks.c.fmt) == ("l", "go", "true")
+            except AttributeError as e:
+                failures.append(e)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for future in [pool.submit(resolve)] + \
+                    [pool.submit(read) for _ in range(3)]:
+                future.result()
+        watched = context.watched()
+        assert len(watched) == len(set(watched))
+    assert failures == []
+
+
+def test_configs_generate_side_by_side(configs: dict[str, str],
+                                       tmp_path: Path) -> None:
+    contexts = {name: load(path) for name, path in configs.items()}
+    jobs = [(name, tmp_path / "projects" / f"{name}-{index}")
+            for index in range(8) for name in contexts]
+
+    def generate(job: tuple[str, Path]):
+        name, path = job
+        ProjectGenerator(contexts[name]).run({
+            "<LANGUAGE>": "c", "<PROJECT_TYPE>": "app",
+            "<PROJECT_PATH>": str(path), "--no-hooks": True})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(generate, jobs))
+
+    for name, path in jobs:
+        assert (path / f"{name}.txt").read_text() == name
@@ -62,3 +62,55 @@ def test_minimal_config_is_parsed_from_default_locations(
 
     expectedProjectName = "testProject"
     assert ConfMgr().projects.test_language.test_project == expectedProjectName
+
+
+def test_template_variables_are_parsed_per_language(
+        testSetup: Iterator[FakeFilesystem]) -> None:
+    testSetup.create_file(FALLBACK_PATH, contents=MINIMAL_FALLBACK_INI)
+    testSetup.create_file(DEFAULT_CONFIG_PATHS[0], contents="""
+        [ProGenrtr]
+        languages = cpp, python
+
+        [vars]
+        Author = someone
+        licence = MIT
+
+        [vars.cpp]
+        licence = BSD
+    """)
+    ConfMgr().parse({"--config": None, "--no-config-cache": True})
+
+    assert vars(ConfMgr().vars.cpp) == {"author": "someone", "licence": "BSD"}
+    assert vars(ConfMgr().vars.python) == {"author": "someone",
+                                           "licence": "MIT"}
+
+
+def test_fragments_extend_the_config(
+        testSetup: Iterator[FakeFilesystem]) -> None:
+    testSetup.create_file(FALLBACK_PATH, contents=MINIMAL_FALLBACK_INI)
+    testSetup.create_file("/cfg.conf", contents="""
+        [ProGenrtr]
+        languages = cpp, python
+
+        [project.cpp]
+        lib: main-lib
+        app: main-app
+
+        [vars]
+        licence = MIT
+    """)
+    testSetup.create_file("/cfg.conf.d/cpp.conf", contents="""
+        [project.cpp]
+        app: fragment-app
+
+        [vars.cpp]
+        licence = BSD
+    """)
+    testSetup.create_file("/cfg.conf.d/unlisted.conf", contents="")
+    ConfMgr().parse({"--config": "/cfg.conf", "--no-config-cache": True})
+
+    assert vars(ConfMgr().projects.cpp) == {"lib": "main-lib",
+                                            "app": "fragment-app"}
+    assert ConfMgr().vars.cpp.licence == "BSD"
+    assert ConfMgr().vars.python.licence == "MIT"
+    assert ConfMgr().projects.names() == ["cpp"]
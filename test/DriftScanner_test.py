@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from DriftScanner import DriftScanner
+from ProjectGenerator import ProjectGenerator
+from ProjectManifest import ProjectManifest, blobHash
+from TemplateCache import TemplateCache
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> str:
+    return make_template_repo(tmp_path / "template", {
+        "README.md": "hello", "src/main.c": "int main;", "keep.txt": "same",
+        ".gitignore": "build/"})
+
+
+def commit(url: str, files: dict) -> None:
+    repo = url.removeprefix("file://")
+    for name, contents in files.items():
+        if contents is None:
+            os.remove(f"{repo}/{name}")
+        else:
+            Path(f"{repo}/{name}").write_text(contents)
+    subprocess.run(["git", "-C", repo, "add", "-A"], check=True)
+    subprocess.run(["git", "-C", repo, "commit", "-qm", "update"], check=True)
+
+
+def scanner(tmp_path: Path) -> DriftScanner:
+    return DriftScanner(ConfigContext(meta=DataStruct(
+        cachedir=str(tmp_path / "cache"))))
+
+
+def test_blob_hash_matches_git(tmp_path: Path) -> None:
+    (tmp_path / "file").write_bytes(b"some\0content\n")
+    git = subprocess.run(["git", "hash-object", str(tmp_path / "file")],
+                         capture_output=True, text=True).stdout.strip()
+    assert blobHash(str(tmp_path / "file")) == git
+    assert blobHash(str(tmp_path / "missing")) is None
+
+
+def test_generation_writes_manifest(tmp_path: Path, template: str) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), {"--ref": "master"})
+
+    manifest = ProjectManifest.read(str(project))
+    assert manifest.template == template
+    assert manifest.ref == "master"
+    assert len(manifest.commit) == 40
+    assert sorted(manifest.files) == ["README.md", "keep.txt", "src/main.c"]
+    assert manifest.files["README.md"] == blobHash(str(project / "README.md"))
+
+
+def test_drift_is_classified_per_file(tmp_path: Path, template: str) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), {"--ref": "master"})
+    assert scanner(tmp_path).scan([str(project)])[0].files == []
+
+    (project / "README.md").write_text("edited")
+    (project / "src" / "main.c").write_text("edited")
+    (project / "mine.txt").write_text("not from the template")
+    commit(template, {"src/main.c": "upstream", "keep.txt": None,
+                      "NEW.md": "new"})
+
+    result = scanner(tmp_path).scan([str(project), str(tmp_path)])
+    assert result[0].error is None
+    assert result[0].files == [("new", "NEW.md"), ("modified", "README.md"),
+                               ("removed", "keep.txt"),
+                               ("conflict", "src/main.c")]
+    assert "no readable manifest" in result[1].error
+
+
+def test_unchanged_files_are_not_rehashed(
+        tmp_path: Path, template: str,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), {"--ref": "master"})
+    scanner(tmp_path).scan([str(project)])
+
+    hashed = []
+    monkeypatch.setattr("DriftScanner.blobHash",
+                        lambda path: hashed.append(path) or blobHash(path))
+    (project / "README.md").write_text("edited")
+    result = scanner(tmp_path).scan([str(project)])
+
+    assert hashed == [str(project / "README.md")]
+    assert result[0].files == [("modified", "README.md")]
+
+
+def test_hash_cache_forgets_what_no_longer_exists(
+        tmp_path: Path, template: str) -> None:
+    one, two = tmp_path / "one", tmp_path / "two"
+    for project in (one, two):
+        ProjectGenerator().generate(template, str(project),
+                                    {"--ref": "master"})
+    scanner(tmp_path).scan([str(one), str(two)])
+
+    shutil.rmtree(two)
+    (one / "keep.txt").unlink()
+    scan = scanner(tmp_path)
+    with pytest.raises(SystemExit):
+        scan.run({"<PROJECT_DIR>": [str(one)], "--jobs": "2"})
+    assert scan.jobs == 2
+
+    cache = json.loads((tmp_path / "cache" / "hashes.json").read_text())
+    assert list(cache["projects"]) == [str(one)]
+    assert "keep.txt" not in cache["projects"][str(one)]
+    assert "README.md" in cache["projects"][str(one)]
+
+
+def test_rendered_files_are_not_drift(tmp_path: Path) -> None:
+    template = make_template_repo(tmp_path / "template", {
+        "README.md": "# {{project_name}}", "{{PROJECT_NAME}}.c": "int x;",
+        "keep.txt": "same"})
+    project = tmp_path / "demo"
+    ProjectGenerator().generate(template, str(project), {"--ref": "master"})
+    assert (project / "README.md").read_text() == "# demo"
+    assert (project / "demo.c").exists()
+    assert scanner(tmp_path).scan([str(project)])[0].files == []
+
+    commit(template, {"{{PROJECT_NAME}}.c": "int y;"})
+    result = scanner(tmp_path).scan([str(project)])
+    assert result[0].files == [("outdated", "demo.c")]
+
+
+def test_subdirectory_templates(tmp_path: Path) -> None:
+    template = make_template_repo(tmp_path / "mono", {
+        "tpl/README.md": "# {{project_name}}", "tpl/.gitignore": "build/",
+        "other/file": "unused"})
+    project = tmp_path / "demo"
+    ProjectGenerator().generate(f"{template}#master:tpl", str(project), {})
+
+    assert sorted(p.name for p in project.iterdir()) == [
+        ".git", ProjectManifest.FILE, "README.md"]
+    assert ProjectManifest.read(str(project)).ref == "master"
+    assert scanner(tmp_path).scan([str(project)])[0].files == []
+
+
+def test_ndjson_output_is_not_mixed_with_progress(
+        tmp_path: Path, template: str, capsys: pytest.CaptureFixture,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), {"--ref": "master"})
+    (project / "README.md").write_text("edited")
+    capsys.readouterr()
+
+    # snapshot the template through a cold mirror, as for a remote one
+    monkeypatch.setattr(TemplateCache, "isRemote", staticmethod(
+        lambda project: True))
+    with pytest.raises(SystemExit):
+        scanner(tmp_path).run({"<PROJECT_DIR>": [str(project)],
+                               "--format": "ndjson"})
+
+    out, err = capsys.readouterr()
+    assert [json.loads(line)["files"] for line in out.splitlines()] == \
+        [[["modified", "README.md"]]]
+    assert f"Clone {template}: " in err
@@ -0,0 +1,162 @@
+import json
+import os
+import socket
+import threading
+import pytest
+from docopt import docopt
+from pathlib import Path
+from typing import Iterator
+
+from ConfigManager import ConfMgr
+from GeneratorDaemon import GeneratorDaemon, request
+from USAGE import USAGE
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Path:
+    template = make_template_repo(tmp_path / "template", {"README.md": "hi"})
+    path = tmp_path / "config.conf"
+    path.write_text(f"[ProGenrtr]\nlanguages = c\n[project.c]\n"
+                    f"lib: {template}\n")
+    return path
+
+
+@pytest.fixture
+def daemon(tmp_path: Path, config: Path) -> Iterator[GeneratorDaemon]:
+    args = {"--config": str(config), "--no-config-cache": True}
+    ConfMgr().parse(args)
+    daemon = GeneratorDaemon(args, 2, tmp_path / "daemon.sock")
+    ready = threading.Event()
+    thread = threading.Thread(target=daemon.serve, args=(ready,))
+    thread.start()
+    ready.wait(5)
+    yield daemon
+    daemon.stop()
+    thread.join()
+    ConfMgr.reset()
+
+
+def send(daemon: GeneratorDaemon, argv: list[str]) -> dict:
+    return request(docopt(USAGE, argv=argv), daemon.path, timeout=30)
+
+
+def test_list_and_generate_are_served(
+        daemon: GeneratorDaemon, config: Path, tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    response = send(daemon, ["--config", str(config), "--list"])
+    assert response["status"] == 0
+    assert "lib (file://" in response["stdout"]
+
+    # relative paths are the client's, not the daemon's
+    monkeypatch.chdir(tmp_path)
+    response = send(daemon, ["--config", "config.conf", "c", "lib", "new"])
+    assert response["status"] == 0, response["stderr"]
+    assert (tmp_path / "new" / "README.md").read_text() == "hi"
+
+    response = send(daemon, ["--config", "config.conf", "c", "nope", "x"])
+    assert response["status"] == 1
+    assert "no template project given" in response["stdout"]
+
+
+def test_config_changes_are_picked_up(
+        daemon: GeneratorDaemon, config: Path) -> None:
+    with open(config, "a") as f:
+        f.write("app: /somewhere/else\n")
+    response = send(daemon, ["--config", str(config), "--list"])
+    assert "app (/somewhere/else)" in response["stdout"]
+
+
+def test_other_configs_are_served_alongside(
+        daemon: GeneratorDaemon, config: Path, tmp_path: Path) -> None:
+    other = tmp_path / "other.conf"
+    other.write_text("[ProGenrtr]\nlanguages = go\n[project.go]\n"
+                     "cli: /somewhere/else\n")
+    for _ in range(2):
+        assert "cli (/somewhere/else)" in send(
+            daemon, ["--config", str(other), "--list"])["stdout"]
+        assert "lib (file://" in send(
+            daemon, ["--config", str(config), "--list"])["stdout"]
+
+
+def test_unserved_requests_are_declined(
+        daemon: GeneratorDaemon, config: Path, tmp_path: Path) -> None:
+    assert "declined" in send(daemon, ["--config", str(config), "--drift",
+                                       str(tmp_path)])
+    assert "declined" in send(daemon, ["--config", str(config), "--list",
+                                       "--timings"])
+    assert "no daemon" in request(docopt(USAGE, argv=["--list"]),
+                                  tmp_path / "missing.sock")["declined"]
+
+
+def test_requests_from_another_environment_are_declined(
+        daemon: GeneratorDaemon, config: Path, tmp_path: Path) -> None:
+    args = docopt(USAGE, argv=["--config", str(config), "c", "lib",
+                               str(tmp_path / "new")])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(daemon.path))
+        connection.sendall(json.dumps({
+            "args": args, "cwd": str(tmp_path),
+            "env": dict(os.environ, GIT_AUTHOR_NAME="someone else",
+                        PWD="/elsewhere")}).encode() + b"\n")
+        response = json.loads(connection.makefile("rb").readline())
+    assert response == {"declined": "the environment differs from the "
+                                    "daemon's in GIT_AUTHOR_NAME"}
+    assert not (tmp_path / "new").exists()
+
+
+def test_relative_templates_are_the_clients(
+        daemon: GeneratorDaemon, tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "work").mkdir()
+    config = tmp_path / "relative.conf"
+    config.write_text("[ProGenrtr]\nlanguages = c\n[project.c]\n"
+                      "lib: ../template\n")
+    # the daemon shares this process' working directory, so the client's
+    # is sent as another one
+    monkeypatch.chdir(tmp_path)
+    args = docopt(USAGE, argv=["--config", str(config), "c", "lib",
+                               str(tmp_path / "new")])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(daemon.path))
+        connection.sendall(json.dumps({
+            "args": args, "cwd": str(tmp_path / "work"),
+            "env": dict(os.environ)}).encode() + b"\n")
+        lines = connection.makefile("rb")
+        assert json.loads(lines.readline()) == {"accepted": True}
+        response = json.loads(lines.readline())
+    assert response["status"] == 0, response["stderr"]
+    assert (tmp_path / "new" / "README.md").read_text() == "hi"
+
+
+def test_requests_dropped_once_accepted_are_not_declined(
+        tmp_path: Path) -> None:
+    path = tmp_path / "dropping.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+
+    def accept_and_drop():
+        connection, _ = server.accept()
+        with connection:
+            connection.recv(65536)
+            connection.sendall(b'{"accepted": true}\n')
+
+    thread = threading.Thread(target=accept_and_drop)
+    thread.start()
+    try:
+        response = request(docopt(USAGE, argv=["c", "lib", "new"]), path,
+                           timeout=30)
+    finally:
+        thread.join()
+        server.close()
+    assert "declined" not in response
+    assert response["status"] == 1
+    assert "lost the daemon" in response["stderr"]
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import pytest
+from pathlib import Path
+
+from GitInit import GitInit
+from ProjectGenerator import ProjectGenerator
+from ProjectManifest import ProjectManifest
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+def git(path: Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(path), *args], check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    path = tmp_path / "project"
+    for name, contents in {"README.md": "hello", "src/a.c": "int a;",
+                           "src/b.c": "int a;", "src-x": "dash sorts first",
+                           "run.sh": "#!/bin/sh"}.items():
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(contents)
+    (path / "run.sh").chmod(0o755)
+    os.symlink("README.md", path / "LINK")
+    return path
+
+
+def test_empty_first_commit(project: Path) -> None:
+    commit = GitInit(str(project)).init()
+
+    assert git(project, "rev-parse", "HEAD") == commit
+    assert git(project, "symbolic-ref", "HEAD") == "refs/heads/master"
+    assert git(project, "log", "--format=%s %an <%ae>") == \
+        "#===>[BEGIN]<===# test <test@test>"
+    assert git(project, "rev-parse", "HEAD^{tree}") == \
+        "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+    git(project, "fsck", "--strict")
+
+
+def test_template_first_commit_matches_git(project: Path,
+                                           tmp_path: Path) -> None:
+    reference = tmp_path / "reference"
+    subprocess.run(["cp", "-a", str(project), str(reference)], check=True)
+    git(reference, "init", "-q")
+    git(reference, "add", "-A")
+
+    files = ProjectManifest.create(str(project), "t", "HEAD", None).files
+    files.pop(ProjectManifest.FILE, None)
+    GitInit(str(project)).init(dict(files, **{"src-x": None}))
+
+    assert git(project, "rev-parse", "HEAD^{tree}") == \
+        git(reference, "write-tree")
+    assert git(project, "status", "--porcelain") == \
+        f"?? {ProjectManifest.FILE}"
+    git(project, "fsck", "--strict", "--full")
+
+
+def test_files_that_no_longer_match_their_hash_are_rehashed(
+        project: Path, tmp_path: Path) -> None:
+    reference = tmp_path / "reference"
+    subprocess.run(["cp", "-a", str(project), str(reference)], check=True)
+    git(reference, "init", "-q")
+    git(reference, "add", "-A")
+
+    # as if a filter had changed the files after their hashes were listed
+    stale = "0123456789abcdef0123456789abcdef01234567"
+    (project / "src" / "b.c").write_text("int b;")
+    GitInit(str(project)).init({"README.md": stale, "src/a.c": stale,
+                                "src/b.c": stale, "src-x": None,
+                                "run.sh": None, "LINK": None})
+    (reference / "src" / "b.c").write_text("int b;")
+    git(reference, "add", "-A")
+
+    assert git(project, "rev-parse", "HEAD^{tree}") == \
+        git(reference, "write-tree")
+    assert git(project, "status", "--porcelain") == ""
+    git(project, "fsck", "--strict", "--full")
+
+
+def test_missing_identity_is_an_error(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR_NAME", "GIT_AUTHOR_EMAIL", "EMAIL"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+
+    with pytest.raises(RuntimeError, match="no git identity"):
+        GitInit(str(tmp_path / "project")).init()
+
+
+def test_generate_can_commit_the_template(tmp_path: Path) -> None:
+    template = make_template_repo(tmp_path / "template", {
+        "README.md": "hello", "src/main.c": "int main;", ".gitignore": "*.o"})
+    project = tmp_path / "project"
+
+    ProjectGenerator().generate(template, str(project),
+                                {"--ref": "master", "--commit-template": True})
+
+    assert git(project, "ls-files").splitlines() == [
+        ProjectManifest.FILE, "README.md", "src/main.c"]
+    assert git(project, "log", "--format=%s") == "#===>[BEGIN]<===#"
+    assert git(project, "status", "--porcelain") == ""
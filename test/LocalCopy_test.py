@@ -0,0 +1,111 @@
+import os
+import subprocess
+import pytest
+from pathlib import Path
+
+from LocalCopy import LocalCopy
+from ProjectGenerator import ProjectGenerator
+from test.testUtils import make_template_repo
+
+SKIP: list[str] = [".gitignore", ".gitattributes", ".gitmodules"]
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> Path:
+    source = tmp_path / "template"
+    make_template_repo(source, {"README.md": "hello", "src/main.py": "print()",
+                                "src/.gitignore": "*.pyc", ".gitignore":
+                                "build/\n"})
+    (source / "build").mkdir()
+    (source / "build" / "output.o").write_text("ignored")
+    (source / "untracked.txt").write_text("new")
+    (source / "run.sh").write_text("#!/bin/sh")
+    (source / "run.sh").chmod(0o755)
+    os.symlink("README.md", source / "LINK.md")
+    return source
+
+
+def tree(path: Path) -> set[str]:
+    return {str(p.relative_to(path)) for p in path.rglob("*")
+            if not p.is_dir() or p.is_symlink()}
+
+
+def test_git_working_tree_is_copied_without_ignored_files(
+        tmp_path: Path, template: Path) -> None:
+    stats = LocalCopy().copy(str(template), str(tmp_path / "project"), SKIP)
+
+    assert tree(tmp_path / "project") == {
+        "README.md", "src/main.py", "src/.gitignore", "untracked.txt",
+        "run.sh", "LINK.md"}
+    assert stats.files == 6
+    assert (tmp_path / "project" / "untracked.txt").read_text() == "new"
+
+
+def test_subdirectories_follow_the_ignore_rules_of_the_tree(
+        tmp_path: Path, template: Path) -> None:
+    (template / "src" / "build").mkdir()
+    (template / "src" / "build" / "out.o").write_text("ignored above src")
+    (template / "src" / "main.pyc").write_text("ignored in src")
+    (template / "src" / "new.py").write_text("untracked")
+
+    stats = LocalCopy().copy(str(template), str(tmp_path / "project"), SKIP,
+                             "src")
+
+    assert tree(tmp_path / "project") == {"main.py", "new.py"}
+    assert stats.files == 2
+
+
+def test_permissions_and_symlinks_are_preserved(tmp_path: Path,
+                                                template: Path) -> None:
+    LocalCopy(jobs=1).copy(f"file://{template}", str(tmp_path / "project"))
+
+    assert os.access(tmp_path / "project" / "run.sh", os.X_OK)
+    assert os.readlink(tmp_path / "project" / "LINK.md") == "README.md"
+
+
+def test_plain_directory_is_copied_whole_except_git(tmp_path: Path) -> None:
+    source = tmp_path / "plain"
+    for i in range(200):
+        (source / f"d{i % 7}").mkdir(parents=True, exist_ok=True)
+        (source / f"d{i % 7}" / f"f{i}").write_bytes(os.urandom(i))
+    (source / "sub" / ".git").mkdir(parents=True)
+    (source / "sub" / ".git" / "HEAD").write_text("ref")
+
+    stats = LocalCopy(jobs=3).copy(str(source), str(tmp_path / "project"))
+
+    assert stats.files == 200
+    assert stats.bytes == sum(range(200))
+    assert tree(tmp_path / "project") == tree(source) - {"sub/.git/HEAD"}
+    assert (tmp_path / "project" / "d3" / "f10").read_bytes() == \
+        (source / "d3" / "f10").read_bytes()
+
+
+def test_hardlink_mode_shares_inodes(tmp_path: Path, template: Path) -> None:
+    LocalCopy(mode="hardlink").copy(str(template), str(tmp_path / "project"))
+    assert os.path.samefile(template / "README.md",
+                            tmp_path / "project" / "README.md")
+
+
+def test_local_trees_are_detected(tmp_path: Path) -> None:
+    assert LocalCopy.isLocalTree(str(tmp_path))
+    assert LocalCopy.isLocalTree(f"file://{tmp_path}")
+    assert not LocalCopy.isLocalTree("https://github.com/jpchanson/test.git")
+    assert not LocalCopy.isLocalTree(str(tmp_path / "missing"))
+
+
+def test_bare_repositories_are_exported_not_copied(
+        tmp_path: Path, template: Path,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    bare = tmp_path / "tpl.git"
+    subprocess.run(["git", "clone", "-q", "--bare", str(template), str(bare)],
+                   check=True)
+    assert not LocalCopy.isLocalTree(str(bare))
+    assert not LocalCopy.isLocalTree(f"file://{bare}")
+
+    project = tmp_path / "project"
+    ProjectGenerator().generate(str(bare), str(project), {"--no-hooks": True})
+    assert {name for name in tree(project) if not name.startswith(".git/")} \
+        == {"README.md", "src/main.py", "src/.gitignore", ".progenrtr.json"}
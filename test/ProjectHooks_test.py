@@ -0,0 +1,137 @@
+import pytest
+from pathlib import Path
+from typing import Iterator
+
+from Config import DataStruct
+from ConfigManager import ConfMgr
+from ProjectGenerator import GenerationError, ProjectGenerator
+from ProjectHooks import ProjectHooks
+from test.testUtils import make_template_repo
+
+
+def run(hooks: ProjectHooks, path: Path, jobs: int = 4) -> dict:
+    hooks.start(str(path), path / "logs", jobs)
+    return {result.name: result for result in hooks.wait()}
+
+
+def test_hooks_are_parsed_from_the_config() -> None:
+    hooks = ProjectHooks.parse({
+        "venv": "python -m venv {{project_name}}",
+        "deps": "pip install .", "deps.after": "venv, git",
+        "deps.timeout": "5", "docs": "make docs", "docs.types": "lib",
+        "lint": "ruff", "lint.after": "docs", "skip": "", "skip.after": "x",
+    }, "app", {"project_name": "demo"}, timeout=60)
+
+    assert list(hooks) == ["venv", "deps", "lint"]
+    assert hooks["venv"].command == "python -m venv demo"
+    assert (hooks["deps"].after, hooks["deps"].timeout) == (["venv"], 5)
+    assert (hooks["lint"].after, hooks["lint"].timeout) == ([], 60)
+
+
+def test_rendered_values_are_quoted_for_the_shell(tmp_path: Path) -> None:
+    name = "my project; touch pwned"
+    hooks = ProjectHooks(DataStruct(
+        mark="touch {{project_name}}.txt"), variables={"project_name": name})
+    assert hooks.hooks["mark"].command == \
+        "touch 'my project; touch pwned'.txt"
+
+    assert run(hooks, tmp_path)["mark"].status == "ok"
+    assert (tmp_path / f"{name}.txt").exists()
+    assert not (tmp_path / "pwned").exists()
+
+
+@pytest.mark.parametrize("configured, message", [
+    ({"a": "true", "a.after": "b"}, "unknown hook 'b'"),
+    ({"a": "true", "a.after": "b", "b": "true", "b.after": "a"},
+     "depend on each other"),
+    ({"a.after": "git"}, "has no command"),
+    ({"a": "true", "a.retries": "2"}, "unknown hook attribute"),
+    ({"git": "true"}, "can not be a hook name"),
+])
+def test_misconfigured_hooks_are_rejected(configured: dict,
+                                          message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        ProjectHooks.parse(configured)
+
+
+def test_independent_hooks_run_concurrently(tmp_path: Path) -> None:
+    hooks = ProjectHooks(DataStruct(**{
+        "a": "touch a.started; while [ ! -e b.started ]; do sleep 0.01; done",
+        "b": "touch b.started; while [ ! -e a.started ]; do sleep 0.01; done",
+        "c": "ls a.started b.started", "c.after": "a, b",
+        "a.timeout": "5", "b.timeout": "5"}))
+    results = run(hooks, tmp_path, jobs=2)
+
+    assert [results[name].status for name in "abc"] == ["ok"] * 3
+    assert (tmp_path / "logs").is_dir()
+    assert "a.started" in results["c"].log.read_text()
+
+
+def test_failures_skip_the_hooks_after_them(tmp_path: Path) -> None:
+    hooks = ProjectHooks(DataStruct(**{
+        "fail": "echo broken; exit 3", "after": "true", "after.after": "fail",
+        "slow": "sleep 5", "slow.timeout": "0.2", "fine": "true"}))
+    results = run(hooks, tmp_path)
+
+    assert (results["fail"].status, results["fail"].returncode) == \
+        ("failed", 3)
+    assert results["fail"].log.read_text() == "broken\n"
+    assert (results["after"].status, results["after"].blocked) == \
+        ("skipped", "fail")
+    assert results["slow"].status == "timeout"
+    assert results["slow"].seconds < 5
+    assert results["fine"].status == "ok"
+
+
+def test_hook_commands_are_not_interpolated(tmp_path: Path) -> None:
+    config = tmp_path / "hooks.conf"
+    config.write_text("[ProGenrtr]\nlanguages = c, go\n[project.c]\n"
+                      "app: a\n[project.go]\ncli: b\n"
+                      '[hooks]\nenv = echo "$HOME" > home.txt\n')
+    (tmp_path / "hooks.conf.d").mkdir()
+    (tmp_path / "hooks.conf.d" / "go.conf").write_text(
+        "[hooks.go]\nwhere = echo $(pwd) ${PWD}\n")
+    try:
+        context = ConfMgr.load({"--config": str(config),
+                                "--no-config-cache": True})
+        assert context.hooks.c.env == 'echo "$HOME" > home.txt'
+        assert context.hooks.go.where == "echo $(pwd) ${PWD}"
+    finally:
+        ConfMgr.reset()
+
+
+@pytest.fixture
+def hookConfig(tmp_path: Path,
+               monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    make_template_repo(tmp_path / "template", {"README.md": "hello"})
+    ConfMgr().meta = DataStruct(cachedir=str(tmp_path / "cache"))
+    ConfMgr().hooks = DataStruct(python=DataStruct(**{
+        "early": "cp README.md {{project_name}}.txt",
+        "repo": "test -d .git && touch has-git", "repo.after": "git, early"}))
+    yield tmp_path
+    ConfMgr.reset()
+
+
+def test_hooks_run_once_the_project_is_generated(hookConfig: Path,
+                                                 capsys) -> None:
+    project = hookConfig / "demo"
+    ProjectGenerator().generate(str(hookConfig / "template"), str(project), {
+        "<LANGUAGE>": "python", "<PROJECT_TYPE>": "standard"})
+
+    assert (project / "demo.txt").read_text() == "hello"
+    assert (project / "has-git").exists()
+    assert "Hook 'repo' finished" in capsys.readouterr().out
+
+
+def test_failed_hooks_fail_the_generation(hookConfig: Path) -> None:
+    ConfMgr().hooks.python.early = "false"
+    args = {"<LANGUAGE>": "python", "<PROJECT_TYPE>": "standard"}
+    with pytest.raises(GenerationError, match="hooks failed: early, repo"):
+        ProjectGenerator().generate(str(hookConfig / "template"),
+                                    str(hookConfig / "one"), args)
+    ProjectGenerator().generate(str(hookConfig / "template"),
+                                str(hookConfig / "two"),
+                                dict(args, **{"--no-hooks": True}))
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+import pytest
+from pathlib import Path
+from typing import Iterator
+
+from Config import DataStruct
+from ConfigManager import ConfMgr
+from ProjectGenerator import GenerationError, ProjectGenerator
+from StagedTarget import StagedTarget
+from test.testUtils import make_template_repo
+
+
+def leftovers(parent: Path, name: str) -> list[str]:
+    return sorted(entry.name for entry in parent.iterdir()
+                  if entry.name.startswith(f".{name}."))
+
+
+def await_removal(parent: Path, name: str) -> None:
+    deadline = time.monotonic() + 10
+    while leftovers(parent, name) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert leftovers(parent, name) == []
+
+
+@pytest.fixture
+def template(tmp_path: Path,
+             monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    ConfMgr().meta = DataStruct(cachedir=str(tmp_path / "cache"))
+    yield make_template_repo(tmp_path / "template", {"README.md": "hi"})
+    ConfMgr.reset()
+
+
+def test_commit_moves_the_stage_into_place(tmp_path: Path) -> None:
+    with StagedTarget(str(tmp_path / "out"), tmp_path / "locks") as target:
+        Path(target.stage, "file").write_text("done")
+        assert not (tmp_path / "out").exists()
+        target.commit()
+    assert (tmp_path / "out" / "file").read_text() == "done"
+    assert leftovers(tmp_path, "out") == []
+    assert list((tmp_path / "locks").iterdir()) == []
+
+
+def test_uncommitted_and_abandoned_stages_are_discarded(
+        tmp_path: Path) -> None:
+    abandoned = tmp_path / ".out.stage-dead"
+    (abandoned / "deep").mkdir(parents=True)
+    with StagedTarget(str(tmp_path / "out"), tmp_path / "locks") as target:
+        assert not abandoned.exists()
+        Path(target.stage, "file").write_text("partial")
+    assert not (tmp_path / "out").exists()
+    await_removal(tmp_path, "out")
+
+
+def test_existing_targets_are_refused(tmp_path: Path) -> None:
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out" / "keep").write_text("")
+    with pytest.raises(FileExistsError, match="not an empty directory"):
+        StagedTarget(str(tmp_path / "out"), tmp_path / "locks").open()
+
+    # the lock was released along the way
+    (tmp_path / "out" / "keep").unlink()
+    with StagedTarget(str(tmp_path / "out"), tmp_path / "locks") as target:
+        target.commit()
+
+
+def test_failed_generation_leaves_nothing_behind(
+        template: str, tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    def fail(*args):
+        raise RuntimeError("no git")
+
+    monkeypatch.setattr(ProjectGenerator,
+                        "_ProjectGenerator__reinitialiseProject", fail)
+    with pytest.raises(GenerationError, match="could not initialise"):
+        ProjectGenerator().generate(template, str(tmp_path / "new"),
+                                    {"--no-hooks": True})
+    assert not (tmp_path / "new").exists()
+    await_removal(tmp_path, "new")
+
+
+def test_concurrent_runs_on_one_target_are_serialised(
+        template: str, tmp_path: Path) -> None:
+    errors = []
+
+    def generate():
+        try:
+            ProjectGenerator().generate(template, str(tmp_path / "new"),
+                                        {"--no-hooks": True})
+        except GenerationError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=generate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    assert all("already exists" in error for error in errors)
+    assert (tmp_path / "new" / "README.md").read_text() == "hi"
+    assert os.path.isdir(tmp_path / "new" / ".git")
+    assert list((tmp_path / "xdg" / "progenrtr" / "locks").iterdir()) == []
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import tomllib
+import pytest
+from pathlib import Path
+
+import USAGE
+from test.testUtils import PROJECT_ROOT
+
+## modules that must never be imported just to list templates or show help
+HEAVY_MODULES: list[str] = ["git", "tomllib"]
+
+## generous upper bound on the total import time of a command, in seconds
+IMPORT_BUDGET: float = 0.25
+
+
+def importTimes(args: list[str], cwd: Path, home: Path) -> dict[str, int]:
+    """!
+    run the cli under `-X importtime` and collect the cumulative import time,
+    in microseconds, of every top level module it imported.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime",
+         str(PROJECT_ROOT / "src" / "ProGenrtr")] + args,
+        cwd=cwd, env={"HOME": str(home), "PATH": ""},
+        capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_metadata_matches_pyproject() -> None:
+    with open(PROJECT_ROOT / "pyproject.toml", "rb") as f:
+        project = tomllib.load(f)["project"]
+    assert USAGE.NAME == project["name"]
+    assert USAGE.VERSION == project["version"]
+    assert USAGE.DESCRIPTION == project["description"]
+
+
+@pytest.mark.parametrize("args", [["--help"], ["--version"], ["--list"]])
+def test_startup_stays_light(tmp_path: Path, args: list[str]) -> None:
+    # run from elsewhere to prove nothing is read relative to the cwd
+    times = importTimes(args, cwd=tmp_path, home=tmp_path)
+    for module in HEAVY_MODULES:
+        assert module not in times
+    assert sum(times.values()) / 1e6 < IMPORT_BUDGET
+
+
+@pytest.mark.parametrize("jobs", ["0", "-2", "many"])
+def test_bad_jobs_are_reported_cleanly(tmp_path: Path, jobs: str) -> None:
+    proc = subprocess.run(
+        [sys.executable, str(PROJECT_ROOT / "src" / "ProGenrtr"), "--drift",
+         f"--jobs={jobs}", str(tmp_path)],
+        cwd=tmp_path, env={"HOME": str(tmp_path), "PATH": ""},
+        capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert proc.stderr == f"ERROR: --jobs must be a positive number, not " \
+                          f"'{jobs}'\n"
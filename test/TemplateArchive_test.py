@@ -0,0 +1,171 @@
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import zipfile
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from DriftScanner import DriftScanner
+from ProjectGenerator import GenerationError, ProjectGenerator
+from ProjectManifest import ProjectManifest, blobHash
+from TemplateArchive import TemplateArchive, archiveSuffix
+
+FILES = {"tool-1.2/README.md": b"hello", "tool-1.2/src/main.c": b"int main;",
+         "tool-1.2/bin/run": b"#!/bin/sh\n", "other/ignored": b"x"}
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+def make_tar(path: Path, files: dict, links: dict = None) -> str:
+    """!
+    write a tar compressed as its suffix says, zstd by way of the zstd program
+    """
+    zstd = path.name.endswith(".zst")
+    raw = path.with_suffix(".tmp") if zstd else path
+    mode = {".gz": "w:gz", ".xz": "w:xz"}.get(path.suffix, "w")
+    with tarfile.open(raw, mode) as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755 if "bin/" in name else 0o644
+            tar.addfile(info, io.BytesIO(data))
+        for name, target in (links or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type, info.linkname = tarfile.SYMTYPE, target
+            tar.addfile(info)
+    if zstd:
+        subprocess.run(["zstd", "-q", "--rm", str(raw), "-o", str(path)],
+                       check=True)
+    return str(path)
+
+
+def make_zip(path: Path, files: dict) -> str:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = (0o100755 if "bin/" in name else 0o100644) \
+                << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+    return str(path)
+
+
+@pytest.mark.parametrize("name", ["t.tar", "t.tar.gz", "t.tar.zst",
+                                  "t.tar.xz", "t.zip"])
+def test_archives_are_extracted_and_stripped(tmp_path: Path,
+                                             name: str) -> None:
+    if name.endswith(".zst") and not shutil.which("zstd"):
+        pytest.skip("zstd is not installed")
+    archive = make_zip(tmp_path / name, FILES) if name.endswith(".zip") \
+        else make_tar(tmp_path / name, FILES)
+    out = tmp_path / "out"
+    stats = TemplateArchive(archive, jobs=2).extract(str(out), "tool-1.2")
+
+    assert (stats.files, stats.bytes) == (3, 24)
+    assert sorted(str(p.relative_to(out)) for p in out.rglob("*")
+                  if p.is_file()) == ["README.md", "bin/run", "src/main.c"]
+    assert os.access(out / "bin" / "run", os.X_OK)
+    assert not os.access(out / "README.md", os.X_OK)
+    assert stats.blobs == {name: blobHash(str(out / name))
+                           for name in stats.blobs}
+    assert TemplateArchive(archive).blobs("tool-1.2") == stats.blobs
+
+
+def test_hard_links_are_hashed_like_their_target(tmp_path: Path) -> None:
+    archive = make_tar(tmp_path / "t.tar", FILES)
+    with tarfile.open(archive, "a") as tar:
+        info = tarfile.TarInfo("tool-1.2/src/copy.c")
+        info.type, info.linkname = tarfile.LNKTYPE, "tool-1.2/src/main.c"
+        tar.addfile(info)
+    out = tmp_path / "out"
+    stats = TemplateArchive(archive).extract(str(out), "tool-1.2")
+
+    assert stats.files == 4
+    assert stats.blobs["src/copy.c"] == blobHash(str(out / "src" / "copy.c"))
+    assert TemplateArchive(archive).blobs("tool-1.2") == stats.blobs
+
+
+@pytest.mark.parametrize("files, links", [
+    ({"../evil": b"x"}, {}),
+    ({"/etc/evil": b"x"}, {}),
+    ({"escape/evil": b"x"}, {"escape": "/tmp"}),
+    ({"escape/evil": b"x"}, {"escape": "../.."}),
+])
+def test_members_may_not_leave_the_template(tmp_path: Path, files: dict,
+                                            links: dict) -> None:
+    archive = make_tar(tmp_path / "evil.tar", {}, links)
+    if files:
+        with tarfile.open(archive, "a") as tar:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    with pytest.raises((ValueError, tarfile.FilterError)):
+        TemplateArchive(archive).extract(str(tmp_path / "out" / "deep"))
+    assert not (tmp_path / "evil").exists()
+    assert not (tmp_path / "out" / "evil").exists()
+
+
+def test_zip_members_may_not_leave_the_template(tmp_path: Path) -> None:
+    archive = make_zip(tmp_path / "evil.zip", {"../evil": b"x"})
+    with pytest.raises(ValueError, match="leaves the template"):
+        TemplateArchive(archive).extract(str(tmp_path / "out"))
+    assert not (tmp_path / "evil").exists()
+
+
+def test_archive_templates_generate_projects(tmp_path: Path) -> None:
+    archive = make_tar(tmp_path / "tool-1.2.tar.gz",
+                       dict(FILES, **{"tool-1.2/.gitignore": b"build/"}))
+    project = tmp_path / "project"
+    ProjectGenerator().generate(f"{archive}#:tool-1.2", str(project),
+                                {"--no-hooks": True})
+
+    assert (project / "README.md").read_text() == "hello"
+    assert (project / ".git").is_dir()
+    assert not (project / ".gitignore").exists()
+    manifest = ProjectManifest.read(str(project))
+    assert (manifest.commit, sorted(manifest.files)) == \
+        (None, ["README.md", "bin/run", "src/main.c"])
+    scanner = DriftScanner(ConfigContext(meta=DataStruct(
+        cachedir=str(tmp_path / "cache"))))
+    assert scanner.scan([str(project)])[0].files == []
+
+    with pytest.raises(GenerationError, match="no refs"):
+        ProjectGenerator().generate(archive, str(tmp_path / "other"),
+                                    {"--ref": "v1", "--no-hooks": True})
+
+
+def test_broken_archives_fail_the_generation(tmp_path: Path) -> None:
+    (tmp_path / "broken.tar.gz").write_bytes(b"not gzip at all")
+    with pytest.raises(GenerationError, match="could not extract"):
+        ProjectGenerator().generate(str(tmp_path / "broken.tar.gz"),
+                                    str(tmp_path / "project"),
+                                    {"--no-hooks": True})
+    assert not (tmp_path / "project").exists()
+
+
+def test_chatty_decompressors_do_not_stall(tmp_path: Path,
+                                           monkeypatch: pytest.MonkeyPatch
+                                           ) -> None:
+    make_tar(tmp_path / "tool.tar.zst.tar", FILES)
+    os.rename(tmp_path / "tool.tar.zst.tar", tmp_path / "tool.tar.zst")
+    bin = tmp_path / "bin"
+    bin.mkdir()
+    # a zstd warning about more than a pipe holds before writing the tar
+    (bin / "zstd").write_text("#!/bin/sh\nhead -c 1000000 /dev/zero >&2\n"
+                              'cat "$2"\n')
+    (bin / "zstd").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin}{os.pathsep}{os.environ['PATH']}")
+
+    stats = TemplateArchive(str(tmp_path / "tool.tar.zst")).extract(
+        str(tmp_path / "out"), "tool-1.2")
+    assert stats.files == 3
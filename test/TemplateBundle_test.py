@@ -0,0 +1,154 @@
+import shutil
+import subprocess
+import pytest
+from pathlib import Path
+from docopt import docopt
+from typing import Iterator
+
+from BundleExporter import BundleExporter
+from Config import DataStruct
+from ConfigManager import ConfMgr
+from ProjectGenerator import GenerationError, ProjectGenerator
+from ProjectManifest import ProjectManifest
+from TemplateBundle import TemplateBundle
+from USAGE import USAGE
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def templates(tmp_path: Path,
+              monkeypatch: pytest.MonkeyPatch) -> Iterator[DataStruct]:
+    """!
+    a config of two templates, one of them with a submodule `lib`
+    """
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+    make_template_repo(tmp_path / "lib", {"lib.c": "int lib;"})
+    app = make_template_repo(tmp_path / "app", {"README.md": "hello",
+                                                "src/main.c": "int main;"})
+    subprocess.run(["git", "-c", "protocol.file.allow=always", "-C",
+                    str(tmp_path / "app"), "submodule", "add", "-q",
+                    str(tmp_path / "lib"), "lib"], check=True)
+    subprocess.run(["git", "-C", str(tmp_path / "app"), "commit", "-qm",
+                    "lib"], check=True)
+    tool = make_template_repo(tmp_path / "tool", {"tool.py": "pass"})
+    ConfMgr().projects = DataStruct(
+        c=DataStruct(app=app, missing=f"file://{tmp_path}/missing"),
+        python=DataStruct(tool=tool, app=app))
+    yield DataStruct(app=app, tool=tool, root=tmp_path)
+    ConfMgr.reset()
+
+
+def test_templates_are_bundled_and_generated_from(
+        templates: DataStruct) -> None:
+    bundle = templates.root / "templates.bundle"
+    results = BundleExporter().export(
+        str(bundle), BundleExporter().templates(), {}, jobs=2)
+
+    assert [r.error is None for r in results] == [True, False, True]
+    assert sorted(TemplateBundle(str(bundle)).templates) == \
+        [(templates.app, "HEAD"), (templates.tool, "HEAD")]
+
+    # the templates themselves are no longer needed
+    shutil.rmtree(templates.root / "app")
+    shutil.rmtree(templates.root / "lib")
+    project = templates.root / "project"
+    ProjectGenerator().generate(templates.app, str(project),
+                                {"--bundle": str(bundle)})
+
+    assert (project / "src" / "main.c").read_text() == "int main;"
+    assert (project / "lib" / "lib.c").read_text() == "int lib;"
+    assert not (project / ".gitmodules").exists()
+    assert not (project / "lib" / ".git").exists()
+    manifest = ProjectManifest.read(str(project))
+    assert manifest.commit == results[0].commit
+    assert set(manifest.files) == {"README.md", "src/main.c", "lib/lib.c"}
+
+
+def test_templates_missing_from_the_bundle_are_reported(
+        templates: DataStruct) -> None:
+    bundle = templates.root / "templates.bundle"
+    BundleExporter().export(str(bundle), [templates.tool], {})
+
+    with pytest.raises(GenerationError, match="not in"):
+        ProjectGenerator().generate(templates.app,
+                                    str(templates.root / "project"),
+                                    {"--bundle": str(bundle)})
+    with pytest.raises(GenerationError, match="not in"):
+        ProjectGenerator().generate(templates.tool,
+                                    str(templates.root / "project"),
+                                    {"--bundle": str(bundle), "--ref": "v1"})
+
+
+@pytest.mark.parametrize("ref, expected", [
+    (None, "master"), ("HEAD", "HEAD"), ("v1", "v1")])
+def test_an_explicit_ref_wins_over_the_config(ref: str | None,
+                                              expected: str) -> None:
+    assert ProjectGenerator.templateRef("file:///t#master",
+                                        {"--ref": ref}) == expected
+
+
+def test_pinned_templates_are_found_in_the_bundle(
+        templates: DataStruct) -> None:
+    bundle = templates.root / "templates.bundle"
+    pinned = f"{templates.tool}#master"
+    results = BundleExporter().export(str(bundle), [pinned], {})
+    assert results[0].ref == "master"
+
+    ProjectGenerator().generate(pinned, str(templates.root / "project"),
+                                {"--bundle": str(bundle)})
+    assert (templates.root / "project" / "tool.py").exists()
+    with pytest.raises(GenerationError, match="not in"):
+        ProjectGenerator().generate(pinned, str(templates.root / "other"),
+                                    {"--bundle": str(bundle),
+                                     "--ref": "HEAD"})
+
+
+def test_config_pins_survive_the_command_line(
+        templates: DataStruct) -> None:
+    url = make_template_repo(templates.root / "pinned", {"sub/f": "v1"})
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@test",
+           "-C", str(templates.root / "pinned")]
+    subprocess.run(git + ["tag", "v1"], check=True)
+    (templates.root / "pinned" / "sub" / "f").write_text("v2")
+    subprocess.run(git + ["commit", "-qam", "v2"], check=True)
+    ConfMgr().projects = DataStruct(x=DataStruct(pinned=f"{url}#v1:sub"))
+
+    def cli(*argv: str) -> dict:
+        return docopt(USAGE, argv=["--no-hooks", "x", "pinned",
+                                   *argv[:-1], str(templates.root / argv[-1])])
+
+    ProjectGenerator().run(cli("out"))
+    assert (templates.root / "out" / "f").read_text() == "v1"
+    assert ProjectManifest.read(str(templates.root / "out")).ref == "v1"
+
+    bundle = str(templates.root / "templates.bundle")
+    BundleExporter().run(docopt(USAGE, argv=["--export-bundle", bundle]))
+    ProjectGenerator().run(cli("--bundle", bundle, "bundled"))
+    assert (templates.root / "bundled" / "f").read_text() == "v1"
+
+    ProjectGenerator().run(cli("--ref", "HEAD", "head"))
+    assert (templates.root / "head" / "f").read_text() == "v2"
+
+
+def test_bundles_are_closed_once_no_longer_used(
+        templates: DataStruct) -> None:
+    bundle = str(templates.root / "templates.bundle")
+    BundleExporter().export(bundle, [templates.tool], {})
+
+    with TemplateBundle.open(bundle) as outer:
+        with TemplateBundle.open(bundle) as inner:
+            assert inner is outer
+        outer.extract(templates.tool, "HEAD", str(templates.root / "one"))
+    with pytest.raises(ValueError):
+        outer.extract(templates.tool, "HEAD", str(templates.root / "two"))
+    with TemplateBundle.open(bundle) as reopened:
+        assert reopened is not outer
+
+
+def test_other_files_are_not_bundles(tmp_path: Path) -> None:
+    for contents in (b"", b"PGBUNDL1 but not really a bundle"):
+        (tmp_path / "other").write_bytes(contents)
+        with pytest.raises(ValueError):
+            TemplateBundle(str(tmp_path / "other"))
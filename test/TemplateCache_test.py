@@ -0,0 +1,142 @@
+import os
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from TemplateCache import TemplateCache
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> str:
+    return make_template_repo(tmp_path / "template", {"README.md": "hello"})
+
+
+def makeCache(tmp_path: Path, **meta) -> TemplateCache:
+    return TemplateCache(DataStruct(cachedir=str(tmp_path / "cache"), **meta))
+
+
+def mirrored(cache: TemplateCache, url: str) -> Path:
+    with cache.using(url) as mirror:
+        return mirror
+
+
+def test_remote_urls_are_detected() -> None:
+    assert TemplateCache.isRemote("https://github.com/jpchanson/test.git")
+    assert TemplateCache.isRemote("git@github.com:jpchanson/test.git")
+    assert not TemplateCache.isRemote("../Progenrtr-python/")
+    assert not TemplateCache.isRemote("file:///tmp/template")
+
+
+def test_mirror_is_created_once_and_reused(tmp_path: Path,
+                                           template: str) -> None:
+    cache = makeCache(tmp_path)
+    mirror = mirrored(cache, template)
+    assert (mirror / "HEAD").is_file()
+    fetched = (mirror / TemplateCache.FETCHED_STAMP).stat().st_mtime
+
+    os.utime(mirror / TemplateCache.FETCHED_STAMP, (fetched - 10,) * 2)
+    assert mirrored(cache, template) == mirror
+    refetched = (mirror / TemplateCache.FETCHED_STAMP).stat().st_mtime
+    assert refetched == fetched - 10
+
+
+def test_stale_mirror_is_fetched(tmp_path: Path, template: str) -> None:
+    cache = makeCache(tmp_path, cachettl="0")
+    mirror = mirrored(cache, template)
+    os.utime(mirror / TemplateCache.FETCHED_STAMP, (0, 0))
+    mirrored(cache, template)
+    assert (mirror / TemplateCache.FETCHED_STAMP).stat().st_mtime > 0
+
+
+def test_clone_from_mirror_contains_template(tmp_path: Path,
+                                             template: str) -> None:
+    cache = makeCache(tmp_path)
+    cache.clone(template, str(tmp_path / "project"))
+    assert (tmp_path / "project" / "README.md").read_text() == "hello"
+
+
+def test_least_recently_used_mirror_is_evicted(tmp_path: Path) -> None:
+    first = make_template_repo(tmp_path / "a", {"a": "a" * 4096})
+    second = make_template_repo(tmp_path / "b", {"b": "b" * 4096})
+    cache = makeCache(tmp_path, cachemaxsize="0")
+    firstMirror = mirrored(cache, first)
+    os.utime(firstMirror / TemplateCache.USED_STAMP, (0, 0))
+    secondMirror = mirrored(cache, second)
+
+    cache.maxSize = 1
+    cache.evict(keep=secondMirror)
+    assert not firstMirror.exists()
+    assert secondMirror.exists()
+
+
+def test_mirrors_are_only_measured_once_they_change(
+        tmp_path: Path, template: str,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = makeCache(tmp_path)
+    mirror = mirrored(cache, template)
+    size = int((mirror / TemplateCache.SIZE_STAMP).read_text())
+    assert size > 0
+    evictions = []
+    monkeypatch.setattr(cache, "evict", lambda keep=None:
+                        evictions.append(keep))
+
+    mirrored(cache, template)
+    assert evictions == []
+    os.utime(mirror / TemplateCache.FETCHED_STAMP, (0, 0))
+    mirrored(cache, template)
+    assert evictions == [mirror]
+
+
+@pytest.mark.parametrize("use", [
+    lambda cache, url, path: cache.clone(url, path),
+    lambda cache, url, path: cache.export(url, "HEAD", path),
+    lambda cache, url, path: cache.listTree(url, "HEAD"),
+])
+def test_mirror_is_not_evicted_before_it_is_used(
+        tmp_path: Path, template: str, use,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = makeCache(tmp_path)
+    other = makeCache(tmp_path)
+    other.maxSize = 1
+    # another run evicting everything it can right after the mirror is made
+    monkeypatch.setattr(cache, "evict", lambda keep=None: other.evict())
+
+    use(cache, template, str(tmp_path / "project"))
+    assert (cache.mirrorPath(template) / "HEAD").is_file()
+
+
+def test_unknown_eviction_policy_is_rejected(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        makeCache(tmp_path, cacheeviction="random")
+
+
+def test_subdirectory_fetches_only_its_own_blobs(tmp_path: Path) -> None:
+    import subprocess
+
+    url = make_template_repo(tmp_path / "mono", {
+        "tpl/README.md": "template", "tpl/src/main.c": "int main;",
+        **{f"other/big{i}": f"{i}" * 4096 for i in range(20)}})
+    subprocess.run(["git", "-C", tmp_path / "mono", "config",
+                    "uploadpack.allowFilter", "true"], check=True)
+    cache = makeCache(tmp_path)
+
+    stats = cache.export(url, "master", str(tmp_path / "project"),
+                         subdir="tpl")
+    assert stats.files == 2 and len(stats.commit) == 40
+    assert (tmp_path / "project" / "src" / "main.c").read_text() == \
+        "int main;"
+    mirror = cache.mirrorPath(url, partial=True)
+    missing = subprocess.run(["git", "-C", mirror, "rev-list", "--objects",
+                              "--missing=print", "master"],
+                             capture_output=True, text=True).stdout
+    assert missing.count("?") == 20
+    assert not cache.mirrorPath(url).exists()
+
+    commit = cache.clone(url, str(tmp_path / "clone"), ref="master",
+                         subdir="tpl")
+    assert commit == stats.commit
+    assert sorted(p.name for p in (tmp_path / "clone").iterdir()) == \
+        ["README.md", "src"]
+    assert sorted(cache.listTree(url, "master", subdir="tpl")) == \
+        ["README.md", "src/main.c"]
@@ -0,0 +1,104 @@
+import subprocess
+import time
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from TemplateCheck import TemplateCheck
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def templates(tmp_path: Path) -> list[tuple[str, str, str]]:
+    good = make_template_repo(tmp_path / "good", {"README.md": "hello"})
+    other = make_template_repo(tmp_path / "other", {"main.c": "int main;"})
+    return [("cpp", "good", good), ("cpp", "again", good),
+            ("c", "other", other),
+            ("c", "missing", f"file://{tmp_path}/missing")]
+
+
+def makeCheck(tmp_path: Path, **kwargs) -> TemplateCheck:
+    return TemplateCheck(DataStruct(cachedir=str(tmp_path / "cache")),
+                         **kwargs)
+
+
+def head(url: str) -> str:
+    return subprocess.run(["git", "-C", url.removeprefix("file://"),
+                           "rev-parse", "HEAD"],
+                          capture_output=True, text=True).stdout.strip()
+
+
+def test_reachable_and_broken_templates_are_reported(
+        tmp_path: Path, templates: list) -> None:
+    results = makeCheck(tmp_path).check(templates)
+
+    assert [r.name for r in results] == ["good", "again", "other", "missing"]
+    assert results[0].head == head(templates[0][2])
+    assert results[2].head == head(templates[2][2])
+    assert results[3].head is None
+    assert "fatal:" in results[3].error
+
+
+def test_repeat_check_is_served_from_cache(
+        tmp_path: Path, templates: list,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    makeCheck(tmp_path).check(templates)
+    lookups = []
+    resolve = TemplateCheck.resolve
+    monkeypatch.setattr(TemplateCheck, "resolve",
+                        lambda self, source: lookups.append(source)
+                        or resolve(self, source))
+
+    results = makeCheck(tmp_path).check(templates)
+    assert lookups == [templates[3][2]]
+    assert [r.cached for r in results] == [True, True, True, False]
+
+    makeCheck(tmp_path, refresh=True).check(templates)
+    assert len(lookups) == 4
+
+
+def test_expired_cache_entries_are_resolved_again(
+        tmp_path: Path, templates: list,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    makeCheck(tmp_path).check(templates[:1])
+    monkeypatch.setattr(time, "time",
+                        lambda: 2 * TemplateCheck.DEFAULT_TTL + 1e10)
+    assert not makeCheck(tmp_path).check(templates[:1])[0].cached
+
+
+def test_slow_lookups_time_out(tmp_path: Path,
+                               monkeypatch: pytest.MonkeyPatch) -> None:
+    def hang(*args, **kwargs):
+        raise subprocess.TimeoutExpired(args[0], kwargs["timeout"])
+    monkeypatch.setattr(subprocess, "run", hang)
+
+    result = makeCheck(tmp_path, timeout=0.5).check([("a", "b", "c:d")])[0]
+    assert result.error == "timed out after 0.5s"
+
+
+def test_refs_resolve_to_the_commit_they_name(tmp_path: Path) -> None:
+    url = make_template_repo(tmp_path / "repo", {"README.md": "hello"})
+    repo = url.removeprefix("file://")
+    commit = head(url)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@test",
+           "-C", repo]
+    subprocess.run(git + ["tag", "-a", "v1", "-m", "release"], check=True)
+    subprocess.run(git + ["branch", "x/foo"], check=True)
+
+    check = makeCheck(tmp_path)
+    assert check.resolve(f"{url}#v1") == (commit, None)
+    assert check.resolve(f"{url}#{commit}") == (commit, None)
+    assert check.resolve(f"{url}#foo") == (None, "repository has no foo")
+    assert check.resolve(f"file://{tmp_path}/missing#{commit}")[0] is None
+
+
+def test_relative_sources_are_cached_by_absolute_path(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    make_template_repo(tmp_path / "repo", {"tpl/README.md": "hello"})
+    monkeypatch.chdir(tmp_path)
+    makeCheck(tmp_path).check([("c", "sub", "repo#:tpl")])
+
+    monkeypatch.chdir(tmp_path / "repo")
+    result = makeCheck(tmp_path).check([("c", "sub", "repo#:tpl")])[0]
+    assert not result.cached
+    assert "fatal:" in result.error
@@ -0,0 +1,64 @@
+import subprocess
+import pytest
+from pathlib import Path
+
+from TemplateExport import exportTree, listTree, sparseClone
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> Path:
+    make_template_repo(tmp_path / "template",
+                       {"README.md": "hello", "src/main.py": "print()"},
+                       commits=3)
+    return tmp_path / "template"
+
+
+def test_export_writes_tree_without_history(tmp_path: Path,
+                                            template: Path) -> None:
+    stats = exportTree(template, "HEAD", tmp_path / "project")
+
+    assert not (tmp_path / "project" / ".git").exists()
+    assert (tmp_path / "project" / "src" / "main.py").is_file()
+    assert stats.files == 2
+    assert stats.bytes == sum(
+        f.stat().st_size for f in (tmp_path / "project").rglob("*")
+        if f.is_file())
+
+
+def test_export_reports_exported_commit(tmp_path: Path,
+                                        template: Path) -> None:
+    head = subprocess.run(["git", "-C", template, "rev-parse", "HEAD~2"],
+                          capture_output=True, text=True).stdout.strip()
+    stats = exportTree(template, "HEAD~2", tmp_path / "project")
+
+    assert stats.commit == head
+    assert (tmp_path / "project" / "README.md").read_text() == "hello"
+
+
+def test_export_of_unknown_ref_raises(tmp_path: Path, template: Path) -> None:
+    with pytest.raises(RuntimeError):
+        exportTree(template, "no-such-ref", tmp_path / "project")
+
+
+def test_subdirectory_is_exported_as_the_root(tmp_path: Path,
+                                              template: Path) -> None:
+    stats = exportTree(template, "HEAD~1", tmp_path / "project", "src")
+
+    assert [p.name for p in (tmp_path / "project").iterdir()] == ["main.py"]
+    assert stats.commit == subprocess.run(
+        ["git", "-C", template, "rev-parse", "HEAD~1"],
+        capture_output=True, text=True).stdout.strip()
+    assert list(listTree(template, "HEAD", "src")) == ["main.py"]
+
+
+def test_sparse_clone_hoists_subdirectory(tmp_path: Path,
+                                          template: Path) -> None:
+    project = tmp_path / "project"
+    commit = sparseClone(str(template), str(project), "HEAD~1", "src")
+
+    assert sorted(p.name for p in project.iterdir()) == ["main.py"]
+    assert (project / "main.py").read_text() == "print()\n1"
+    assert len(commit) == 40
+    with pytest.raises(FileNotFoundError):
+        sparseClone(str(template), str(tmp_path / "other"), "HEAD", "nope")
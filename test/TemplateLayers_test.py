@@ -0,0 +1,97 @@
+import os
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from DriftScanner import DriftScanner
+from ProjectGenerator import GenerationError, ProjectGenerator
+from ProjectManifest import ProjectManifest
+from TemplateLayers import mergeTrees, resolveLayers
+from TemplateSource import splitLayers
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+def write(root: Path, files: dict) -> str:
+    for name, contents in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(contents)
+    return str(root)
+
+
+def test_layers_are_split() -> None:
+    assert splitLayers("a#v1:sub") == ["a#v1:sub"]
+    assert splitLayers("a, b#main ,c") == ["a", "b#main", "c"]
+    with pytest.raises(ValueError, match="empty layer"):
+        splitLayers("a,,b")
+
+
+def test_later_layers_take_precedence() -> None:
+    kept = resolveLayers([
+        {"README": False, "ci": False, "src/a": False, "docs/x": False},
+        {"README": False, "ci/main.yml": False, "docs": True},
+        {"src": False, "docs/x": False}])
+    assert kept == [set(), {"README", "ci/main.yml", "docs"},
+                    {"src", "docs/x"}]
+
+
+def test_trees_are_merged_by_renaming(tmp_path: Path) -> None:
+    base = write(tmp_path / "base", {"README": "base", "src/a.c": "a",
+                                     "lib/deep/b.c": "b"})
+    overlay = write(tmp_path / "overlay", {"README": "overlay",
+                                           "src/ci.c": "ci"})
+    (tmp_path / "overlay" / ".git").mkdir()
+    inode = os.stat(tmp_path / "base" / "lib" / "deep" / "b.c").st_ino
+    (tmp_path / "out").mkdir()
+
+    merged = mergeTrees([base, overlay], str(tmp_path / "out"))
+
+    assert (merged.files, merged.overridden) == (4, 1)
+    assert (tmp_path / "out" / "README").read_text() == "overlay"
+    assert sorted(os.listdir(tmp_path / "out" / "src")) == ["a.c", "ci.c"]
+    assert os.stat(tmp_path / "out" / "lib" / "deep" / "b.c").st_ino == inode
+    assert not (tmp_path / "base" / "lib").exists()  # moved whole
+    assert not (tmp_path / "out" / ".git").exists()
+
+
+def test_layered_templates_generate_in_one_pass(tmp_path: Path) -> None:
+    base = make_template_repo(tmp_path / "base", {
+        "README.md": "{{project_name}}", "src/main.c": "int main;",
+        ".gitignore": "build/"})
+    overlay = make_template_repo(tmp_path / "ci", {
+        "README.md": "ci", ".github/ci.yml": "on: push",
+        ".gitignore": "dist/"})
+    template = f"{base}, {overlay}#master"
+    project = tmp_path / "demo"
+    ProjectGenerator().generate(template, str(project), {"--no-hooks": True})
+
+    assert (project / "README.md").read_text() == "ci"
+    assert (project / "src" / "main.c").read_text() == "int main;"
+    assert (project / ".github" / "ci.yml").exists()
+    assert not (project / ".gitignore").exists()
+    assert [entry for entry in os.listdir(tmp_path)
+            if entry.startswith(".demo.")] == []
+
+    manifest = ProjectManifest.read(str(project))
+    assert manifest.template == template
+    assert sorted(manifest.files) == [".github/ci.yml", "README.md",
+                                      "src/main.c"]
+    scanner = DriftScanner(ConfigContext(meta=DataStruct(
+        cachedir=str(tmp_path / "cache"))))
+    assert scanner.scan([str(project)])[0].files == []
+
+
+def test_failing_layers_fail_the_generation(tmp_path: Path) -> None:
+    base = make_template_repo(tmp_path / "base", {"README.md": "base"})
+    with pytest.raises(GenerationError, match="could not export"):
+        ProjectGenerator().generate(f"{base}, {base}#nope",
+                                    str(tmp_path / "demo"),
+                                    {"--no-hooks": True})
+    assert not (tmp_path / "demo").exists()
@@ -0,0 +1,84 @@
+import os
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from TemplateRender import TemplateRender, projectVariables, renderExclusions
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    path = tmp_path / "project"
+    (path / "src" / "{{NAME}}").mkdir(parents=True)
+    (path / "README.md").write_text("# {{ name }} by {{AUTHOR}} {{unknown}}")
+    (path / "plain.txt").write_text("nothing to see {{ here")
+    (path / "src" / "{{NAME}}" / "__init__.py").write_text("")
+    (path / "src" / "{{NAME}}" / "main.py").write_text("print('{{name}}')")
+    (path / "data.bin").write_bytes(b"\0{{name}}")
+    (path / "run.sh").write_text("#!/bin/sh\necho {{name}}")
+    (path / "run.sh").chmod(0o755)
+    return path
+
+
+def test_contents_and_paths_are_rendered(project: Path) -> None:
+    mtime = os.stat(project / "plain.txt").st_mtime_ns
+    changed = TemplateRender({"name": "demo", "author": "me"}).render(
+        str(project))
+
+    assert (project / "README.md").read_text() == "# demo by me {{unknown}}"
+    assert (project / "src" / "demo" / "main.py").read_text() == \
+        "print('demo')"
+    assert not (project / "src" / "{{NAME}}").exists()
+    assert (project / "run.sh").read_text() == "#!/bin/sh\necho demo"
+    assert os.access(project / "run.sh", os.X_OK)
+    # binary files and files without a known placeholder are left alone
+    assert (project / "data.bin").read_bytes() == b"\0{{name}}"
+    assert os.stat(project / "plain.txt").st_mtime_ns == mtime
+
+    assert sorted(changed) == ["README.md", "run.sh", "src/demo/__init__.py",
+                               "src/demo/main.py"]
+    assert changed["src/demo/main.py"][0] == "src/{{NAME}}/main.py"
+
+
+def test_placeholders_straddling_chunks_are_rendered(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(TemplateRender, "CHUNK", 7)
+    text = "ab{{name}}cd{{ NAME }}{x{{name}}{" * 50
+    (tmp_path / "big.txt").write_text(text)
+
+    TemplateRender({"name": "value"}).render(str(tmp_path))
+    assert (tmp_path / "big.txt").read_text() == \
+        text.replace("{{name}}", "value").replace("{{ NAME }}", "value")
+
+
+def test_variables_override_in_order() -> None:
+    variables = projectVariables(
+        "/some/where/demo", "cpp", "lib",
+        DataStruct(licence="MIT", language="c++"),
+        ["LICENCE=BSD", "empty="])
+
+    assert variables == {"project_name": "demo", "language": "c++",
+                         "project_type": "lib", "licence": "BSD", "empty": ""}
+    with pytest.raises(ValueError):
+        projectVariables("demo", "cpp", "lib", None, ["novalue"])
+
+
+def test_excluded_paths_are_left_alone(project: Path) -> None:
+    (project / "charts" / "{{NAME}}").mkdir(parents=True)
+    (project / "charts" / "{{NAME}}" / "values.yaml").write_text(
+        "lang: {{ name }}")
+    configured = DataStruct(**{"render.exclude": "charts, *.sh"})
+    assert "render.exclude" not in projectVariables("demo", "cpp", "lib",
+                                                    configured)
+
+    changed = TemplateRender({"name": "demo"},
+                             exclude=renderExclusions(configured)).render(
+        str(project))
+
+    assert (project / "charts" / "{{NAME}}" / "values.yaml").read_text() == \
+        "lang: {{ name }}"
+    assert (project / "run.sh").read_text() == "#!/bin/sh\necho {{name}}"
+    assert (project / "src" / "demo" / "main.py").read_text() == \
+        "print('demo')"
+    assert sorted(changed) == ["README.md", "src/demo/__init__.py",
+                               "src/demo/main.py"]
@@ -0,0 +1,32 @@
+import pytest
+
+from TemplateSource import absoluteSource, parseSource
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("https://host/repo.git", ("https://host/repo.git", None, None)),
+    ("https://host/repo.git#v1", ("https://host/repo.git", "v1", None)),
+    ("git@host:mono.git#main:templates/cpp/",
+     ("git@host:mono.git", "main", "templates/cpp")),
+    ("../local#:./sub", ("../local", None, "sub")),
+])
+def test_sources_are_split(spec: str, expected: tuple) -> None:
+    source = parseSource(spec)
+    assert (source.url, source.ref, source.subdir) == expected
+
+
+def test_subdirectory_may_not_leave_the_repository() -> None:
+    with pytest.raises(ValueError):
+        parseSource("https://host/repo.git#main:a/../../b")
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("../local#:sub", "/work/../local#:sub"),
+    ("/abs/path", "/abs/path"),
+    ("file:///abs/path", "file:///abs/path"),
+    ("git@host:mono.git#main", "git@host:mono.git#main"),
+    ("base, https://host/ci.git#v2", "/work/base, https://host/ci.git#v2"),
+    ("base,", "base,"),
+])
+def test_local_paths_are_made_absolute(spec: str, expected: str) -> None:
+    assert absoluteSource(spec, "/work") == expected
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import pytest
+from pathlib import Path
+
+from Config import DataStruct
+from ConfigContext import ConfigContext
+from DriftScanner import DriftScanner
+from ProjectGenerator import ProjectGenerator
+from ProjectManifest import ProjectManifest
+from TemplateSubmodules import TemplateSubmodules, resolveUrl
+from test.testUtils import make_template_repo
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch: pytest.MonkeyPatch) -> None:
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@test")
+
+
+def git(path: Path, *args: str) -> str:
+    return subprocess.run(["git", "-c", "protocol.file.allow=always", "-C",
+                           str(path), *args], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> str:
+    """!
+    a template with a submodule `lib`, given by a relative URL, which has a
+    submodule `vendor/inner` of its own
+    """
+    make_template_repo(tmp_path / "inner", {"inner.h": "#define INNER",
+                                            ".gitmodules": "\n"})
+    make_template_repo(tmp_path / "lib", {"lib.c": "int lib;"})
+    git(tmp_path / "lib", "submodule", "add", "-q", str(tmp_path / "inner"),
+        "vendor/inner")
+    git(tmp_path / "lib", "commit", "-qm", "inner")
+    url = make_template_repo(tmp_path / "template", {"README.md": "hello"})
+    git(tmp_path / "template", "submodule", "add", "-q", "../lib", "lib")
+    git(tmp_path / "template", "commit", "-qm", "lib")
+    return url
+
+
+def test_relative_urls_resolve_against_the_template() -> None:
+    assert resolveUrl("../lib.git", "https://host/org/app.git") == \
+        "https://host/org/lib.git"
+    assert resolveUrl("./sub", "git@host:org/app.git") == \
+        "git@host:org/app.git/sub"
+    assert resolveUrl("../lib", "/templates/app/") == "/templates/lib"
+    assert resolveUrl("https://other/lib.git", "/templates/app") == \
+        "https://other/lib.git"
+
+
+def test_submodules_are_found_and_listed(tmp_path: Path,
+                                         template: str) -> None:
+    submodules = TemplateSubmodules(jobs=2)
+    repo = str(tmp_path / "template")
+    found = submodules.find(repo, "HEAD", template)
+
+    assert [(sub.path, sub.url) for sub in found] == \
+        [("lib", f"file://{tmp_path}/lib")]
+    assert found[0].commit == git(tmp_path / "lib", "rev-parse", "HEAD")
+    assert sorted(submodules.listTree(repo, "HEAD", template)) == \
+        ["lib/.gitmodules", "lib/lib.c", "lib/vendor/inner/.gitmodules",
+         "lib/vendor/inner/inner.h"]
+
+
+@pytest.mark.parametrize("extra", [{"--ref": "master"}, {"--ref": None},
+                                   {"--ref": None, "--full-clone": True}])
+def test_submodules_are_flattened(tmp_path: Path, template: str,
+                                  extra: dict) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), extra)
+
+    assert (project / "lib" / "lib.c").read_text() == "int lib;"
+    assert (project / "lib" / "vendor" / "inner" / "inner.h").exists()
+    leftovers = [os.path.join(dirpath, name)
+                 for dirpath, dirnames, filenames in os.walk(project)
+                 for name in dirnames + filenames
+                 if name in (".git", ".gitmodules")]
+    assert leftovers == [str(project / ".git")]
+    assert sorted(ProjectManifest.read(str(project)).files) == \
+        ["README.md", "lib/lib.c", "lib/vendor/inner/inner.h"]
+    scanner = DriftScanner(ConfigContext(meta=DataStruct(
+        cachedir=str(tmp_path / "cache"))))
+    assert scanner.scan([str(project)])[0].files == []
+
+
+def test_submodules_can_be_registered(tmp_path: Path, template: str) -> None:
+    project = tmp_path / "project"
+    ProjectGenerator().generate(template, str(project), {
+        "--ref": "master", "--submodules": "register"})
+
+    assert os.listdir(project / "lib") == []
+    assert git(project, "ls-tree", "HEAD", "lib").split()[:3] == \
+        ["160000", "commit", git(tmp_path / "lib", "rev-parse", "HEAD")]
+    assert git(project, "config", "-f", ".gitmodules",
+               "submodule.lib.url") == f"file://{tmp_path}/lib"
+    assert git(project, "status", "--porcelain", "lib", ".gitmodules") == ""
+    git(project, "fsck", "--strict")
+    git(project, "submodule", "update", "-q", "--init")
+    assert (project / "lib" / "lib.c").exists()
+
+    manifest = ProjectManifest.read(str(project))
+    assert manifest.submodules == ["lib"]
+    scanner = DriftScanner(ConfigContext(meta=DataStruct(
+        cachedir=str(tmp_path / "cache"))))
+    assert scanner.scan([str(project)])[0].files == []
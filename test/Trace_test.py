@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from typing import Iterator
+
+import Trace
+from Trace import Tracer
+
+
+@pytest.fixture
+def tracer() -> Iterator[Tracer]:
+    tracer = Tracer()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+def test_disabled_spans_record_nothing() -> None:
+    tracer = Tracer()
+    with tracer.span("work") as span:
+        span.set(files=1)
+
+    assert not span
+    assert span is tracer.span("other")
+    assert tracer.spans == []
+
+
+def test_spans_nest_and_count_subprocesses(tracer: Tracer) -> None:
+    with tracer.span("outer", template="t") as outer:
+        with tracer.span("inner") as inner:
+            subprocess.run([sys.executable, "-c", "pass"])
+            inner.set(files=2, bytes=10)
+        subprocess.run([sys.executable, "-c", "pass"])
+
+    assert [s.name for s in tracer.spans] == ["inner", "outer"]
+    assert (inner.depth, outer.depth) == (1, 0)
+    assert inner.attrs == {"files": 2, "bytes": 10, "subprocesses": 1}
+    assert outer.attrs["subprocesses"] == 2
+    assert outer.attrs["template"] == "t"
+    assert outer.duration >= inner.duration > 0
+
+
+def test_summary_adds_up_spans_of_the_same_name(tracer: Tracer) -> None:
+    for size in (3, 4):
+        with tracer.span("copy") as span:
+            span.set(files=1, bytes=size)
+
+    header, row = tracer.summary().splitlines()
+    assert header.split() == ["span", "calls", "total", "ms", "files",
+                              "bytes", "procs"]
+    assert row.split()[:2] == ["copy", "2"]
+    assert row.split()[3:] == ["2", "7", "0"]
+
+
+def test_trace_formats(tracer: Tracer, tmp_path: Path) -> None:
+    with tracer.span("outer"):
+        with tracer.span("inner"):
+            pass
+
+    tracer.write(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    assert [e["name"] for e in events] == ["outer", "inner"]
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+    tracer.write(str(tmp_path / "trace.ndjson"))
+    with open(tmp_path / "trace.ndjson") as f:
+        lines = [json.loads(line) for line in f]
+    assert [(s["name"], s["depth"]) for s in lines] == [("outer", 0),
+                                                       ("inner", 1)]
+
+
+def test_tracers_share_one_audit_hook(tracer: Tracer) -> None:
+    other = Tracer()
+    other.enable()
+    assert {tracer, other} <= set(Trace._TRACERS)
+    other.disable()
+    assert other not in Trace._TRACERS
+
+    with tracer.span("work") as work:
+        subprocess.run([sys.executable, "-c", "pass"])
+    assert work.attrs["subprocesses"] == 1
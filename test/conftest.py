@@ -0,0 +1,11 @@
+import pytest
+from pathlib import Path
+
+
+@pytest.fixture(autouse=True)
+def cacheHome(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """!
+    keep the default cache directory of every test in its tmp_path, rather
+    than in the user's own `~/.cache/progenrtr`
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
@@ -22,3 +22,30 @@ def read_file(path: str) -> str:
 
 ## convenience string containing the contents of the template fallback.ini
 MINIMAL_FALLBACK_INI: str = read_file("test/resources/fallback.ini")
+
+
+def make_template_repo(path, files: dict, commits: int = 1) -> str:
+    """!
+    create a git repository at path containing the files provided, used as an
+    offline stand-in for a remote template repository.
+
+    @param path the directory in which to create the repository
+    @param files dictionary mapping relative file paths to their contents
+    @param commits the number of commits to create, the files are committed in
+           the first one and every later commit appends to them
+    @returns a file:// URL for the repository
+    """
+    import subprocess
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@test",
+           "-c", "init.defaultBranch=master", "-C", str(path)]
+    Path(path).mkdir(parents=True, exist_ok=True)
+    subprocess.run(git + ["init", "-q"], check=True)
+    for index in range(commits):
+        for name, contents in files.items():
+            target = Path(path) / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, "a" if index else "w") as f:
+                f.write(contents if index == 0 else f"\n{index}")
+        subprocess.run(git + ["add", "-A"], check=True)
+        subprocess.run(git + ["commit", "-qm", f"commit {index}"], check=True)
+    return f"file://{path}"